@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+
+# Writes to a temporary file first and renames it, so a crash never leaves a half written file
+def write_atomic(path, text: str):
+	directory = os.path.dirname(os.path.abspath(path))
+	with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as file:
+		file.write(text)
+		file.flush()
+		os.fsync(file.fileno())
+	os.replace(file.name, path)
@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import random
+import time
+import tracemalloc
+
+import praw
+
+from benchmarks.bench_detection import RESULTS_DIR, current_commit
+from corpus import CorpusGenerator
+from mistakes import MistakeChecker, mistakes
+from records import RawCommentLoader
+
+
+# Listing JSON of a submission's comments, with the fields Reddit sends that the bot never reads
+def comment_listing(bodies: list[str], reply_depth: int, seed: int) -> dict:
+	random_generator = random.Random(seed)
+	authors = [f"user{index}" for index in range(len(bodies) // 4 + 1)]
+	next_body = iter(bodies)
+
+	def thing(depth: int, parent_id: str) -> dict:
+		comment_id = f"c{random_generator.getrandbits(40):x}"
+		author = random_generator.choice(authors)
+		children = []
+		if depth < reply_depth:
+			for _ in range(random_generator.randint(0, 2)):
+				body = next(next_body, None)
+				if body is None:
+					break
+				children.append((body, thing(depth + 1, f"t1_{comment_id}")))
+		return {"kind": "t1", "data": {
+			"id": comment_id, "name": f"t1_{comment_id}", "parent_id": parent_id, "link_id": "t3_post",
+			"body": None, "body_html": None, "author": author, "author_fullname": f"t2_{author}",
+			"author_flair_text": None, "author_flair_richtext": [], "created_utc": 1.7e9, "created": 1.7e9,
+			"edited": False, "score": random_generator.randint(-5, 500), "ups": 1, "downs": 0, "depth": depth,
+			"saved": False, "archived": False, "locked": False, "stickied": False, "distinguished": None,
+			"subreddit": "bench", "subreddit_id": "t5_bench", "permalink": f"/r/bench/comments/post/_/{comment_id}/",
+			"all_awardings": [], "gildings": {}, "controversiality": 0, "is_submitter": False, "score_hidden": False,
+			"replies": {"kind": "Listing", "data": {"children": children}} if children else "",
+		}}
+
+	def fill(item):
+		body, data = item
+		data["data"]["body"] = body
+		data["data"]["body_html"] = f"<div class=\"md\"><p>{body}</p></div>"
+		replies = data["data"]["replies"]
+		if replies:
+			replies["data"]["children"] = [fill(child) for child in replies["data"]["children"]]
+		return data
+
+	top_level = []
+	for body in next_body:
+		top_level.append((body, thing(0, "t3_post")))
+	return {"kind": "Listing", "data": {"children": [fill(item) for item in top_level]}}
+
+
+# Every comment in a tree of praw Comments or records, depth first
+def flatten(comments: list) -> list:
+	flat = []
+	stack = list(reversed(comments))
+	while stack:
+		comment = stack.pop()
+		flat.append(comment)
+		replies = comment._replies if isinstance(comment, praw.models.Comment) else comment.replies
+		stack.extend(reversed(replies))
+	return flat
+
+
+def detect(checker: MistakeChecker, comments: list) -> int:
+	texts = [text for text in map(checker.prepare, (comment.body for comment in comments)) if text is not None]
+	return sum(bool(matches) for matches in checker.find_matches_batch(texts))
+
+
+# Parses the listing as praw does or into records, then runs detection on every comment
+# json.loads is part of both, as the bot gets the listing as text
+def bench_path(name: str, parse, text: str, checker: MistakeChecker, repeat: int) -> dict:
+	start = time.perf_counter()
+	for _ in range(repeat):
+		comments = flatten(parse(json.loads(text)))
+	parsed = time.perf_counter()
+	for _ in range(repeat):
+		found = detect(checker, comments)
+	elapsed = time.perf_counter() - start
+	del comments
+
+	tracemalloc.start()
+	comments = flatten(parse(json.loads(text)))
+	# The peak includes the decoded JSON, what is left after it is freed is the memory the comments keep
+	retained, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return {
+		"path": name,
+		"parse ms per submission": round((parsed - start) / repeat * 1000, 2),
+		"comments per second": round(len(comments) * repeat / elapsed),
+		"peak memory bytes per submission": peak,
+		"retained bytes per comment": round(retained / len(comments)),
+		"mistakes found": found,
+	}
+
+
+def run(args) -> dict:
+	reddit = praw.Reddit(client_id="x", client_secret="y", user_agent="benchmark", check_for_updates=False)
+	loader = RawCommentLoader(reddit)
+	checker = MistakeChecker(mistakes)
+	results = {"settings": vars(args)}
+	for size in args.sizes:
+		bodies = CorpusGenerator(seed=args.seed, mistake_rate=args.mistake_rate).corpus(size)
+		text = json.dumps(comment_listing(bodies, args.reply_depth, args.seed))
+		praw_result = bench_path("praw", lambda data: reddit._objector.objectify(data=data).children, text, checker,
+		                         args.repeat)
+		record_result = bench_path("records", lambda data: loader.parse(data["data"]["children"], "post"), text,
+		                           checker, args.repeat)
+		results[f"{size} comments"] = {
+			"listing bytes": len(text),
+			"praw": praw_result,
+			"records": record_result,
+			"speedup": round(record_result["comments per second"] / praw_result["comments per second"], 2),
+			"peak memory ratio": round(record_result["peak memory bytes per submission"]
+			                           / praw_result["peak memory bytes per submission"], 2),
+			"retained memory ratio": round(record_result["retained bytes per comment"]
+			                               / praw_result["retained bytes per comment"], 2),
+			"same mistakes": praw_result["mistakes found"] == record_result["mistakes found"],
+		}
+	return results
+
+
+# Run from the repository root: python -m benchmarks.bench_comment_records
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compare praw objects and compact records for large threads")
+	parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 10000], help="comments per submission")
+	parser.add_argument("--reply-depth", type=int, default=8)
+	parser.add_argument("--mistake-rate", type=float, default=0.03)
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	results = run(args)
+	results["commit"] = current_commit()
+	print(json.dumps(results, indent=4))
+	os.makedirs(RESULTS_DIR, exist_ok=True)
+	path = os.path.join(RESULTS_DIR, f"comment-records-{results['commit']}.json")
+	with open(path, "w") as file:
+		json.dump(results, file, indent=4)
+	print(f"Saved results to {path}")
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from corpus import CorpusGenerator
+from main import AmmoniumBot
+from memo import DetectionMemo
+from mistakes import MistakeChecker, mistakes
+from templates import ReplyTemplates
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+# Times a function on every text, returning comments/sec and per-comment latency percentiles in microseconds
+def time_per_comment(function, texts) -> dict:
+	latencies = []
+	start = time.perf_counter()
+	for text in texts:
+		comment_start = time.perf_counter()
+		function(text)
+		latencies.append(time.perf_counter() - comment_start)
+	elapsed = time.perf_counter() - start
+	latencies.sort()
+	return {
+		"comments per second": round(len(texts) / elapsed),
+		"p50 us": round(latencies[len(latencies) // 2] * 1e6, 2),
+		"p99 us": round(latencies[int(len(latencies) * 0.99)] * 1e6, 2),
+		"mean us": round(statistics.fmean(latencies) * 1e6, 2),
+	}
+
+
+# Peak memory allocated by Python while running the function once
+def peak_memory(function) -> int:
+	tracemalloc.start()
+	function()
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return peak
+
+
+def bench_backend(backend: str, texts: list[str]) -> tuple[dict, list]:
+	checker = MistakeChecker(mistakes, backend=backend)
+	try:
+		# Warm up, so worker processes and compiled patterns aren't part of the measurement
+		checker.find_mistakes_batch(texts[:100])
+		result = time_per_comment(checker.find_mistake, texts)
+		start = time.perf_counter()
+		detected = checker.find_mistakes_batch(texts)
+		result["batch comments per second"] = round(len(texts) / (time.perf_counter() - start))
+		result["batch peak memory bytes"] = peak_memory(lambda: checker.find_mistakes_batch(texts))
+	finally:
+		checker.close()
+	return result, detected
+
+
+def run(size: int, seed: int, backends: list[str]) -> dict:
+	bodies = CorpusGenerator(seed=seed).corpus(size)
+	texts = [AmmoniumBot.strip_quotes(body) for body in bodies]
+	results = {
+		"corpus": {"size": size, "seed": seed, "mean length": round(statistics.fmean(map(len, bodies)))},
+		"strip quotes": time_per_comment(AmmoniumBot.strip_quotes, bodies),
+	}
+	# Prefilter and strip quotes only where a mistake is possible, as the bot does before detection
+	checker = MistakeChecker(mistakes)
+	results["prepare"] = time_per_comment(checker.prepare, bodies)
+	results["prepare"]["passed prefilter"] = sum(checker.prepare(body) is not None for body in bodies)
+
+	detections = {}
+	for backend in backends:
+		results[f"backend {backend}"], detections[backend] = bench_backend(backend, texts)
+
+	# Every mistake with its position, as the bot uses for replies
+	results["find matches"] = time_per_comment(checker.find_matches, texts)
+	# The same with a memo, the first time each text is seen and again, as for posts visited again
+	memoized = MistakeChecker(mistakes, memo=DetectionMemo(max_size=size))
+	results["memoized find matches cold"] = time_per_comment(memoized.find_matches, texts)
+	memoized.memo.hits = memoized.memo.misses = 0
+	results["memoized find matches warm"] = time_per_comment(memoized.find_matches, texts)
+	results["memoized find matches warm"]["hit rate"] = round(memoized.memo.hit_rate(), 4)
+
+	# Context is only extracted for comments with a mistake
+	found = [(text, mistake) for text, mistake in zip(texts, detections[backends[0]]) if mistake is not None]
+	results["find context"] = time_per_comment(lambda pair: pair[1].find_context(pair[0]), found) if found else {}
+	# Reply bodies for the comments with a mistake, from the templates rendered at startup
+	templates = ReplyTemplates.load(mistake_list=mistakes)
+	with_matches = [(text, matches) for text, matches in zip(texts, map(checker.find_matches, texts)) if matches]
+	results["render reply"] = time_per_comment(lambda pair: templates.render(*pair), with_matches) if with_matches else {}
+	results["mistake check"] = time_per_comment(lambda text: [mistake.check(text) for mistake in mistakes], texts)
+
+	# Every engine has to find exactly the same mistakes
+	results["mistakes found"] = len(found)
+	results["engines agree"] = all(detections[backend] == detections[backends[0]] for backend in backends)
+
+	# Tokens match whole words instead of padded strings, so they are compared with the engines instead of having to
+	# agree with them: how many more comments they find a mistake in, and at what cost
+	tokens = MistakeChecker(mistakes, backend="tokens")
+	results["tokens prepare"] = time_per_comment(tokens.prepare, bodies)
+	results["tokens prepare"]["passed prefilter"] = sum(tokens.prepare(body) is not None for body in bodies)
+	results["backend tokens"], token_detections = bench_backend("tokens", texts)
+	results["tokens find matches"] = time_per_comment(tokens.find_matches, texts)
+	results["tokens mistakes found"] = sum(mistake is not None for mistake in token_detections)
+	results["tokens differ"] = sum(mistake is not other for mistake, other in zip(token_detections, detections[backends[0]]))
+	return results
+
+
+def current_commit() -> str:
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+		                      check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return "unknown"
+
+
+# Prints how the comments/sec of each benchmark changed from an earlier results file
+def compare(results: dict, baseline: dict):
+	for name, result in results.items():
+		if not isinstance(result, dict) or "comments per second" not in result:
+			continue
+		if "comments per second" not in baseline.get(name, {}):
+			continue
+		change = result["comments per second"] / baseline[name]["comments per second"] - 1
+		print(f"{name}: {change:+.1%} comments/sec")
+
+
+# Run from the repository root: python -m benchmarks.bench_detection
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark mistake detection on a synthetic comment corpus")
+	parser.add_argument("--size", type=int, default=20000)
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--backends", nargs="+", default=["serial", "compiled", "process"])
+	parser.add_argument("--compare", help="earlier results file to compare with")
+	args = parser.parse_args()
+
+	results = run(args.size, args.seed, args.backends)
+	results["commit"] = current_commit()
+	print(json.dumps(results, indent=4))
+	os.makedirs(RESULTS_DIR, exist_ok=True)
+	path = os.path.join(RESULTS_DIR, f"detection-{results['commit']}.json")
+	with open(path, "w") as file:
+		json.dump(results, file, indent=4)
+	print(f"Saved results to {path}")
+	if args.compare:
+		with open(args.compare, "r") as file:
+			compare(results, json.load(file))
+	if not results["engines agree"]:
+		raise SystemExit("Detection backends returned different results")
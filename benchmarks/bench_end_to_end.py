@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_detection import RESULTS_DIR, current_commit
+from data_manager import FileManager, CrawlState
+from expansion import CommentExpander, ExpansionPolicy
+from fake_reddit import FakeReddit, FakeComment, write_data_files
+from main import AmmoniumBot
+from mistakes import MistakeChecker, mistakes
+from outbox import ReplyOutbox
+from ratelimit import RateLimiter
+from reply import ReplyManager
+
+
+# Runs the whole bot once on a fresh fake Reddit, in a directory of empty data files
+# With measure_memory, returns the peak memory allocated by Python during the run instead of timing it
+def run_bot(args, reply_depth: int, measure_memory=False) -> dict:
+	limiter = RateLimiter(requests_per_minute=args.requests_per_minute)
+	reddit = FakeReddit.generate(num_subreddits=args.subreddits, submissions_per_subreddit=args.submissions,
+	                             comments_per_submission=args.comments, mistake_rate=args.mistake_rate,
+	                             latency=args.latency, limiter=limiter, seed=args.seed, reply_depth=reply_depth,
+	                             replies_per_comment=args.replies_per_comment, num_messages=args.messages,
+	                             rate_limit_rate=args.rate_limit_rate)
+	with tempfile.TemporaryDirectory() as directory:
+		paths = write_data_files(directory, dict.fromkeys(reddit.subreddits, False))
+		bot = AmmoniumBot(ReplyManager(ReplyOutbox(os.path.join(directory, "outbox.json"))), FileManager(*paths),
+		                  MistakeChecker(mistakes), praw_instance=reddit, crawl_mode=args.crawl_mode,
+		                  limiter=limiter, expander=CommentExpander(ExpansionPolicy(run_budget=None)),
+		                  crawl_state=CrawlState(os.path.join(directory, "state.json")))
+		if measure_memory:
+			tracemalloc.start()
+			bot.run()
+			_, peak = tracemalloc.get_traced_memory()
+			tracemalloc.stop()
+			return {"peak memory bytes": peak, "memory per comment bytes": round(peak / len(reddit.comments))}
+		start = time.perf_counter()
+		bot.run()
+		elapsed = time.perf_counter() - start
+
+	corrections = sum(isinstance(target, FakeComment) for target, _ in reddit.replies)
+	return {
+		"comments": len(reddit.comments),
+		"seconds": round(elapsed, 3),
+		"runs per hour": round(3600 / elapsed, 1),
+		"api requests": reddit.requests,
+		# What Reddit's own limit allows, as the fake answers much faster
+		f"runs per hour at {args.reddit_limit} requests/min": round(60 * args.reddit_limit / reddit.requests, 2),
+		"corrections": corrections,
+		"api requests per correction": round(reddit.requests / corrections, 2) if corrections else None,
+		"rate limited requests": reddit.rate_limited,
+		"rate limit retry seconds": round(limiter.retry_seconds, 3),
+		"inbox replies": len(reddit.replies) - corrections,
+	}
+
+
+def run(args) -> dict:
+	results = {"settings": vars(args)}
+	# Deeper threads have more comments per post, to see how memory grows with the size of the trees
+	for reply_depth in args.reply_depths:
+		result = run_bot(args, reply_depth)
+		result.update(run_bot(args, reply_depth, measure_memory=True))
+		results[f"reply depth {reply_depth}"] = result
+	return results
+
+
+# Run from the repository root: python -m benchmarks.bench_end_to_end
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark whole runs of the bot against a fake Reddit")
+	parser.add_argument("--subreddits", type=int, default=5)
+	parser.add_argument("--submissions", type=int, default=20)
+	parser.add_argument("--comments", type=int, default=50, help="top level comments per post")
+	parser.add_argument("--reply-depths", type=int, nargs="+", default=[0, 3, 6])
+	parser.add_argument("--replies-per-comment", type=int, default=1)
+	parser.add_argument("--messages", type=int, default=20, help="inbox messages")
+	parser.add_argument("--mistake-rate", type=float, default=0.05)
+	parser.add_argument("--rate-limit-rate", type=float, default=0.01, help="chance of a request getting a 429")
+	parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+	parser.add_argument("--requests-per-minute", type=float, default=10 ** 9, help="rate limit of the run itself")
+	parser.add_argument("--reddit-limit", type=int, default=100, help="requests/min allowed by Reddit, for estimates")
+	parser.add_argument("--crawl-mode", default="serial", choices=["serial", "pipeline"])
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	results = run(args)
+	results["commit"] = current_commit()
+	print(json.dumps(results, indent=4))
+	os.makedirs(RESULTS_DIR, exist_ok=True)
+	path = os.path.join(RESULTS_DIR, f"end-to-end-{results['commit']}.json")
+	with open(path, "w") as file:
+		json.dump(results, file, indent=4)
+	print(f"Saved results to {path}")
@@ -0,0 +1,74 @@
+import random
+import sys
+from typing import Optional
+
+from scheduler import SubredditScheduler
+
+
+# Runs scheduling policies against made up subreddits, to compare them without touching Reddit
+class SchedulerSimulator:
+	def __init__(self, num_subreddits=100, seed=0):
+		self.rng = random.Random(seed)
+		# Most subreddits produce very few mistakes, a few produce many
+		self.yields = {f"subreddit{i}": self.rng.paretovariate(2) * 0.02 for i in range(num_subreddits)}
+		self.costs = {name: self.rng.randint(5, 60) for name in self.yields}
+		# Some subreddits take longer per request (bigger threads to parse and check); drawn separately, so the
+		# yields and costs stay the same as without them
+		timing = random.Random(seed + 1)
+		self.seconds_per_request = {name: timing.uniform(0.2, 2.0) for name in self.yields}
+
+	# One visit: the yield drifts a little between runs
+	def visit(self, subreddit_name: str) -> dict:
+		self.yields[subreddit_name] *= self.rng.uniform(0.9, 1.1)
+		requests = self.costs[subreddit_name]
+		mistakes_found = sum(self.rng.random() < self.yields[subreddit_name] for _ in range(requests))
+		return {"api requests": requests, "mistakes found": mistakes_found, "comments scanned": requests * 50,
+		        "seconds": requests * self.seconds_per_request[subreddit_name]}
+
+	# Returns the total mistakes found over a number of runs with a fixed request budget per run, and a time budget in
+	# seconds if given
+	def simulate(self, scheduler: Optional[SubredditScheduler], request_budget: int, runs=50,
+	             time_budget: Optional[float] = None) -> int:
+		total = 0
+		for run in range(runs):
+			names = list(self.yields)
+			if scheduler is None:
+				# What the bot did before: a shuffled list, until the budget runs out
+				self.rng.shuffle(names)
+			else:
+				names = scheduler.plan(names)
+			spent = 0
+			seconds = 0.0
+			records = {}
+			for name in names:
+				if spent + self.costs[name] > request_budget:
+					continue
+				if time_budget is not None and seconds + self.costs[name] * self.seconds_per_request[name] > time_budget:
+					continue
+				records[name] = self.visit(name)
+				spent += records[name]["api requests"]
+				seconds += records[name]["seconds"]
+				total += records[name]["mistakes found"]
+			if scheduler is not None:
+				scheduler.record(records, visit_time=run)
+		return total
+
+
+# Compares the policies, from the repository root: python -m benchmarks.simulate_scheduler
+# Single seeds are noisy, so each policy is run on several: python -m benchmarks.simulate_scheduler [time budget]
+if __name__ == "__main__":
+	budget = 1000
+	time_budget = float(sys.argv[1]) if len(sys.argv) > 1 else None
+	policies = {
+		"shuffle": lambda: None,
+		"greedy": lambda: SubredditScheduler(request_budget=budget, exploration=0, time_budget=time_budget),
+		"explore 10%": lambda: SubredditScheduler(request_budget=budget, exploration=0.1, time_budget=time_budget),
+		"explore 20%": lambda: SubredditScheduler(request_budget=budget, exploration=0.2, time_budget=time_budget),
+		"explore 50%": lambda: SubredditScheduler(request_budget=budget, exploration=0.5, time_budget=time_budget),
+	}
+	if time_budget is not None:
+		policies["requests only"] = lambda: SubredditScheduler(request_budget=budget)
+	for policy_name, policy in policies.items():
+		mistakes_found = sum(SchedulerSimulator(seed=seed).simulate(policy(), budget, time_budget=time_budget)
+		                     for seed in range(1, 11))
+		print(f"{policy_name}: {mistakes_found} mistakes found over 10 seeds")
@@ -0,0 +1,24 @@
+# Set of stopped users; Reddit usernames are case-insensitive so names are stored case-folded
+class Blocklist:
+	def __init__(self, names=()):
+		self.__names = set()
+		for name in names:
+			self.add(name)
+
+	# Adds a name and returns True if it wasn't already on the list
+	def add(self, name: str) -> bool:
+		name = name.casefold()
+		if name in self.__names:
+			return False
+		self.__names.add(name)
+		return True
+
+	def __contains__(self, name: str) -> bool:
+		return name.casefold() in self.__names
+
+	def __len__(self) -> int:
+		return len(self.__names)
+
+	# Sorted, so a compacted file is stable between runs
+	def __iter__(self):
+		return iter(sorted(self.__names))
@@ -0,0 +1,51 @@
+import random
+
+from mistakes import mistakes
+
+_WORDS = ("the a of to and i you it is that was for on are with as his they be at one have this from or had "
+          "by hot but some what there we can out other were all your when up use word how said an each she "
+          "which do their time if will way about many then them would write like so these her long make thing "
+          "see him two has look more day could go come did my sound no most number who over know water than "
+          "call first people may down side been now find any new work part take get place made live where after "
+          "back little only round man year came show every good me give our under").split()
+
+
+# Generates comment bodies that look like Reddit comments, seeded so every run gets the same corpus
+class CorpusGenerator:
+	def __init__(self, seed=0, mistake_rate=0.03, exception_rate=0.02, quote_rate=0.1, mean_words=40,
+	             max_words=2000):
+		self.rng = random.Random(seed)
+		self.mistake_rate = mistake_rate
+		self.exception_rate = exception_rate
+		self.quote_rate = quote_rate
+		self.mean_words = mean_words
+		self.max_words = max_words
+		self.mistake_phrases = [mistake.get_pattern().strip() for mistake in mistakes]
+		self.exception_phrases = [exception for mistake in mistakes for exception in mistake.get_exceptions()]
+
+	def __sentence(self, num_words: int) -> str:
+		words = [self.rng.choice(_WORDS) for _ in range(num_words)]
+		if self.rng.random() < self.mistake_rate:
+			words.insert(self.rng.randint(0, len(words)), self.rng.choice(self.mistake_phrases))
+		if self.rng.random() < self.exception_rate:
+			words.insert(self.rng.randint(0, len(words)), self.rng.choice(self.exception_phrases))
+		sentence = " ".join(words)
+		# Some comments are capitalised, the bot lowercases them before checking
+		return sentence.capitalize() if self.rng.random() < 0.5 else sentence
+
+	# One comment: a few paragraphs, sometimes quoting another comment first
+	def comment(self) -> str:
+		# Comment lengths have a long tail, like on Reddit
+		num_words = min(self.max_words, max(1, int(self.rng.expovariate(1 / self.mean_words))))
+		paragraphs = []
+		while num_words > 0:
+			length = min(num_words, self.rng.randint(5, 60))
+			paragraphs.append(self.__sentence(length))
+			num_words -= length
+		if self.rng.random() < self.quote_rate:
+			quote = self.__sentence(self.rng.randint(5, 30))
+			paragraphs.insert(0, f">{quote}")
+		return "\n\n".join(paragraphs)
+
+	def corpus(self, size: int) -> list[str]:
+		return [self.comment() for _ in range(size)]
@@ -1,30 +1,97 @@
+import os
 import random
 import json
+import sqlite3
+import threading
+import time
+from typing import Optional
 
+from atomic import write_atomic
+from blocklist import Blocklist
 from reply import FeedBack
 
 
+# Keeps the stats file in memory for the whole run and writes it once, when flushed
+class StatsCache:
+	def __init__(self, path):
+		self.path = path
+		# Loaded on first use
+		self.__stats = None
+		self.__dirty = False
+		self.__lock = threading.Lock()
+
+	def __load(self) -> dict[str, int]:
+		if self.__stats is None:
+			with open(self.path, "r") as file:
+				self.__stats = json.load(file)
+		return self.__stats
+
+	def get(self) -> dict[str, int]:
+		with self.__lock:
+			return dict(self.__load())
+
+	# Adds to a counter and returns its new value
+	def add(self, name: str, amount: int) -> int:
+		with self.__lock:
+			stats = self.__load()
+			stats[name] = int(stats[name]) + amount
+			self.__dirty = True
+			return stats[name]
+
+	def flush(self):
+		with self.__lock:
+			if not self.__dirty:
+				return
+			write_atomic(self.path, json.dumps(self.__stats))
+			self.__dirty = False
+
+
 class FileManager:
-	def __init__(self, stopped_path, stats_path, banned_subs_path, sub_db_path, monitored_subs_path):
+	# With an EventLog, corrections, feedback, stop requests and bans are also logged as events, for stats over time
+	def __init__(self, stopped_path, stats_path, banned_subs_path, sub_db_path, monitored_subs_path, events=None):
 		self.stopped_path = stopped_path
 		self.stats_path = stats_path
 		self.banned_subs_path = banned_subs_path
 		self.monitored_subs_path = monitored_subs_path
 		self.sub_db_path = sub_db_path
+		self.stats = StatsCache(stats_path)
+		self.events = events
+		# Loaded on first use, along with the number of lines in the file to know when to compact it
+		self.__blocklist = None
+		self.__blocklist_lines = 0
+
+	def get_stats(self) -> dict[str, int]:
+		return self.stats.get()
+
+	def get_sub_db(self) -> dict[str, bool]:
+		with open(self.sub_db_path, "r") as file:
+			return json.load(file)
 
-	def get_stopped_users(self) -> dict[str, bool]:
-		with open(self.stopped_path, "r") as f:
-			users = {user: True for user in f.read().splitlines()}
-		return users
+	# Stats changes are only written to disk here, once per run
+	def flush(self):
+		self.stats.flush()
+		if self.events is not None:
+			self.events.flush()
+		# Remove duplicate names left in the blocklist file
+		if self.__blocklist is not None and self.__blocklist_lines > len(self.__blocklist):
+			self.compact_blocklist()
+
+	def get_stopped_users(self) -> Blocklist:
+		if self.__blocklist is None:
+			with open(self.stopped_path, "r") as f:
+				users = [user for user in f.read().splitlines() if user]
+			self.__blocklist = Blocklist(users)
+			self.__blocklist_lines = len(users)
+		return self.__blocklist
+
+	# Rewrites the blocklist file with each name once
+	def compact_blocklist(self):
+		blocklist = self.get_stopped_users()
+		write_atomic(self.stopped_path, "".join(f"{user}\n" for user in blocklist))
+		self.__blocklist_lines = len(blocklist)
 
 	def update_runs(self):
-		with open(self.stats_path, "r") as file:
-			data = json.load(file)
-			runs = int(data["total runs"])
-		runs += 1
-		with open(self.stats_path, "w") as file:
-			data["total runs"] = runs
-			json.dump(data, file)
+		self.stats.add("total runs", 1)
 
 	def update_sub_db(self, subreddit_name: str):
 		# Add to list of banned subreddits
@@ -49,11 +116,7 @@ class FileManager:
 
 	def update_mistake_counter(self, num_mistakes: int):
 		# Update the counter in stats file
-		with open(self.stats_path, "r") as f:
-			data = json.load(f)
-		data["mistake counter"] += num_mistakes
-		with open(self.stats_path, "w") as f:
-			json.dump(data, f)
+		self.stats.add("mistake counter", num_mistakes)
 
 	def get_subreddits(self) -> list[str]:
 		with open(self.sub_db_path, "r") as file:
@@ -64,17 +127,295 @@ class FileManager:
 		return monitored_subreddits
 
 	def add_to_blocklist(self, username: str):
-		with open(self.stopped_path, "a") as f:
-			f.write(f"{username}\n")
+		# Users already on the list aren't added again
+		if self.get_stopped_users().add(username):
+			with open(self.stopped_path, "a") as f:
+				f.write(f"{username}\n")
+			self.__blocklist_lines += 1
+
+	# Adds to several counters at once, such as the counts from another process
+	def add_stats(self, amounts: dict[str, int]):
+		for name, amount in amounts.items():
+			self.stats.add(name, amount)
+
+	def log_event(self, kind: str, subreddit_name=None, mistake_names: list[str] = None, timestamp=None):
+		if self.events is not None:
+			self.events.record(kind, subreddit_name, mistake_names, timestamp)
 
 	def update_good_bad(self, feedback: FeedBack) -> tuple[int, int]:
-		with open(self.stats_path, "r") as f:
-			stats = json.load(f)
 		if feedback == FeedBack.GOOD_BOT:
-			stats["good"] += 1
+			self.stats.add("good", 1)
 		elif feedback == FeedBack.BAD_BOT:
-			stats["bad"] += 1
-		with open(self.stats_path, "w") as f:
-			json.dump(stats, f)
+			self.stats.add("bad", 1)
+
+		stats = self.stats.get()
+		return stats["good"], stats["bad"]
+
+
+# Same interface as FileManager, backed by one SQLite database
+# All the writes of a run are made in one transaction, committed by flush
+class SQLiteManager:
+	def __init__(self, db_path, banned_subs_path=None, monitored_subs_path=None, events=None, stats_path=None):
+		self.db_path = db_path
+		# Only needed for update_sub_db_from_txt
+		self.banned_subs_path = banned_subs_path
+		self.monitored_subs_path = monitored_subs_path
+		# The event log stays in its own files, which are already compact
+		self.events = events
+		# The stats are also exported to this file on every flush, as the public stats linked from replies
+		self.stats_path = stats_path
+		self.connection = sqlite3.connect(db_path)
+		self.__blocklist = None
+		self.connection.executescript("""
+			CREATE TABLE IF NOT EXISTS stopped_users (name TEXT PRIMARY KEY COLLATE NOCASE) WITHOUT ROWID;
+			CREATE TABLE IF NOT EXISTS subreddits (name TEXT PRIMARY KEY, banned INTEGER NOT NULL) WITHOUT ROWID;
+			CREATE INDEX IF NOT EXISTS subreddits_banned ON subreddits (banned);
+			CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID;
+			INSERT OR IGNORE INTO stats VALUES ('good', 0), ('bad', 0), ('mistake counter', 0), ('total runs', 0);
+		""")
+
+	# Copies the data from the text and JSON files of a FileManager, for moving to the database once
+	def import_files(self, file_manager: FileManager):
+		self.connection.executemany("INSERT OR IGNORE INTO stopped_users VALUES (?)",
+		                            [(user,) for user in file_manager.get_stopped_users()])
+		self.connection.executemany("INSERT OR REPLACE INTO subreddits VALUES (?, ?)",
+		                            file_manager.get_sub_db().items())
+		self.connection.executemany("INSERT OR REPLACE INTO stats VALUES (?, ?)",
+		                            file_manager.get_stats().items())
+		self.flush()
+
+	def flush(self):
+		self.connection.commit()
+		if self.events is not None:
+			self.events.flush()
+		if self.stats_path is not None:
+			write_atomic(self.stats_path, json.dumps(self.get_stats()))
+
+	# Commits and rewrites the database without free pages, so the committed file stays small
+	def close(self):
+		self.flush()
+		self.connection.execute("VACUUM")
+		self.connection.close()
+
+	def get_stats(self) -> dict[str, int]:
+		return dict(self.connection.execute("SELECT name, value FROM stats"))
+
+	def get_sub_db(self) -> dict[str, bool]:
+		return {name: bool(banned) for name, banned in self.connection.execute("SELECT name, banned FROM subreddits")}
+
+	def get_stopped_users(self) -> Blocklist:
+		if self.__blocklist is None:
+			self.__blocklist = Blocklist(name for name, in self.connection.execute("SELECT name FROM stopped_users"))
+		return self.__blocklist
+
+	def update_runs(self):
+		self.__add_to_stat("total runs", 1)
+
+	def update_sub_db(self, subreddit_name: str):
+		self.connection.execute("INSERT OR REPLACE INTO subreddits VALUES (?, 1)", (subreddit_name,))
+
+	def update_sub_db_from_txt(self):
+		with open(self.banned_subs_path, "r") as file:
+			banned_subs = set(file.read().splitlines())
+		with open(self.monitored_subs_path, "r") as file:
+			monitored_subs = file.read().splitlines()
+		self.connection.execute("DELETE FROM subreddits")
+		self.connection.executemany("INSERT OR REPLACE INTO subreddits VALUES (?, ?)",
+		                            [(sub, sub in banned_subs) for sub in monitored_subs])
+
+	def update_mistake_counter(self, num_mistakes: int):
+		self.__add_to_stat("mistake counter", num_mistakes)
+
+	def get_subreddits(self) -> list[str]:
+		monitored_subreddits = [name for name, in self.connection.execute(
+			"SELECT name FROM subreddits WHERE banned = 0")]
+		# Starts from a different subreddit each time in case of ratelimit
+		random.shuffle(monitored_subreddits)
+		return monitored_subreddits
+
+	def add_to_blocklist(self, username: str):
+		if self.get_stopped_users().add(username):
+			self.connection.execute("INSERT OR IGNORE INTO stopped_users VALUES (?)", (username.casefold(),))
+
+	def add_stats(self, amounts: dict[str, int]):
+		for name, amount in amounts.items():
+			self.__add_to_stat(name, amount)
+
+	def log_event(self, kind: str, subreddit_name=None, mistake_names: list[str] = None, timestamp=None):
+		if self.events is not None:
+			self.events.record(kind, subreddit_name, mistake_names, timestamp)
+
+	def update_good_bad(self, feedback: FeedBack) -> tuple[int, int]:
+		if feedback == FeedBack.GOOD_BOT:
+			self.__add_to_stat("good", 1)
+		elif feedback == FeedBack.BAD_BOT:
+			self.__add_to_stat("bad", 1)
+		stats = self.get_stats()
+		return stats["good"], stats["bad"]
+
+	def __add_to_stat(self, name: str, amount: int):
+		self.connection.execute("UPDATE stats SET value = value + ? WHERE name = ?", (amount, name))
+
+	# Opens the database, importing the data files the first time it is used
+	@staticmethod
+	def open_or_import(db_path, file_manager: FileManager) -> "SQLiteManager":
+		exists = os.path.exists(db_path)
+		manager = SQLiteManager(db_path, file_manager.banned_subs_path, file_manager.monitored_subs_path,
+		                        file_manager.events, file_manager.stats_path)
+		if not exists:
+			manager.import_files(file_manager)
+		return manager
+
+
+# Remembers what the bot has already checked in each submission, so repeated runs only check new comments
+class CrawlState:
+	# Without a path the state is only kept in memory for one run, starting from entries if given
+	def __init__(self, path=None, max_age_days=7, entries: dict = None):
+		self.path = path
+		self.max_age_days = max_age_days
+		self.__submissions = dict(entries or {})
+		if self.path is not None:
+			try:
+				with open(self.path, "r") as file:
+					self.__submissions = json.load(file)
+			# A corrupt file only means every submission is checked in full again
+			except (FileNotFoundError, json.JSONDecodeError):
+				pass
+		# Newest comment seen in each submission during this run, only saved once the visit finishes
+		self.__pending = {}
+		# Every comment loaded from each submission during this run, kept for visits cut short by the budget
+		self.__pending_seen = {}
+		self.__lock = threading.Lock()
+		self.skipped_comments = 0
+
+	# Returns True if the submission has no new comments since the last visit, or has been finished
+	# Skipping a post still counts as a visit, so posts that stay listed for weeks don't expire and get checked again
+	# Posts whose last visit was cut short are visited again to load the rest
+	def is_unchanged(self, submission) -> bool:
+		with self.__lock:
+			entry = self.__submissions.get(submission.id)
+			if entry is None:
+				return False
+			unchanged = entry.get("done", False) or ("seen" not in entry and
+			                                         entry["comment count"] == submission.num_comments)
+			if unchanged:
+				entry["last visit"] = time.time()
+		return unchanged
+
+	# Returns the comments that are newer than the newest one seen in the last complete visit, and weren't seen
+	# in the visits cut short since
+	def new_comments(self, submission, comments) -> list:
+		entry = self.__submissions.get(submission.id)
+		newest = CrawlState.__newest(comments)
+		with self.__lock:
+			if newest is not None:
+				pending = self.__pending.get(submission.id)
+				self.__pending[submission.id] = newest if pending is None else max(pending, newest)
+			self.__pending_seen.setdefault(submission.id, set()).update(comment.id for comment in comments)
+			if entry is None:
+				return list(comments)
+			last_seen = (entry["last created"], int(entry["last comment"], 36))
+			seen = set(entry.get("seen", ()))
+			new = [comment for comment in comments
+			       if (comment.created_utc, int(comment.id, 36)) > last_seen and comment.id not in seen]
+			self.skipped_comments += len(comments) - len(new)
+		return new
+
+	# Ids of the comments seen in the visits cut short since the last complete one
+	def seen(self, submission) -> set[str]:
+		with self.__lock:
+			return set(self.__submissions.get(submission.id, {}).get("seen", ()))
+
+	# Records the visit; if some comments weren't loaded, the ones that were are remembered so the next visit
+	# carries on with the rest
+	def finish_visit(self, submission, complete=True, done=False):
+		with self.__lock:
+			newest = self.__pending.pop(submission.id, None)
+			seen = self.__pending_seen.pop(submission.id, set())
+			entry = self.__submissions.setdefault(submission.id, {"last created": 0, "last comment": "0"})
+			entry["comment count"] = submission.num_comments
+			entry["last visit"] = time.time()
+			if not complete and not done:
+				entry["seen"] = sorted(seen.union(entry.get("seen", ())))
+				return
+			entry.pop("seen", None)
+			if newest is not None:
+				entry["last created"], last_comment = max(newest, (entry["last created"], int(entry["last comment"], 36)))
+				entry["last comment"] = CrawlState.to_base36(last_comment)
+			if done:
+				entry["done"] = True
+
+	# Removes submissions that haven't been visited for a while
+	def expire(self):
+		cutoff = time.time() - self.max_age_days * 86400
+		with self.__lock:
+			self.__submissions = {submission_id: entry for submission_id, entry in self.__submissions.items()
+			                      if entry["last visit"] >= cutoff}
+
+	def save(self):
+		self.expire()
+		if self.path is None:
+			return
+		with self.__lock:
+			text = json.dumps(self.__submissions)
+		write_atomic(self.path, text)
+
+	def entries(self) -> dict[str, dict]:
+		with self.__lock:
+			return {submission_id: dict(entry) for submission_id, entry in self.__submissions.items()}
+
+	# Returns the entries changed since base, with None for the ones removed, so another copy can apply them
+	def changes_since(self, base: dict[str, dict]) -> dict[str, Optional[dict]]:
+		entries = self.entries()
+		changes = {submission_id: entry for submission_id, entry in entries.items() if base.get(submission_id) != entry}
+		changes.update({submission_id: None for submission_id in base if submission_id not in entries})
+		return changes
+
+	def apply(self, changes: dict[str, Optional[dict]]):
+		with self.__lock:
+			for submission_id, entry in changes.items():
+				if entry is None:
+					self.__submissions.pop(submission_id, None)
+				else:
+					self.__submissions[submission_id] = entry
+
+	@staticmethod
+	def __newest(comments):
+		keys = [(comment.created_utc, int(comment.id, 36)) for comment in comments]
+		return max(keys) if keys else None
+
+	@staticmethod
+	def to_base36(number: int) -> str:
+		digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+		result = ""
+		while True:
+			number, remainder = divmod(number, 36)
+			result = digits[remainder] + result
+			if number == 0:
+				return result
+
+
+# Position of the comment stream, so a restarted daemon carries on after the last comment it checked
+# Comment ids are base 36 and increase over time across all of Reddit
+class StreamCheckpoint:
+	# Without a path the position is only kept in memory
+	def __init__(self, path=None):
+		self.path = path
+		self.last_comment = 0
+		if self.path is not None:
+			try:
+				with open(self.path, "r") as file:
+					self.last_comment = int(json.load(file)["last comment"], 36)
+			except FileNotFoundError:
+				pass
+			# Starting over only checks the newest comments of the stream again
+			except (ValueError, KeyError, TypeError) as e:
+				print(f"Corrupt stream checkpoint {self.path} ({e!r}), starting from the newest comments")
+
+	def advance(self, comments):
+		self.last_comment = max([self.last_comment] + [int(comment.id, 36) for comment in comments])
 
-		return stats["good"], stats["bad"]
\ No newline at end of file
+	def save(self):
+		if self.path is None:
+			return
+		write_atomic(self.path, json.dumps({"last comment": CrawlState.to_base36(self.last_comment)}))
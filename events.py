@@ -0,0 +1,170 @@
+import datetime
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+
+from atomic import write_atomic
+
+# Kind of the events for corrections; inbox events use the MessageKind values ("stop", "good bot", "bad bot", "ban")
+CORRECTION = "correction"
+
+
+# Append-only log of what the bot does (corrections, feedback, stop requests and bans), one file of events per day
+# Counts by hour, by day and in total are updated as events are recorded, so stats for any period are read from the
+# rollups instead of from every event
+# Day files older than raw_days are compacted into one gzipped file per month, and hourly rollups are kept for
+# hourly_days
+class EventLog:
+	def __init__(self, directory, raw_days=14, hourly_days=14):
+		self.directory = directory
+		self.raw_days = raw_days
+		self.hourly_days = hourly_days
+		self.rollups_path = os.path.join(directory, "rollups.json")
+		# Loaded on first use
+		self.__rollups = None
+		# Lines not written yet, by day
+		self.__pending: dict[str, list[str]] = {}
+		self.__lock = threading.Lock()
+
+	def __load(self) -> dict:
+		if self.__rollups is None:
+			try:
+				with open(self.rollups_path, "r") as file:
+					rollups = json.load(file)
+				self.__rollups = {period: dict(rollups[period]) for period in ["total", "daily", "hourly"]}
+			except FileNotFoundError:
+				self.__rollups = {"total": {}, "daily": {}, "hourly": {}}
+			# Every event is still in the day files and archives, so the counts can be made again
+			except (ValueError, KeyError, TypeError) as e:
+				print(f"Corrupt rollups {self.rollups_path} ({e!r}), counting the events again")
+				self.__rollups = self.__rebuild()
+		return self.__rollups
+
+	# Counts every event in the day files and archives, for when the rollups file can't be read
+	# The hourly counts that are too old are dropped at the next flush
+	def __rebuild(self) -> dict:
+		rollups = {"total": {}, "daily": {}, "hourly": {}}
+		names = sorted(os.listdir(self.directory)) if os.path.isdir(self.directory) else []
+		for name in names:
+			if name.endswith(".jsonl.gz"):
+				file = gzip.open(os.path.join(self.directory, name), "rt")
+			elif name.endswith(".jsonl"):
+				file = open(os.path.join(self.directory, name), "r")
+			else:
+				continue
+			with file:
+				for line in file:
+					try:
+						EventLog.count(rollups, *json.loads(line))
+					# A line cut short by an interrupted run
+					except (ValueError, TypeError):
+						continue
+		return rollups
+
+	# Adds an event to the total, daily and hourly rollups, and returns its day
+	@staticmethod
+	def count(rollups: dict, timestamp: int, kind: str, subreddit_name, mistake_names) -> str:
+		moment = datetime.datetime.fromtimestamp(timestamp, datetime.UTC)
+		day = moment.strftime("%Y-%m-%d")
+		for bucket in [rollups["total"], rollups["daily"].setdefault(day, {}),
+		               rollups["hourly"].setdefault(moment.strftime("%Y-%m-%dT%H"), {})]:
+			EventLog.add(bucket, kind, subreddit_name, mistake_names)
+		return day
+
+	# Corrections are tagged with the mistakes corrected in them
+	def record(self, kind: str, subreddit_name=None, mistake_names: list[str] = None, timestamp=None):
+		timestamp = int(time.time() if timestamp is None else timestamp)
+		# Lowercase like in ban notices, so each subreddit is counted under one name
+		subreddit_name = subreddit_name.lower() if subreddit_name else None
+		with self.__lock:
+			day = EventLog.count(self.__load(), timestamp, kind, subreddit_name, mistake_names)
+			self.__pending.setdefault(day, []).append(
+				json.dumps([timestamp, kind, subreddit_name, mistake_names], separators=(",", ":")) + "\n")
+
+	# Counts an event in a rollup: {kind: {"count": n, "subreddits": {name: n}, "mistakes": {name: n}}}
+	@staticmethod
+	def add(bucket: dict, kind: str, subreddit_name, mistake_names):
+		counts = bucket.setdefault(kind, {"count": 0})
+		counts["count"] += 1
+		if subreddit_name is not None:
+			subreddits = counts.setdefault("subreddits", {})
+			subreddits[subreddit_name] = subreddits.get(subreddit_name, 0) + 1
+		if mistake_names:
+			mistake_counts = counts.setdefault("mistakes", {})
+			for mistake_name in mistake_names:
+				mistake_counts[mistake_name] = mistake_counts.get(mistake_name, 0) + 1
+
+	def segment_path(self, day: str) -> str:
+		return os.path.join(self.directory, f"{day}.jsonl")
+
+	# Compacted day files of a month ("%Y-%m")
+	def archive_path(self, month: str) -> str:
+		return os.path.join(self.directory, f"{month}.jsonl.gz")
+
+	# Appends the new events to their day's file and writes the rollups, then compacts what is too old
+	def flush(self, now=None):
+		with self.__lock:
+			if not self.__pending:
+				return
+			os.makedirs(self.directory, exist_ok=True)
+			for day, lines in self.__pending.items():
+				with open(self.segment_path(day), "a") as file:
+					file.writelines(lines)
+			self.__pending = {}
+			self.__compact(time.time() if now is None else now)
+			write_atomic(self.rollups_path, json.dumps(self.__rollups, separators=(",", ":"), sort_keys=True))
+
+	# The events of one day, as (timestamp, kind, subreddit name, mistake names) lists, from its month's archive once
+	# it has been compacted
+	def read(self, day: str) -> list[list]:
+		events = []
+		try:
+			with gzip.open(self.archive_path(day[:7]), "rt") as file:
+				events += [event for event in map(json.loads, file) if EventLog.day_of(event[0]) == day]
+		except FileNotFoundError:
+			pass
+		try:
+			with open(self.segment_path(day), "r") as file:
+				events += [json.loads(line) for line in file]
+		except FileNotFoundError:
+			pass
+		return events
+
+	@staticmethod
+	def day_of(timestamp: int) -> str:
+		return datetime.datetime.fromtimestamp(timestamp, datetime.UTC).strftime("%Y-%m-%d")
+
+	# Moves the day files that are too old to their month's archive, and drops the hourly rollups that are too old,
+	# their counts being in the daily rollups
+	def __compact(self, now: float):
+		moment = datetime.datetime.fromtimestamp(now, datetime.UTC)
+		raw_cutoff = (moment - datetime.timedelta(days=self.raw_days)).strftime("%Y-%m-%d")
+		for name in sorted(os.listdir(self.directory)):
+			if name.endswith(".jsonl") and name[:-len(".jsonl")] < raw_cutoff:
+				path = os.path.join(self.directory, name)
+				with open(path, "rb") as segment:
+					lines = segment.read()
+				# Appending adds a gzip member, which is read back as the rest of the same file
+				with gzip.open(self.archive_path(name[:7]), "ab") as archive:
+					archive.write(lines)
+				os.remove(path)
+		hourly_cutoff = (moment - datetime.timedelta(days=self.hourly_days)).strftime("%Y-%m-%dT%H")
+		hourly = self.__rollups["hourly"]
+		for hour in [hour for hour in hourly if hour < hourly_cutoff]:
+			del hourly[hour]
+
+	# Stats for a page or JSON endpoint: totals, the last days and the last hours, from the rollups only
+	def summary(self, days=30, hours=48) -> dict:
+		with self.__lock:
+			rollups = self.__load()
+			return {"total": rollups["total"],
+			        "daily": {day: rollups["daily"][day] for day in sorted(rollups["daily"])[-days:]},
+			        "hourly": {hour: rollups["hourly"][hour] for hour in sorted(rollups["hourly"])[-hours:]}}
+
+
+# Prints the stats summary as JSON: python events.py [directory]
+if __name__ == "__main__":
+	print(json.dumps(EventLog(sys.argv[1] if len(sys.argv) > 1 else "data/events").summary(), indent=4))
@@ -0,0 +1,123 @@
+import datetime
+import heapq
+import itertools
+import threading
+from collections import deque
+from typing import Iterator, Optional
+
+from praw import models
+
+# Breaks ties between MoreComments of the same size, in the order they were found
+_order = itertools.count()
+
+
+# Limits on how many extra requests are spent loading hidden (MoreComments) comments
+class ExpansionPolicy:
+	def __init__(self, submission_budget: Optional[int] = 32, run_budget: Optional[int] = 1000,
+	             max_depth: Optional[int] = None, max_age_hours: Optional[float] = None, streaming=False):
+		# Maximum requests per submission and per run (None for no limit)
+		self.submission_budget = submission_budget
+		self.run_budget = run_budget
+		# MoreComments deeper than this aren't loaded
+		self.max_depth = max_depth
+		# Posts older than this are only checked with the comments loaded with the post
+		self.max_age_hours = max_age_hours
+		# Check each batch of comments as soon as it's loaded instead of waiting for the whole tree
+		self.streaming = streaming
+
+
+# Loads the comments of a submission within the limits of an ExpansionPolicy
+# Each MoreComments object costs one request, like in praw's replace_more
+class CommentExpander:
+	def __init__(self, policy: ExpansionPolicy = None):
+		self.policy = policy or ExpansionPolicy()
+		self.run_requests = 0
+		# Requests spent on each submission, so the budgets can be tuned
+		self.requests_per_submission = {}
+		# Submissions with comments left unloaded when the budget ran out
+		self.incomplete = set()
+		self.__lock = threading.Lock()
+
+	# Yields lists of comments to check; one list with every comment unless the policy is streaming
+	# MoreComments hiding only comments in seen (checked in an earlier visit) are loaded last
+	def iter_batches(self, submission: models.Submission, seen=frozenset()) -> Iterator[list[models.Comment]]:
+		more_comments = []
+		batch = self.__flatten(submission.comments, more_comments, seen)
+		requests = 0
+		out_of_budget = False
+		if self.policy.streaming:
+			yield batch
+			batch = []
+
+		# Old posts are only checked with the comments loaded with the post
+		if not self.__is_too_old(submission):
+			while more_comments:
+				# Load the biggest MoreComments with unseen comments first, for the most comments per request
+				all_seen, _, _, more = heapq.heappop(more_comments)
+				if self.policy.max_depth is not None and getattr(more, "depth", 0) > self.policy.max_depth:
+					continue
+				if not self.__reserve_request(requests):
+					# Unseen comments are loaded first, so if this one is seen only comments checked before are left
+					out_of_budget = not all_seen
+					break
+				requests += 1
+				new_comments = self.__flatten(more.comments(), more_comments, seen)
+				if self.policy.streaming:
+					yield new_comments
+				else:
+					batch += new_comments
+
+		self.requests_per_submission[submission.id] = requests
+		if out_of_budget:
+			self.incomplete.add(submission.id)
+		else:
+			self.incomplete.discard(submission.id)
+		print(f"Expanded {submission.id} with {requests} requests")
+		if not self.policy.streaming:
+			yield batch
+
+	# Returns True if the last expansion of the submission stopped because it ran out of budget
+	def is_incomplete(self, submission: models.Submission) -> bool:
+		return submission.id in self.incomplete
+
+	def __is_too_old(self, submission: models.Submission) -> bool:
+		if self.policy.max_age_hours is None:
+			return False
+		age = datetime.datetime.now(datetime.UTC) - datetime.datetime.fromtimestamp(
+			submission.created_utc, datetime.UTC)
+		return age > datetime.timedelta(hours=self.policy.max_age_hours)
+
+	# Returns True and counts the request if it fits in the budgets
+	def __reserve_request(self, requests: int) -> bool:
+		if self.policy.submission_budget is not None and requests >= self.policy.submission_budget:
+			return False
+		# Shared by every thread in pipeline mode
+		with self.__lock:
+			if self.policy.run_budget is not None and self.run_requests >= self.policy.run_budget:
+				return False
+			self.run_requests += 1
+		return True
+
+	# Returns the comments in the tree breadth first, and adds any MoreComments to the heap
+	@staticmethod
+	def __flatten(items, more_comments: list, seen=frozenset()) -> list[models.Comment]:
+		comments = []
+		pending = deque(items)
+		while pending:
+			item = pending.popleft()
+			if isinstance(item, models.MoreComments):
+				# Links to deeper threads have no children, so they can't be told apart
+				children = getattr(item, "children", None) or []
+				all_seen = bool(children) and all(child in seen for child in children)
+				heapq.heappush(more_comments, (all_seen, -getattr(item, "count", 0), next(_order), item))
+				continue
+			comments.append(item)
+			pending.extend(item.replies)
+		return comments
+
+	# Summary of the requests spent in this run
+	def report(self) -> dict:
+		return {
+			"run requests": self.run_requests,
+			"requests per submission": dict(self.requests_per_submission),
+		}
@@ -0,0 +1,386 @@
+import json
+import os
+import random
+import threading
+import time
+
+from praw import models
+from prawcore.exceptions import TooManyRequests
+
+from corpus import CorpusGenerator
+from data_manager import CrawlState
+from ratelimit import READ, WRITE
+
+# Depth at which Reddit stops showing replies and links to the rest of the thread instead
+CONTINUE_DEPTH = 10
+
+# The files FileManager takes, in the order it takes them
+DATA_FILES = ["stopped.txt", "stats.json", "banned.txt", "db.json", "monitored.txt"]
+
+EMPTY_STATS = {"good": 0, "bad": 0, "mistake counter": 0, "total runs": 0}
+
+
+# Writes a fresh set of data files in directory and returns their paths, for FileManager(*paths) in offline runs
+# sub_db is the banned state of each subreddit, and every other file starts empty
+def write_data_files(directory: str, sub_db: dict[str, bool] = None, stats: dict[str, int] = None) -> list[str]:
+	paths = [os.path.join(directory, name) for name in DATA_FILES]
+	contents = ["", json.dumps(stats or EMPTY_STATS), "", json.dumps(sub_db or {}), ""]
+	for path, text in zip(paths, contents):
+		with open(path, "w") as f:
+			f.write(text)
+	return paths
+
+
+# In-process stand-in for the parts of praw.Reddit the bot uses, so runs can be measured offline
+# Every method that would be an API call waits for the rate limiter and the simulated latency
+class FakeReddit:
+	# rate_limit_rate is the chance of any request being refused with 429, which is retried like LimitedRequestor
+	# does, after retry_after seconds, up to max_retries times
+	def __init__(self, subreddits=None, messages=None, latency=0.0, limiter=None, rate_limit_rate=0.0,
+	             retry_after=0.0, max_retries=5, seed=0):
+		self.subreddits = subreddits or {}
+		self.latency = latency
+		self.limiter = limiter
+		self.inbox = FakeInbox(self, messages or [])
+		# Every comment in the order it was posted, for comment streams
+		self.comments = []
+		self.requests = 0
+		self.replies = []
+		self.rate_limit_rate = rate_limit_rate
+		self.retry_after = retry_after
+		self.max_retries = max_retries
+		# Requests refused with 429
+		self.rate_limited = 0
+		self.__random = random.Random(seed)
+		self.__comments_by_id = {}
+		self.__lock = threading.Lock()
+
+	# Like praw.Reddit.request when given a path: returns the raw JSON of the endpoints RawCommentLoader uses
+	# Otherwise counts one API call
+	def request(self, priority=READ, *, method=None, path=None, params=None):
+		if path is not None:
+			self.request(READ if method.upper() == "GET" else WRITE)
+			return self.raw_json(path, params or {})
+		attempt = 0
+		while True:
+			if self.limiter is not None:
+				self.limiter.acquire(priority)
+			with self.__lock:
+				self.requests += 1
+				refused = self.rate_limit_rate and self.__random.random() < self.rate_limit_rate
+				if refused:
+					self.rate_limited += 1
+			if self.latency:
+				time.sleep(self.latency)
+			if not refused:
+				return
+			response = FakeResponse(429, {"retry-after": str(self.retry_after)})
+			if attempt >= self.max_retries:
+				raise TooManyRequests(response)
+			if self.limiter is not None:
+				self.limiter.wait_to_retry(response.headers, attempt)
+			attempt += 1
+
+	def record_reply(self, target, body: str):
+		with self.__lock:
+			self.replies.append((target, body))
+
+	# Names joined with "+" give a multireddit, like on Reddit
+	def subreddit(self, name: str) -> "FakeSubreddit":
+		return FakeSubreddit(self, name, [submission for subreddit_name in name.split("+")
+		                                  for submission in self.subreddits.get(subreddit_name, [])])
+
+	def redditor(self, name: str) -> "FakeRedditor":
+		return FakeRedditor(self, name)
+
+	# Like praw, a comment by ID is only fetched when it is used
+	def comment(self, comment_id: str) -> "FakeComment":
+		comment = self.__comments_by_id.get(comment_id)
+		if comment is None:
+			# Comments can be added to the list directly, so the index is rebuilt when one is missing
+			self.__comments_by_id = {comment.id: comment for comment in self.comments}
+			comment = self.__comments_by_id[comment_id]
+		return comment
+
+	def raw_json(self, path: str, params: dict):
+		if path == "api/morechildren":
+			return {"json": {"data": {"things": [self.comment(comment_id).to_json()
+			                                     for comment_id in params["children"].split(",")]}}}
+		# comments/<submission>, or comments/<submission>/_/<comment> for one comment's thread
+		parts = path.split("/")
+		submission = next(submission for submissions in self.subreddits.values() for submission in submissions
+		                  if submission.id == parts[1])
+		items = [self.comment(parts[3])] if len(parts) == 4 else list(submission.comments)
+		return [{"kind": "Listing", "data": {"children": [submission.to_json()]}},
+		        {"kind": "Listing", "data": {"children": [item.to_json() for item in items]}}]
+
+	# Builds a random set of subreddits and posts, seeded so runs can be compared
+	# With reply_depth, each comment has on average replies_per_comment replies, down to that depth; like on Reddit,
+	# replies past more_comments_size and threads deeper than CONTINUE_DEPTH are behind MoreComments
+	# num_messages messages are put in the inbox: stop requests, feedback, replies from bots and others
+	@staticmethod
+	def generate(num_subreddits=5, submissions_per_subreddit=20, comments_per_submission=50, mistake_rate=0.05,
+	             more_comments_size=20, latency=0.0, limiter=None, seed=0, reply_depth=0, replies_per_comment=1,
+	             num_messages=0, rate_limit_rate=0.0, retry_after=0.0) -> "FakeReddit":
+		rng = random.Random(seed)
+		corpus = CorpusGenerator(seed=seed, mistake_rate=mistake_rate)
+		reddit = FakeReddit(latency=latency, limiter=limiter, rate_limit_rate=rate_limit_rate,
+		                    retry_after=retry_after, seed=seed)
+		next_id = [0]
+
+		def new_id() -> str:
+			next_id[0] += 1
+			return CrawlState.to_base36(next_id[0])
+
+		def new_comment(submission, subreddit, depth) -> FakeComment:
+			author = FakeRedditor(reddit, f"user{rng.randint(0, 10000)}")
+			comment = FakeComment(reddit, new_id(), corpus.comment(), author, submission.created_utc, depth=depth,
+			                      subreddit=subreddit)
+			reddit.comments.append(comment)
+			if depth < reply_depth:
+				replies = [new_comment(submission, subreddit, depth + 1)
+				           for _ in range(rng.randint(0, 2 * replies_per_comment))]
+				comment.replies = FakeReddit.hide_replies(reddit, replies, more_comments_size, depth + 1)
+			return comment
+
+		for subreddit_index in range(num_subreddits):
+			subreddit = FakeSubreddit(reddit, f"subreddit{subreddit_index}", [])
+			submissions = []
+			for _ in range(submissions_per_subreddit):
+				submission = FakeSubmission(reddit, new_id(), created_utc=time.time() - rng.randint(0, 2 * 86400))
+				first_comment = len(reddit.comments)
+				comments = [new_comment(submission, subreddit, 0) for _ in range(comments_per_submission)]
+				submission.comments = FakeCommentForest(reddit, comments, more_comments_size)
+				submission.num_comments = len(reddit.comments) - first_comment
+				submissions.append(submission)
+			reddit.subreddits[subreddit.display_name] = submissions
+
+		bodies = ["stop", "Good bot", "bad bot", "Thanks for the correction!"]
+		for index in range(num_messages):
+			author = FakeRedditor(reddit, f"user{rng.randint(0, 10000)}" if rng.random() > 0.1 else "some_bot")
+			reddit.inbox.messages.append(FakeMessage(reddit, CrawlState.to_base36(index + 1), rng.choice(bodies),
+			                                         author))
+		return reddit
+
+	# The replies shown with a comment, with the rest behind a MoreComments
+	@staticmethod
+	def hide_replies(reddit, replies, more_comments_size: int, depth: int) -> list:
+		# Threads this deep are only linked ("continue this thread")
+		if depth % CONTINUE_DEPTH == 0 and replies:
+			return [FakeMoreComments(reddit, replies, depth)]
+		if len(replies) <= more_comments_size:
+			return replies
+		return replies[:more_comments_size] + [FakeMoreComments(reddit, replies[more_comments_size:], depth)]
+
+
+# Enough of a requests.Response for prawcore's exceptions
+class FakeResponse:
+	def __init__(self, status_code: int, headers: dict = None):
+		self.status_code = status_code
+		self.headers = headers or {}
+		self.text = ""
+
+
+class FakeSubreddit:
+	def __init__(self, reddit: FakeReddit, display_name: str, submissions):
+		self._reddit = reddit
+		self.display_name = display_name
+		self.__submissions = submissions
+		self.stream = FakeSubredditStream(self)
+
+	def hot(self, limit=100):
+		self._reddit.request()
+		return iter(self.__submissions[:limit])
+
+
+class FakeSubredditStream:
+	def __init__(self, subreddit: FakeSubreddit):
+		self.subreddit = subreddit
+
+	# Like praw's stream: each request returns up to the 100 newest comments, and the unseen ones are yielded
+	# oldest first. With pause_after set, None is yielded after each request that finds nothing new.
+	def comments(self, pause_after=None, skip_existing=False):
+		reddit = self.subreddit._reddit
+		names = set(self.subreddit.display_name.split("+"))
+		seen = set()
+		first_request = True
+		while True:
+			reddit.request()
+			newest = [comment for comment in reddit.comments if comment.subreddit.display_name in names][-100:]
+			new = [comment for comment in newest if comment.id not in seen]
+			seen.update(comment.id for comment in new)
+			if new and not (first_request and skip_existing):
+				yield from new
+			elif pause_after is not None:
+				yield None
+			elif not first_request:
+				# praw would keep polling, but nothing else is posted unless a test adds comments
+				return
+			first_request = False
+
+
+class FakeRedditor:
+	def __init__(self, reddit: FakeReddit, name: str):
+		self._reddit = reddit
+		self.name = name
+
+	def message(self, subject: str, message: str):
+		self._reddit.request(WRITE)
+		self._reddit.record_reply(self, message)
+
+
+class FakeSubmission:
+	def __init__(self, reddit: FakeReddit, submission_id: str, created_utc: float, saved=False, locked=False):
+		self._reddit = reddit
+		self.id = submission_id
+		self.created_utc = created_utc
+		self.saved = saved
+		self.locked = locked
+		self.num_comments = 0
+		self.comments = None
+
+	def save(self):
+		self._reddit.request(WRITE)
+		self.saved = True
+
+	def to_json(self) -> dict:
+		return {"kind": "t3", "data": {"id": self.id, "name": f"t3_{self.id}", "created_utc": self.created_utc,
+		                               "num_comments": self.num_comments, "saved": self.saved, "locked": self.locked}}
+
+
+class FakeComment:
+	def __init__(self, reddit: FakeReddit, comment_id: str, body: str, author, created_utc: float, replies=None,
+	             depth=0, subreddit=None):
+		self._reddit = reddit
+		self.id = comment_id
+		self.subreddit = subreddit
+		self.body = body
+		self.author = author
+		self.created_utc = created_utc
+		self.saved = False
+		self.replies = replies or []
+		self.depth = depth
+
+	@property
+	def fullname(self) -> str:
+		return f"t1_{self.id}"
+
+	def save(self):
+		self._reddit.request(WRITE)
+		self.saved = True
+
+	def reply(self, body: str):
+		self._reddit.request(WRITE)
+		self._reddit.record_reply(self, body)
+
+	# The comment as Reddit's API returns it, with its replies
+	def to_json(self) -> dict:
+		replies = {"kind": "Listing", "data": {"children": [reply.to_json() for reply in self.replies]}}
+		return {"kind": "t1", "data": {"id": self.id, "name": f"t1_{self.id}", "body": self.body,
+		                               "author": self.author.name if self.author else "[deleted]",
+		                               "saved": self.saved, "created_utc": self.created_utc, "depth": self.depth,
+		                               "replies": replies if self.replies else ""}}
+
+
+# Placeholder for comments that have to be loaded with another request
+# Subclasses praw's MoreComments so code can tell them apart from comments the same way
+class FakeMoreComments(models.MoreComments):
+	def __init__(self, reddit: FakeReddit, children, depth=0):
+		super().__init__(reddit, _data={"count": len(children), "children": [child.id for child in children],
+		                                "depth": depth, "parent_id": None, "id": children[0].id if children else None})
+		self.__loaded = children
+
+	def comments(self, update=True):
+		self._reddit.request()
+		return list(self.__loaded)
+
+	def to_json(self) -> dict:
+		return {"kind": "more", "data": {"count": self.count, "children": list(self.children), "depth": self.depth,
+		                                 "parent_id": self.parent_id, "id": self.id}}
+
+
+class FakeCommentForest:
+	# All but the first batch of comments are hidden behind MoreComments, one request per batch
+	def __init__(self, reddit: FakeReddit, comments, more_comments_size=20):
+		self._reddit = reddit
+		self.__items = list(comments[:more_comments_size])
+		for start in range(more_comments_size, len(comments), more_comments_size):
+			self.__items.append(FakeMoreComments(reddit, comments[start:start + more_comments_size]))
+
+	def __iter__(self):
+		return iter(self.__items)
+
+	# Loads up to limit MoreComments (all of them if limit is None) and returns the ones left over
+	def replace_more(self, limit=32, threshold=0):
+		replaced = 0
+		while limit is None or replaced < limit:
+			more = next((item for item in self.__items if isinstance(item, FakeMoreComments)), None)
+			if more is None:
+				break
+			index = self.__items.index(more)
+			self.__items[index:index + 1] = more.comments()
+			replaced += 1
+		return [item for item in self.__items if isinstance(item, FakeMoreComments)]
+
+	# Flattens the tree breadth first, like praw's CommentForest.list
+	def list(self):
+		flattened = []
+		pending = list(self.__items)
+		while pending:
+			item = pending.pop(0)
+			flattened.append(item)
+			if isinstance(item, FakeComment):
+				pending += item.replies
+		return flattened
+
+
+# An item in the inbox: a private message, or with comment_reply a reply to one of the bot's comments
+class FakeMessage:
+	def __init__(self, reddit: FakeReddit, message_id: str, body: str, author, subject="", subreddit=None,
+	             comment_reply=False):
+		self._reddit = reddit
+		self.id = message_id
+		self.body = body
+		self.author = author
+		self.subject = subject
+		self.subreddit = subreddit
+		self.comment_reply = comment_reply
+		self.new = True
+
+	@property
+	def fullname(self) -> str:
+		return f"{'t1' if self.comment_reply else 't4'}_{self.id}"
+
+	def mark_read(self):
+		self._reddit.request(WRITE)
+		self.new = False
+
+	def reply(self, body: str):
+		self._reddit.request(WRITE)
+		self._reddit.record_reply(self, body)
+
+
+class FakeInbox:
+	def __init__(self, reddit: FakeReddit, messages):
+		self._reddit = reddit
+		self.messages = messages
+
+	def unread(self, limit=100):
+		self._reddit.request()
+		return iter([message for message in self.messages if message.new][:limit])
+
+	def all(self, limit=100):
+		self._reddit.request()
+		return iter(self.messages[:limit])
+
+	def message(self, message_id: str) -> FakeMessage:
+		self._reddit.request()
+		return next(message for message in self.messages if message.id == message_id)
+
+	# Like praw, one request for every 25 messages
+	def mark_read(self, items):
+		for start in range(0, len(items), 25):
+			self._reddit.request(WRITE)
+			for item in items[start:start + 25]:
+				item.new = False
+
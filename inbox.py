@@ -0,0 +1,104 @@
+import traceback
+from enum import Enum
+
+from praw.exceptions import RedditAPIException
+from prawcore.exceptions import Forbidden
+
+from reply import FeedBack, ReplyManager
+
+
+class MessageKind(Enum):
+	BAN = "ban"
+	STOP = "stop"
+	BOT = "bot"
+	GOOD_BOT = "good bot"
+	BAD_BOT = "bad bot"
+	OTHER = "other"
+
+
+# Returns what a message asks for, checking its text once, in order of priority
+def classify(message) -> MessageKind:
+	if "banned" in (message.subject or "").lower():
+		# Only ban notices come from a subreddit; a private message about a ban is left for a human
+		return MessageKind.BAN if getattr(message, "subreddit", None) is not None else MessageKind.OTHER
+	body = message.body.lower()
+	if "stop" in body:
+		return MessageKind.STOP
+	if message.author is not None and "bot" in message.author.name.lower():
+		return MessageKind.BOT
+	if "good bot" in body:
+		return MessageKind.GOOD_BOT
+	if "bad bot" in body:
+		return MessageKind.BAD_BOT
+	return MessageKind.OTHER
+
+
+# Handles the inbox in one pass: one listing, one action per new message and the handled messages
+# marked read in batches at the end
+class InboxEngine:
+	def __init__(self, reddit, reply_manager: ReplyManager, file_manager, limit=100):
+		self.reddit = reddit
+		self.reply_manager = reply_manager
+		self.file_manager = file_manager
+		self.limit = limit
+		# Messages handled in each category in this run
+		self.handled = {kind: 0 for kind in MessageKind}
+
+	def process(self):
+		to_mark = []
+		banned = self.file_manager.get_sub_db()
+		try:
+			for message in self.reddit.inbox.all(limit=self.limit):
+				kind = classify(message)
+				# Ban notices are checked even once read, since there is no request to make for ones already known
+				if kind is MessageKind.BAN:
+					self.handle_ban(message, banned)
+				elif not message.new or kind is MessageKind.OTHER:
+					# Read messages were handled in an earlier run, and other messages are left for a human
+					continue
+				else:
+					self.handle(message, kind)
+				if message.new:
+					to_mark.append(message)
+		finally:
+			# Whatever was handled is marked read even if the run stops, so it isn't handled twice
+			# praw sends up to 25 messages per request
+			if to_mark:
+				self.reddit.inbox.mark_read(to_mark)
+
+	# Detect subreddit bans and add them to the database, once per subreddit
+	def handle_ban(self, message, banned: dict[str, bool]):
+		subreddit_name: str = message.subreddit.display_name.lower()
+		if banned.get(subreddit_name):
+			return
+		banned[subreddit_name] = True
+		self.file_manager.update_sub_db(subreddit_name)
+		self.file_manager.log_event(MessageKind.BAN.value, subreddit_name)
+		self.handled[MessageKind.BAN] += 1
+
+	# Messages that fail are still marked read, as they would fail again
+	def handle(self, message, kind: MessageKind):
+		try:
+			if kind is MessageKind.STOP:
+				# Users already on the blocklist were sent the message before
+				if message.author.name not in self.file_manager.get_stopped_users():
+					self.reply_manager.stop_message(self.reddit.redditor(message.author.name))
+					self.file_manager.add_to_blocklist(message.author.name)
+					self.log_event(message, kind)
+			elif kind is MessageKind.BOT:
+				self.reply_manager.bot_reply(message)
+			elif kind is MessageKind.GOOD_BOT:
+				self.reply_manager.feedback_reply(message, FeedBack.GOOD_BOT, self.file_manager)
+				self.log_event(message, kind)
+			elif kind is MessageKind.BAD_BOT:
+				self.reply_manager.feedback_reply(message, FeedBack.BAD_BOT, self.file_manager)
+				self.log_event(message, kind)
+		except (Forbidden, AttributeError, RedditAPIException):
+			traceback.print_exc()
+			return
+		self.handled[kind] += 1
+
+	# Feedback replies to a correction are logged with its subreddit; private messages have none
+	def log_event(self, message, kind: MessageKind):
+		subreddit = getattr(message, "subreddit", None)
+		self.file_manager.log_event(kind.value, subreddit.display_name.lower() if subreddit else None)
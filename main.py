@@ -1,41 +1,136 @@
-import traceback
-import backoff
 import praw
 import os
 import datetime
+import signal
+from typing import Protocol
 
 from praw import models
 from prawcore.exceptions import Forbidden, TooManyRequests, NotFound
 from praw.exceptions import RedditAPIException
 from reply import ReplyManager
-from mistakes import MistakeChecker, mistakes
-from data_manager import FileManager
+from outbox import ReplyOutbox, COMMENT
+from templates import ReplyTemplates, REPLIES_PATH
+from inbox import InboxEngine
+from records import RawCommentLoader
+from mistakes import MistakeChecker, Match, mistakes, CACHE_DIR
+from memo import DetectionMemo
+from events import EventLog, CORRECTION
+from preprocess import strip_quotes
+from data_manager import FileManager, SQLiteManager, CrawlState, StreamCheckpoint
+from expansion import CommentExpander, ExpansionPolicy
+from pipeline import CrawlPipeline
+from stream import StreamDaemon
+from ratelimit import RateLimiter, LimitedRequestor
+from metrics import Metrics, timed, profile
+from scheduler import SubredditScheduler
+
+# The parts of praw.Reddit the bot uses, so it can be given a stand-in such as fake_reddit.FakeReddit
+class RedditClient(Protocol):
+	inbox: models.Inbox
+
+	def subreddit(self, display_name: str) -> models.Subreddit: ...
+
+	def redditor(self, name: str) -> models.Redditor: ...
+
+	def comment(self, id: str) -> models.Comment: ...
+
 
 # Main bot class
 class AmmoniumBot:
-	def __init__(self, reply_manager: ReplyManager, file_manager: FileManager, mistake_checker: MistakeChecker):
-		self.file_manager = file_manager
+	def __init__(self, reply_manager: ReplyManager, file_manager: FileManager, mistake_checker: MistakeChecker,
+	             praw_instance: RedditClient = None, crawl_mode="serial", limiter: RateLimiter = None,
+	             expander: CommentExpander = None, crawl_state: CrawlState = None, metrics: Metrics = None,
+	             report_path=None, scheduler: SubredditScheduler = None, stream_daemon_options: dict = None,
+	             first_mistake_only=False, raw_comments=False):
+		# One rate limit budget shared by every request the bot makes
+		self.limiter = limiter or RateLimiter()
+		self.metrics = metrics or Metrics(self.limiter)
+		# Every file access is timed in the run report
+		self.file_manager = self.metrics.instrument(file_manager, "file_manager")
 		self.reply_manager = reply_manager
 		self.mistake_checker = mistake_checker
 		self.stopped_users = self.file_manager.get_stopped_users()
-		self.praw_instance = AmmoniumBot.get_reddit()
+		self.praw_instance = praw_instance or AmmoniumBot.get_reddit(self.limiter)
+		self.inbox = InboxEngine(self.praw_instance, self.reply_manager, self.file_manager)
 		self.monitored_subreddits = self.file_manager.get_subreddits()
 		self.mistakes_found = 0
+		# "serial" checks one subreddit at a time, "pipeline" overlaps fetching, detection and replies,
+		# and "stream" runs until stopped on the comment stream of every subreddit
+		self.crawl_mode = crawl_mode
+		# Created by run in stream mode, with these keyword arguments (such as its checkpoint)
+		self.stream_daemon_options = stream_daemon_options or {}
+		self.stream_daemon = None
+		self.expander = expander or CommentExpander()
+		self.crawl_state = crawl_state or CrawlState()
+		# Where to write the performance report at the end of the run, if anywhere
+		self.report_path = report_path
+		# Picks and orders the subreddits to visit from their history, if set
+		self.scheduler = scheduler
+		# Only correct the first mistake in the list found in a comment, instead of all of them in one reply
+		self.first_mistake_only = first_mistake_only
+		# Parse comment trees into compact records instead of praw objects, for large threads
+		self.comment_loader = RawCommentLoader(self.praw_instance) if raw_comments else None
 
 	def run(self):
+		outbox = self.reply_manager.outbox
 		try:
-			self.check_inbox()
-			self.update_subreddits()
-			self.main_loop()
-			self.file_manager.update_mistake_counter(self.mistakes_found)
+			try:
+				# Queued replies, including ones left from the last run, are sent while the bot crawls
+				if outbox is not None:
+					outbox.start(self.praw_instance, log_event=self.file_manager.log_event)
+				self.check_inbox()
+				# The stream covers every subreddit at once, so there is nothing to schedule
+				if self.scheduler is not None and self.crawl_mode != "stream":
+					self.monitored_subreddits = self.scheduler.plan(self.monitored_subreddits)
+				if self.crawl_mode == "pipeline":
+					self.mistakes_found += CrawlPipeline(self).run(self.monitored_subreddits)
+				elif self.crawl_mode == "stream":
+					self.stream_daemon = StreamDaemon(self, **self.stream_daemon_options)
+					self.mistakes_found += self.stream_daemon.run()
+				else:
+					self.main_loop()
+			finally:
+				# Replies must be on disk before the comments they answer are marked as checked, even if the run fails
+				if outbox is not None:
+					outbox.stop()
+					outbox.save()
+			self.file_manager.update_mistake_counter(self.corrections_sent())
+			print(f"Used {self.expander.run_requests} requests to load more comments")
+			print(f"Skipped {self.crawl_state.skipped_comments} comments checked in earlier runs")
+			self.crawl_state.save()
+			if self.scheduler is not None:
+				self.scheduler.record(self.metrics.report()["subreddits"])
+				self.scheduler.save()
+			self.file_manager.update_runs()
 
 		except RedditAPIException as e:
 			print(e)
 			raise Exception("Reddit API Exception")
-		self.file_manager.update_runs()
+		finally:
+			self.mistake_checker.close()
+			# Writes made before an error are kept as well
+			self.file_manager.flush()
+			if self.report_path:
+				self.metrics.write_report(self.report_path, **self.report_extras())
+
+	# What the expander, inbox, outbox and detection memo did in the run, for the run report
+	def report_extras(self) -> dict:
+		outbox = self.reply_manager.outbox
+		return {"expansion": self.expander.report(),
+		        "skipped comments": self.crawl_state.skipped_comments,
+		        "inbox": {kind.value: count for kind, count in self.inbox.handled.items()},
+		        "outbox": outbox.report() if outbox is not None else {},
+		        "detection_memo": self.mistake_checker.memo.report() if self.mistake_checker.memo is not None else {}}
+
+	# Corrections actually posted in this run, including ones queued in earlier runs
+	def corrections_sent(self) -> int:
+		if self.reply_manager.outbox is None:
+			return self.mistakes_found
+		return self.reply_manager.outbox.sent[COMMENT]
 
 	# Main loop iterates through all subreddits
-	@backoff.on_exception(backoff.expo, TooManyRequests, max_tries=10, raise_on_giveup=False)
+	# Requests refused for the rate limit are retried one at a time by the requestor
+	@timed("main_loop")
 	def main_loop(self) -> None:
 		# Iterate through subreddits
 		for subreddit_name in self.monitored_subreddits:
@@ -43,34 +138,75 @@ class AmmoniumBot:
 
 			# Check all the posts in the subreddit
 			try:
-				self.check_posts(subreddit)
+				with self.metrics.subreddit_timer(subreddit_name):
+					self.check_posts(subreddit)
 
 			# If subreddit is private, skip it
 			except Forbidden:
 				continue
 			except NotFound:
 				continue
+			# Still refused after every retry, so leave the rest for the next run
+			except TooManyRequests:
+				print(f"Rate limited in r/{subreddit_name}, stopping early")
+				break
 
 	# Check all the posts in a subreddit
+	@timed("check_posts")
 	def check_posts(self, subreddit):
-		for submission in subreddit.hot(limit=20):
-			if submission.saved or submission.locked:
-				continue
-
+		for submission in self.get_submissions(subreddit):
 			print(f"{submission.id} in {subreddit.display_name}")
-			submission.comments.replace_more(limit=None)  # Get all comments
 
-			self.check_comments(submission, subreddit.display_name)
+			for comments in self.load_comments(submission):
+				self.check_comments(comments, subreddit.display_name)
+
+			self.finish_submission(submission, subreddit.display_name)
+
+	# Returns the hot posts in a subreddit that still need checking
+	def get_submissions(self, subreddit) -> list[praw.models.Submission]:
+		# Posts without new comments since the last run are skipped before their comments are fetched
+		return [submission for submission in subreddit.hot(limit=20)
+		        if not (submission.saved or submission.locked or self.crawl_state.is_unchanged(submission))]
 
-			# Save submission (do not revisit) if it is older than a day
-			if submission and (datetime.datetime.now(datetime.UTC) - datetime.datetime.fromtimestamp(
-				submission.created_utc, datetime.UTC)).days >= 1:
-				submission.save()  # Save submission so the bot doesn't check it again
-				print(f"Saved submission {submission.id} in {subreddit.display_name}")
+	# Yields the comments in a submission that weren't checked in an earlier run
+	def load_comments(self, submission: praw.models.Submission):
+		# Without a loader, praw fetches the comments on the first access to submission.comments
+		if self.comment_loader is not None:
+			with self.metrics.timer("expand_comments"):
+				submission = self.comment_loader.load(submission)
+		# Comments are loaded within the expansion budget, in batches if the policy is streaming
+		batches = self.expander.iter_batches(submission, self.crawl_state.seen(submission))
+		while True:
+			with self.metrics.timer("expand_comments"):
+				comments = next(batches, None)
+			if comments is None:
+				return
+			yield self.crawl_state.new_comments(submission, comments)
+
+	# Record the visit, and don't revisit the submission if it is older than a day
+	def finish_submission(self, submission: praw.models.Submission, subreddit_name) -> None:
+		done = (datetime.datetime.now(datetime.UTC) - datetime.datetime.fromtimestamp(
+			submission.created_utc, datetime.UTC)).days >= 1
+		self.crawl_state.finish_visit(submission, complete=not self.expander.is_incomplete(submission), done=done)
+		if done:
+			print(f"Finished submission {submission.id} in {subreddit_name}")
+
+	# Check a list of comments from a submission
+	@timed("check_comments")
+	def check_comments(self, comments: list[praw.models.Comment], subreddit_name) -> None:
+		for comment, comment_without_quotes, matches in self.detect_mistakes(comments, subreddit_name):
+			if self.correct_comment(comment, comment_without_quotes, matches, subreddit_name):
+				self.mistakes_found += 1
 
-	# Check all the comments in a submission
-	def check_comments(self, submission: praw.models.Submission, subreddit_name) -> None:
-		for comment in submission.comments.list():
+	# Returns (comment, quote-stripped text, matches) for every comment in the list with a mistake
+	@timed("detect_mistakes")
+	def detect_mistakes(self, comments: list[praw.models.Comment],
+	                    subreddit_name) -> list[tuple[praw.models.Comment, str, list[Match]]]:
+		# Collect every comment worth checking first, so detection runs as one batch
+		checked_comments = []
+		texts = []
+		scanned = 0
+		for comment in comments:
 			# print(f"{comment.id} in {subreddit_name}")
 
 			# Check conditions before replying
@@ -78,76 +214,67 @@ class AmmoniumBot:
 			if any([AmmoniumBot.is_bot(comment), comment.saved, user_stopped]):
 				continue
 
-			# Strip quotes from the comment before checking it
-			comment_without_quotes = "\n".join(
-				line for line in comment.body.split("\n") if not line.startswith(">")
-			).lower()
+			scanned += 1
+			# Comments without any mistake in them, in any case, are never copied or lowercased
+			text = self.mistake_checker.prepare(comment.body)
+			if text is None:
+				continue
+			checked_comments.append(comment)
+			texts.append(text)
+
+		detected_matches = self.mistake_checker.find_matches_batch(texts, first_only=self.first_mistake_only)
+		self.metrics.count("comments scanned", scanned)
+		self.metrics.count_for_subreddit(subreddit_name, "comments scanned", scanned)
 
-			detected_mistake = self.mistake_checker.find_mistake(comment_without_quotes)
+		return [(comment, text, matches) for comment, text, matches in zip(checked_comments, texts, detected_matches)
+		        if matches]
 
-			if detected_mistake is not None:
-				# Save the comment so the bot doesn't reply to it again
-				comment.save()
+	# Reply to a comment with a mistake, returning True if the correction was sent or queued
+	@timed("correct_comment")
+	def correct_comment(self, comment: praw.models.Comment, comment_without_quotes: str, matches: list[Match],
+	                    subreddit_name) -> bool:
+		# Logged with each different mistake corrected in the reply, in order
+		event = (CORRECTION, subreddit_name,
+		         list(dict.fromkeys(match.mistake.get_pattern().strip() for match in matches)))
+		try:
+			# The comment is saved once the reply is sent, so the bot doesn't reply to it again
+			if not self.reply_manager.send_correction(comment=comment,
+			                                          text=comment_without_quotes,
+			                                          matches=matches,
+			                                          subreddit_name=subreddit_name,
+			                                          event=event):
+				return False
 
-				try:
-					self.reply_manager.send_correction(comment=comment,
-					                                   text=comment_without_quotes,
-					                                   mistake=detected_mistake)
+			print(
+				f"Corrected a mistake in comment {comment.id} in {subreddit_name}")
 
-					print(
-						f"Corrected a mistake in comment {comment.id} in {subreddit_name}")
+		# Skip comment if it's deleted or banned from subreddit
+		except Forbidden:
+			return False
 
-				# Skip comment if it's deleted or banned from subreddit
-				except Forbidden:
-					continue
+		self.metrics.count("mistakes found")
+		self.metrics.count_for_subreddit(subreddit_name, "mistakes found")
+		# Queued replies are logged by the outbox once they are sent, like they are counted
+		if self.reply_manager.outbox is None:
+			self.file_manager.log_event(*event)
+		return True
 
-				self.mistakes_found += 1
+	# Strip quotes from the comment before checking it
+	@staticmethod
+	def strip_quotes(body: str) -> str:
+		return strip_quotes(body)
 
 	def is_stopped(self, comment: praw.models.Comment) -> bool:
 		# Check if the user is on the blocklist
 		try:
-			user_stopped = self.stopped_users.get(comment.author.name, False)
+			return comment.author.name in self.stopped_users
 		except AttributeError:
-			user_stopped = False
-		return user_stopped
+			return False
 
+	# Handles stop requests, feedback, bots and subreddit bans in one pass over the inbox
+	@timed("check_inbox")
 	def check_inbox(self):
-		# Reply to messages
-		for message in self.praw_instance.inbox.unread():
-			# print(message.body.lower())
-			try:
-				# Check for STOP command
-				if "stop" in message.body.lower():
-					message.mark_read()
-					# Send a DM
-					user: praw.models.Redditor = self.praw_instance.redditor(message.author.name)
-					self.reply_manager.stop_message(user)
-					# Add user to blocklist
-					self.file_manager.add_to_blocklist(message.author.name)
-
-				# Reply to any bots messages in the inbox
-				self.reply_manager.bot_reply(message)
-
-				# Check for feedback in comments
-				self.reply_manager.check_feedback(message, self.file_manager)
-
-			except Forbidden:
-				traceback.print_exc()
-				continue
-			except AttributeError:
-				traceback.print_exc()
-				continue
-			except RedditAPIException:
-				traceback.print_exc()
-				continue
-
-	def update_subreddits(self):
-		# Detect subreddit bans and add to file
-		for message in self.praw_instance.inbox.all(limit=100):
-			if "banned" in message.subject.lower():
-				subreddit_name: str = message.subreddit.display_name.lower()
-				message.mark_read()
-				self.file_manager.update_sub_db(subreddit_name)
+		self.inbox.process()
 
 	# Returns True if the comment is from a bot
 	@staticmethod
@@ -158,26 +285,91 @@ class AmmoniumBot:
 			return True
 
 	# Reddit API Setup
+	# credentials has the client_id, client_secret, username and password of the account, from the environment if None
 	@staticmethod
-	def get_reddit() -> praw.Reddit:
-		client_id = os.environ.get("CLIENT_ID")
-		client_secret = os.environ.get("CLIENT_SECRET")
-		password = os.environ.get("PASSWORD")
-		reddit = praw.Reddit(client_id=client_id,
-		                     client_secret=client_secret,
-		                     user_agent="console:ammonium:v1.1.0 (by /u/chiefpat450119)",
-		                     username="ammonium_bot",
-		                     password=password)
+	def get_reddit(limiter: RateLimiter = None, credentials: dict = None) -> praw.Reddit:
+		credentials = credentials or {"client_id": os.environ.get("CLIENT_ID"),
+		                              "client_secret": os.environ.get("CLIENT_SECRET"),
+		                              "username": "ammonium_bot",
+		                              "password": os.environ.get("PASSWORD")}
+		reddit = praw.Reddit(user_agent="console:ammonium:v1.1.0 (by /u/chiefpat450119)",
+		                     requestor_class=LimitedRequestor,
+		                     requestor_kwargs={"limiter": limiter or RateLimiter()},
+		                     **credentials)
 		return reddit
 
-
 if __name__ == "__main__":
-	rm = ReplyManager()
 	fm = FileManager("data/stopped_users.txt",
 	                 "data/stats.json",
 	                 "data/banned_subs.txt",
 	                 "data/subreddit_db.json",
-	                 "data/monitored_subs.txt")
-	mc = MistakeChecker(mistakes)
-	bot = AmmoniumBot(rm, fm, mc)
-	bot.run()
+	                 "data/monitored_subs.txt",
+	                 events=EventLog("data/events"))
+	# With STORAGE_BACKEND=sqlite everything is kept in one database, imported from the files above on first use
+	if os.environ.get("STORAGE_BACKEND") == "sqlite":
+		fm = SQLiteManager.open_or_import("data/ammonium.db", fm)
+	crawl_mode = os.environ.get("CRAWL_MODE", "serial")
+	# Detection backend: "compiled" (default), "serial", "process" for a pool of worker processes or "tokens" to match
+	# whole words
+	detection_backend = os.environ.get("DETECTION_BACKEND", "compiled")
+	# Results are memoized by text between runs, for up to DETECTION_MEMO_SIZE texts (0 turns the memo off)
+	memo_size = int(os.environ.get("DETECTION_MEMO_SIZE", 20000))
+	policy = ExpansionPolicy(streaming=os.environ.get("EXPANSION_STREAMING") == "1")
+	if "EXPANSION_SUBMISSION_BUDGET" in os.environ:
+		policy.submission_budget = int(os.environ["EXPANSION_SUBMISSION_BUDGET"])
+	if "EXPANSION_RUN_BUDGET" in os.environ:
+		policy.run_budget = int(os.environ["EXPANSION_RUN_BUDGET"])
+	# Without a budget every subreddit is visited, the ones with the most mistakes per request first
+	# SCHEDULER_TIME_BUDGET is in seconds, for the time left in the job after the inbox
+	request_budget = int(os.environ["SCHEDULER_REQUEST_BUDGET"]) if "SCHEDULER_REQUEST_BUDGET" in os.environ else None
+	time_budget = float(os.environ["SCHEDULER_TIME_BUDGET"]) if "SCHEDULER_TIME_BUDGET" in os.environ else None
+	crawl_state = CrawlState("data/crawl_state.json")
+	scheduler = SubredditScheduler("data/subreddit_stats.json", request_budget=request_budget, time_budget=time_budget)
+	first_mistake_only = os.environ.get("FIRST_MISTAKE_ONLY") == "1"
+	raw_comments = os.environ.get("RAW_COMMENTS") == "1"
+	# With SHARDS set above 1, the subreddits are split between that many accounts (see shard.py), each crawling in
+	# its own process with its own bot; this process only plans the shards and merges what they changed
+	shards = int(os.environ.get("SHARDS", 1))
+	if shards > 1 and crawl_mode != "stream":
+		from shard import ShardCoordinator, load_credentials
+		# Each account keeps its own memo, of the subreddits it checks, and its own outbox; the main account keeps
+		# the outbox of unsharded runs, so the replies queued in them are still sent
+		memo_path = os.path.join(CACHE_DIR, "detection-memo-{username}.json") if memo_size else None
+		coordinator = ShardCoordinator(fm, load_credentials()[:shards], crawl_state=crawl_state, scheduler=scheduler,
+		                               report_path=os.environ.get("RUN_REPORT", "run_report.json"),
+		                               options={"crawl mode": crawl_mode,
+		                                        "detection backend": detection_backend,
+		                                        "expansion policy": policy,
+		                                        "first mistake only": first_mistake_only,
+		                                        "raw comments": raw_comments,
+		                                        "detection memo size": memo_size,
+		                                        "detection memo path": memo_path,
+		                                        "main outbox path": "data/outbox.json",
+		                                        "outbox path": "data/outbox-{username}.json"})
+		coordinator.run()
+	else:
+		# Replies are sent from a queue kept on disk, so the crawl doesn't wait for them and failed ones are retried
+		# The reply to each mistake is rendered once, here, from data/replies.json
+		rm = ReplyManager(ReplyOutbox("data/outbox.json"), ReplyTemplates.load(REPLIES_PATH, mistakes))
+		memo = DetectionMemo(os.path.join(CACHE_DIR, "detection-memo.json"), memo_size) if memo_size else None
+		mc = MistakeChecker(mistakes, backend=detection_backend, memo=memo)
+		bot = AmmoniumBot(rm, fm, mc,
+		                  crawl_mode=crawl_mode,
+		                  expander=CommentExpander(policy),
+		                  crawl_state=crawl_state,
+		                  report_path=os.environ.get("RUN_REPORT", "run_report.json"),
+		                  scheduler=scheduler,
+		                  first_mistake_only=first_mistake_only,
+		                  raw_comments=raw_comments)
+		if bot.crawl_mode == "stream":
+			bot.stream_daemon_options = {"checkpoint": StreamCheckpoint("data/stream_checkpoint.json"),
+			                             "flush_interval": int(os.environ.get("STREAM_FLUSH_SECONDS", 300))}
+			# Stop cleanly, saving the checkpoint, when the service manager stops the daemon
+			signal.signal(signal.SIGTERM, lambda signum, frame: bot.stream_daemon and bot.stream_daemon.stop())
+		# Set AMMONIUM_PROFILE=1 to save a cProfile dump of the run
+		if os.environ.get("AMMONIUM_PROFILE") == "1":
+			profile(bot.run, "run_profile.prof")
+		else:
+			bot.run()
+	if isinstance(fm, SQLiteManager):
+		fm.close()
@@ -0,0 +1,81 @@
+import re
+
+
+# Finds every pattern from a fixed set of literal strings in a single scan of the text
+class PatternMatcher:
+	# trie_regex can be passed from an earlier build_trie_regex call on the same patterns, to skip building it
+	def __init__(self, patterns, trie_regex: str = None):
+		# Longest first, so the regex always reports the longest pattern starting at each position
+		self.__patterns = sorted({pattern for pattern in patterns if pattern}, key=len, reverse=True)
+		# Any pattern found also implies every shorter pattern it contains
+		self.__contained = {pattern: [other for other in self.__patterns if other in pattern]
+		                    for pattern in self.__patterns}
+		# And every pattern it starts with occurs at the same position
+		self.__prefixes = {pattern: [other for other in self.__patterns if pattern.startswith(other)]
+		                   for pattern in self.__patterns}
+		self.trie_regex = trie_regex or PatternMatcher.build_trie_regex(self.__patterns)
+		# Zero-width lookahead so overlapping matches are reported at every position
+		self.__regex = re.compile(f"(?=({self.trie_regex}))") if self.__patterns else None
+
+	def get_patterns(self) -> list[str]:
+		return list(self.__patterns)
+
+	# Returns the set of patterns that occur anywhere in the text
+	def find_all(self, text: str) -> set[str]:
+		found = set()
+		if self.__regex is None:
+			return found
+		for longest in set(self.__regex.findall(text)):
+			found.update(self.__contained[longest])
+		return found
+
+	# Returns (pattern, start) for every occurrence of every pattern, in order of position
+	def find_positions(self, text: str) -> list[tuple[str, int]]:
+		if self.__regex is None:
+			return []
+		return [(pattern, match.start()) for match in self.__regex.finditer(text)
+		        for pattern in self.__prefixes[match.group(1)]]
+
+	# Builds a regex from a prefix tree of the patterns, so shared prefixes are only matched once
+	@staticmethod
+	def build_trie_regex(patterns) -> str:
+		trie = {}
+		for pattern in patterns:
+			node = trie
+			for char in pattern:
+				node = node.setdefault(char, {})
+			node[""] = {}
+
+		def to_regex(node) -> str:
+			branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+			if not branches:
+				return ""
+			regex = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+			# A pattern ends here, so the rest is optional (greedy, to prefer the longest match)
+			if "" in node:
+				return f"(?:{regex})?"
+			return regex
+
+		return to_regex(trie)
+
+
+# Finds phrases made of whole tokens in a list of tokens, with one dict lookup per token
+class PhraseMatcher:
+	def __init__(self, phrases):
+		# Phrases by their first token
+		self.__by_first: dict[str, list[tuple[str, ...]]] = {}
+		for phrase in sorted({tuple(phrase) for phrase in phrases if phrase}, key=len, reverse=True):
+			self.__by_first.setdefault(phrase[0], []).append(phrase)
+
+	# Returns (phrase, token index) for every occurrence of every phrase, in order of position
+	def find_positions(self, words: list[str]) -> list[tuple[tuple[str, ...], int]]:
+		found = []
+		by_first = self.__by_first
+		for index, word in enumerate(words):
+			phrases = by_first.get(word)
+			if phrases is None:
+				continue
+			for phrase in phrases:
+				if len(phrase) == 1 or tuple(words[index:index + len(phrase)]) == phrase:
+					found.append((phrase, index))
+		return found
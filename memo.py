@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from atomic import write_atomic
+
+# Entry of a text without any mistake, shared by all of them
+NO_MATCHES = ()
+
+
+# Detection results of texts already checked, by a hash of the text, so checking the same text again (copy-pasta,
+# bots, posts visited again) is one dict lookup instead of a scan
+# Entries are (mistake list index, start, end) tuples, and only hold for the rule set version they were found with
+class DetectionMemo:
+	def __init__(self, path=None, max_size=20000):
+		self.path = path
+		self.max_size = max_size
+		self.version = None
+		# Least recently used first
+		self.__entries: OrderedDict[bytes, tuple] = OrderedDict()
+		self.__lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		if self.path is not None:
+			try:
+				with open(self.path, "r") as file:
+					state = json.load(file)
+				self.version = state["version"]
+				self.__entries = OrderedDict((bytes.fromhex(key), tuple(map(tuple, entry)) or NO_MATCHES)
+				                             for key, entry in state["entries"])
+			except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError):
+				pass
+
+	def __len__(self) -> int:
+		return len(self.__entries)
+
+	# Entries found with other rules are dropped
+	def use_version(self, version):
+		with self.__lock:
+			if version != self.version:
+				self.__entries.clear()
+				self.version = version
+
+	@staticmethod
+	def key(text: str) -> bytes:
+		return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+	def get(self, key: bytes) -> Optional[tuple]:
+		with self.__lock:
+			entry = self.__entries.get(key)
+			if entry is None:
+				self.misses += 1
+				return None
+			self.hits += 1
+			self.__entries.move_to_end(key)
+			return entry
+
+	def put(self, key: bytes, entry: tuple):
+		with self.__lock:
+			self.__entries[key] = entry or NO_MATCHES
+			self.__entries.move_to_end(key)
+			while len(self.__entries) > self.max_size:
+				self.__entries.popitem(last=False)
+				self.evictions += 1
+
+	def hit_rate(self) -> float:
+		lookups = self.hits + self.misses
+		return self.hits / lookups if lookups else 0.0
+
+	# Saved without a version, entries can't be trusted in the next run
+	def save(self):
+		if self.path is None or self.version is None:
+			return
+		with self.__lock:
+			state = {"version": self.version, "entries": [[key.hex(), entry] for key, entry in self.__entries.items()]}
+		os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+		write_atomic(self.path, json.dumps(state, separators=(",", ":")))
+
+	def report(self) -> dict:
+		return {"size": len(self.__entries), "hits": self.hits, "misses": self.misses,
+		        "hit rate": round(self.hit_rate(), 4), "evictions": self.evictions}
@@ -0,0 +1,125 @@
+import cProfile
+import datetime
+import functools
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+# Collects timings and counters for one run of the bot and writes them as a JSON report
+class Metrics:
+	def __init__(self, limiter=None):
+		# Used to count the API requests made by each thread
+		self.limiter = limiter
+		self.started = datetime.datetime.now(datetime.UTC)
+		self.__start_time = time.perf_counter()
+		self.timings = defaultdict(lambda: {"calls": 0, "seconds": 0.0})
+		self.counters = defaultdict(int)
+		self.subreddits = defaultdict(lambda: defaultdict(float))
+		self.__lock = threading.Lock()
+
+	@contextmanager
+	def timer(self, name: str):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			elapsed = time.perf_counter() - start
+			with self.__lock:
+				self.timings[name]["calls"] += 1
+				self.timings[name]["seconds"] += elapsed
+
+	def count(self, name: str, amount=1):
+		with self.__lock:
+			self.counters[name] += amount
+
+	def count_for_subreddit(self, subreddit_name: str, name: str, amount=1):
+		with self.__lock:
+			self.subreddits[subreddit_name][name] += amount
+
+	# Records the time and API requests spent on a subreddit by the current thread
+	@contextmanager
+	def subreddit_timer(self, subreddit_name: str):
+		start = time.perf_counter()
+		start_requests = self.__thread_requests()
+		try:
+			yield
+		finally:
+			with self.__lock:
+				record = self.subreddits[subreddit_name]
+				record["seconds"] += time.perf_counter() - start
+				record["api requests"] += self.__thread_requests() - start_requests
+
+	def __thread_requests(self) -> int:
+		return self.limiter.thread_requests() if self.limiter is not None else 0
+
+	# Wraps an object so every method call is timed, under "<prefix>.<method>"
+	def instrument(self, target, prefix: str):
+		return _Instrumented(target, self, prefix)
+
+	def report(self, **extra) -> dict:
+		with self.__lock:
+			report = {
+				"started": self.started.isoformat(),
+				"seconds": round(time.perf_counter() - self.__start_time, 3),
+				"counters": dict(self.counters),
+				"timings": {name: {"calls": timing["calls"], "seconds": round(timing["seconds"], 4)}
+				            for name, timing in sorted(self.timings.items())},
+				"subreddits": {name: {key: round(value, 4) for key, value in record.items()}
+				               for name, record in sorted(self.subreddits.items())},
+			}
+		if self.limiter is not None:
+			report["counters"]["api requests"] = self.limiter.requests
+			report["counters"]["rate limit wait seconds"] = round(self.limiter.wait_seconds, 3)
+			report["counters"]["rate limit retries"] = self.limiter.retries
+			report["counters"]["rate limit retry seconds"] = round(self.limiter.retry_seconds, 3)
+		report.update(extra)
+		return report
+
+	def write_report(self, path, **extra):
+		with open(path, "w") as file:
+			json.dump(self.report(**extra), file, indent=4)
+
+
+# Proxy that times the method calls of the object it wraps
+class _Instrumented:
+	def __init__(self, target, metrics: Metrics, prefix: str):
+		self._target = target
+		self._metrics = metrics
+		self._prefix = prefix
+
+	def __getattr__(self, name):
+		attribute = getattr(self._target, name)
+		if not callable(attribute):
+			return attribute
+
+		@functools.wraps(attribute)
+		def timed_method(*args, **kwargs):
+			with self._metrics.timer(f"{self._prefix}.{name}"):
+				return attribute(*args, **kwargs)
+
+		return timed_method
+
+
+# Decorator for methods of objects with a metrics attribute
+def timed(name: str):
+	def decorator(method):
+		@functools.wraps(method)
+		def wrapper(self, *args, **kwargs):
+			with self.metrics.timer(name):
+				return method(self, *args, **kwargs)
+
+		return wrapper
+
+	return decorator
+
+
+# Runs the function under cProfile and saves the stats to path
+def profile(function, path):
+	profiler = cProfile.Profile()
+	try:
+		return profiler.runcall(function)
+	finally:
+		profiler.dump_stats(path)
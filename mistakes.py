@@ -1,4 +1,16 @@
-from typing import Optional
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+from atomic import write_atomic
+from matcher import PatternMatcher, PhraseMatcher
+from memo import DetectionMemo
+from preprocess import CommentPreprocessor, tokenize, tokenize_with_offsets
 
 
 # Base mistake class
@@ -11,6 +23,9 @@ class Mistake:
         self.__before = before
         self.__after = after
         self.__explanation = explanation
+        # Formatted once, as it is the same in every reply
+        self.__explanation_line = f"Explanation: {explanation}" if explanation else ""
+        self.__pattern = before + mistake + after
 
     # Method to check if the comment is an exception
     def is_exception(self, text) -> bool:
@@ -21,18 +36,26 @@ class Mistake:
 
     # Method that checks for mistakes in comments and returns relevant corrections
     def check(self, text) -> bool:
-        mistake_string = self.__before + self.__mistake + self.__after
-        return mistake_string in text and not self.is_exception(text)
+        return self.__pattern in text and not self.is_exception(text)
+
+    # Same as check, but using the set of patterns already found in the text by a PatternMatcher
+    def check_found(self, found: set[str]) -> bool:
+        if self.__pattern not in found:
+            return False
+        return not any(exception in found for exception in self.get_exceptions())
 
     # Methods that returns the context of the mistake in the comment
     def find_context(self, text) -> str:
-        mistake_string = self.__before + self.__mistake + self.__after
         # Find the index of the mistake
-        index = text.find(mistake_string)
+        index = text.find(self.__pattern)
+        return self.context_at(text, index, index + len(self.__pattern))
+
+    # Returns the context of the mistake found between start and end, without searching for it again
+    def context_at(self, text, start: int, end: int) -> str:
         # Find the index of the first space before the mistake
-        first_space = text.rfind(" ", 0, index)
+        first_space = text.rfind(" ", 0, start)
         # Find the index of the first space after the mistake
-        second_space = text.find(" ", index + len(mistake_string))
+        second_space = text.find(" ", end)
         if first_space == -1:
             first_space = 0
         if second_space == -1:
@@ -40,120 +63,451 @@ class Mistake:
         # Return the context
         return text[first_space:second_space]
 
+    # Returns the exact string searched for, including the required context
+    def get_pattern(self) -> str:
+        return self.__pattern
+
+    def get_exceptions(self) -> list[str]:
+        return self._exceptions or []
+
     def get_correction(self) -> str:
         return self.__correction
 
     # Returns the explanation
     def get_explanation(self) -> str:
-        if self.__explanation:
-            return f"Explanation: {self.__explanation}"
-        return ""
-
-
-# There's so many variations of this mistake that I made a subclass for it
-class OfMistake(Mistake):
-    def __init__(self, mistake, exceptions=None):
-        super().__init__(mistake=mistake, correction=mistake + " have", exceptions=exceptions, before=" ", after=" of ",
-                         explanation="You probably meant to say could've/should've/would've which sounds like 'of' but is actually short for 'have'.")
-        if not exceptions:
-            self._exceptions = ["of course"]
-
-# Likewise for this one
-class LooseMistake(Mistake):
-    def __init__(self, after, exceptions=None):
-        super().__init__(mistake="loose", correction="lose", exceptions=exceptions, before=" ", after=after,
-                         explanation="Loose is an adjective meaning the opposite of tight, while lose is a verb.")
-
-
-# List of mistake instances that the bot iterates through
-mistakes = [
-    OfMistake("shouldn't"),
-    OfMistake("couldn't"),
-    OfMistake("wouldn't"),
-    OfMistake("should"),
-    OfMistake("would"),
-    OfMistake("could"),
-    OfMistake("must"),
-    OfMistake("might", exceptions=["the might of", "might of course", "might of the"]),
-    Mistake("to many", "too many", before=" way "),
-    Mistake("to many", "too many", before=" far "),
-    Mistake("to few", "too few", exceptions=["available to few"]),
-    Mistake("to much", "too much", before=" way "),
-    Mistake("more then", "more than", exceptions=["any more", "some more"],
-            explanation="If you didn't mean 'more than' you might have forgotten a comma."),
-    Mistake("less then", "less than", exceptions=["any less"],
-            explanation="If you didn't mean 'less than' you might have forgotten a comma."),
-    Mistake("payed", "paid",
-            explanation="Payed means to seal something with wax, "
-                        "while paid means to give money."),
-    LooseMistake(" my "),
-    LooseMistake(" your "),
-    LooseMistake(" his "),
-    LooseMistake(" her "),
-    LooseMistake(" their "),
-    LooseMistake(" our "),
-    LooseMistake(" its "),
-    Mistake("could care less", "couldn't care less",
-            exceptions=["couldn't care less*", "couldn't*", "did you mean"],
-            explanation="If you could care less, you do care, "
-                        "which is the opposite of what you meant to say."),
-    Mistake("loosing", "losing",
-            explanation="Loose is an adjective meaning the opposite of tight, "
-                        "while lose is a verb."),
-    Mistake("looses", "loses",
-            explanation="Loose is an adjective meaning the opposite of tight, "
-                        "while lose is a verb."),
-    Mistake("irregardless", "regardless",
-            explanation="irregardless is not a word."),
-    Mistake("weary of", "wary of", before=" be ",
-            explanation="Weary means tired, while wary means cautious."),
-    Mistake("can't breath", "can't breathe",
-            explanation="Breath is a noun, while breathe is a verb."),
-    Mistake("intensive purposes", "intents and purposes",
-            explanation="This is likely due to mishearing of 'intents and purposes'."),
-    Mistake("sneak peak", "sneak peek",
-            explanation="peak is the top of a mountain, while peek is a quick look."),
-    Mistake("sneak peaks", "sneak peek",
-            explanation="peak is the top of a mountain, while peek is a quick look."),
-    Mistake("unphased", "unfazed",
-            explanation="Phased means to change, while fazed means to be surprised."),
-    Mistake("epitamy", "epitome",
-            explanation="Epitamy is not a word."),
-    Mistake("no affect", "no effect",
-            explanation="affect is a verb meaning to influence, "
-                        "while effect is a noun meaning a result."),
-    Mistake("little affect", "little effect",
-            explanation="affect is a verb meaning to influence, "
-                        "while effect is a noun meaning a result."),
-    Mistake("peaked my interest", "piqued my interest",
-            explanation="Some people might have peaked in high school, "
-                        "but pique is a verb meaning to arouse interest."),
-    Mistake("peaked my curiosity", "piqued my curiosity",
-            explanation="Some people might have peaked in high school, "
-                        "but pique is a verb meaning to arouse interest."),
-    Mistake("apart of", "a part of",
-            explanation="\"apart\" is an adverb meaning separately, "
-                        "while \"a part\" is a noun meaning a portion."),
-    Mistake("queue", "cue", after=" the ",
-            explanation="queue is a line, while cue is a signal."),
-    Mistake("humanely possible", "humanly possible",
-            explanation="humane means kind, while human means relating to humans."),
-    Mistake("intimated by", "intimidated by",
-            explanation="intimate means \"closely acquianted\", while intimidate means to frighten."),
-    Mistake("per say", "per se",
-            explanation="per se is latin for \"by itself\"."),
-    Mistake("chocking", "choking",
-            explanation="chocking means to block a wheel, while choking means to suffocate."),
-]
+        return self.__explanation_line
 
+    # Returns the explanation without the label, or None if there isn't one
+    def get_explanation_text(self) -> Optional[str]:
+        return self.__explanation
 
-class MistakeChecker:
+
+# One occurrence of a mistake in a text, where start and end are the offsets of its pattern
+# Backends that know the words around the match give the offsets of the context to quote as well
+class Match(NamedTuple):
+    mistake: Mistake
+    start: int
+    end: int
+    context_start: int = -1
+    context_end: int = -1
+
+    def get_context(self, text) -> str:
+        if self.context_start >= 0:
+            return text[self.context_start:self.context_end]
+        return self.mistake.context_at(text, self.start, self.end)
+
+
+# Alternation groups like (a|b|c) in the rule file
+_group = re.compile(r"\(([^()]*)\)")
+
+
+# Hash of the code that compiles and applies the rules (this module, the matcher and the tokenizer), so a cache
+# written by other code isn't used
+def _compiler_version() -> str:
+    digest = hashlib.sha256()
+    for module_path in [__file__, inspect.getfile(PatternMatcher), inspect.getfile(CommentPreprocessor)]:
+        with open(module_path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+# List of mistakes loaded from a rule file, with the matcher compiled for them
+# version is the hash of the rule file, so anything derived from the rules can tell when they change
+class RuleSet(list):
+    def __init__(self, mistake_list, version: str, matcher: PatternMatcher = None):
+        super().__init__(mistake_list)
+        self.version = version
+        self.matcher = matcher
+
+    # Loads the rules, using the compiled rules cached for the same file contents and compiler code if there are any
+    @staticmethod
+    def load(path, cache_dir=None) -> "RuleSet":
+        with open(path, "rb") as file:
+            contents = file.read()
+        version = hashlib.sha256(contents).hexdigest()
+        cache_path = None
+        if cache_dir:
+            cache_path = os.path.join(cache_dir, f"mistakes-{version[:16]}-{_compiler_version()[:16]}.json")
+            try:
+                with open(cache_path, "r") as file:
+                    return RuleSet.from_compiled(json.load(file), version)
+            # A cache that can't be read, or doesn't have the expected shape, is rebuilt like a missing one
+            except (OSError, ValueError, KeyError, TypeError, re.error):
+                pass
+        compiled = RuleSet.compile(json.loads(contents)["rules"])
+        if cache_path is not None:
+            RuleSet.__write_cache(cache_path, compiled)
+        return RuleSet.from_compiled(compiled, version)
+
+    @staticmethod
+    def from_compiled(compiled: dict, version: str) -> "RuleSet":
+        mistake_list = [Mistake(**rule) for rule in compiled["rules"]]
+        return RuleSet(mistake_list, version, PatternMatcher(compiled["patterns"], compiled["trie regex"]))
+
+    # Expands the alternations in the rules and builds the matcher regex, as a JSON-serialisable dict
+    @staticmethod
+    def compile(rules: list[dict]) -> dict:
+        expanded = [expanded_rule for rule in rules for expanded_rule in RuleSet.expand(rule)]
+        patterns = CompiledBackend.patterns([Mistake(**rule) for rule in expanded])
+        return {"rules": expanded, "patterns": patterns, "trie regex": PatternMatcher(patterns).trie_regex}
+
+    # Returns one rule for each combination of options in the groups of before, mistake and after, in order
+    @staticmethod
+    def expand(rule: dict) -> list[dict]:
+        fields = {"before": rule.get("before", " "), "mistake": rule["mistake"], "after": rule.get("after", " ")}
+        parts = [_group.split(fields[name]) for name in ["before", "mistake", "after"]]
+        # Odd positions of each split are the options of a group
+        groups = [part[i].split("|") for part in parts for i in range(1, len(part), 2)]
+        exceptions = [exception for pattern in rule.get("exceptions", []) for exception in RuleSet.__options(pattern)]
+
+        expanded = []
+        for choices in itertools.product(*groups):
+            remaining = iter(choices)
+            values = {name: "".join(piece if i % 2 == 0 else next(remaining) for i, piece in enumerate(part))
+                      for name, part in zip(["before", "mistake", "after"], parts)}
+            expanded.append({**values,
+                             "correction": rule["correction"].format(*choices),
+                             "exceptions": exceptions or None,
+                             "explanation": rule.get("explanation")})
+        return expanded
+
+    # Every string a pattern with groups stands for
+    @staticmethod
+    def __options(pattern: str) -> list[str]:
+        part = _group.split(pattern)
+        groups = [part[i].split("|") for i in range(1, len(part), 2)]
+        return ["".join(piece if i % 2 == 0 else choices[i // 2] for i, piece in enumerate(part))
+                for choices in itertools.product(*groups)]
+
+    @staticmethod
+    def __write_cache(path, compiled: dict):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A parallel run never reads half a cache file
+        write_atomic(path, json.dumps(compiled))
+
+
+# Checks each mistake one by one, the way the bot originally did
+class SerialBackend:
     def __init__(self, mistake_list):
         self.__mistake_list = mistake_list
 
     def find_mistake(self, comment_text: str) -> Optional[Mistake]:
         for mistake in self.__mistake_list:
-            has_mistake = mistake.check(comment_text)
-            if has_mistake:
+            if mistake.check(comment_text):
                 return mistake
         return None
+
+    def find_mistakes(self, texts: list[str]) -> list[Optional[Mistake]]:
+        return [self.find_mistake(text) for text in texts]
+
+    # Returns (list index, start, end) for every occurrence of every mistake, in order of position
+    def find_match_indices(self, comment_text: str) -> list[tuple[int, int, int]]:
+        found = []
+        for index, mistake in enumerate(self.__mistake_list):
+            if not mistake.check(comment_text):
+                continue
+            pattern = mistake.get_pattern()
+            start = comment_text.find(pattern)
+            while start != -1:
+                found.append((index, start, start + len(pattern)))
+                start = comment_text.find(pattern, start + 1)
+        return sorted(found, key=lambda match: (match[1], match[0]))
+
+    def find_matches(self, texts: list[str]) -> list[list[Match]]:
+        return [_to_matches(self.__mistake_list, self.find_match_indices(text)) for text in texts]
+
+    def close(self):
+        pass
+
+
+# Compiles every mistake and exception string into one matcher, so each comment is only scanned once
+class CompiledBackend:
+    def __init__(self, mistake_list):
+        self.__mistake_list = mistake_list
+        # A RuleSet comes with its matcher already compiled
+        self.__matcher = getattr(mistake_list, "matcher", None) or PatternMatcher(CompiledBackend.patterns(mistake_list))
+
+    # Every string the matcher has to find: the mistake patterns and their exceptions
+    @staticmethod
+    def patterns(mistake_list) -> list[str]:
+        patterns = [mistake.get_pattern() for mistake in mistake_list]
+        patterns += [exception for mistake in mistake_list for exception in mistake.get_exceptions()]
+        return patterns
+
+    # Returns the position of the first matching mistake in the list
+    def find_index(self, comment_text: str) -> Optional[int]:
+        found = self.__matcher.find_all(comment_text)
+        if not found:
+            return None
+        # Keep the list order so the first matching mistake is the same as checking them one by one
+        for index, mistake in enumerate(self.__mistake_list):
+            if mistake.check_found(found):
+                return index
+        return None
+
+    def find_mistake(self, comment_text: str) -> Optional[Mistake]:
+        index = self.find_index(comment_text)
+        return None if index is None else self.__mistake_list[index]
+
+    def find_mistakes(self, texts: list[str]) -> list[Optional[Mistake]]:
+        return [self.find_mistake(text) for text in texts]
+
+    # Same as SerialBackend.find_match_indices, with the positions from the same single scan
+    def find_match_indices(self, comment_text: str) -> list[tuple[int, int, int]]:
+        positions = self.__matcher.find_positions(comment_text)
+        if not positions:
+            return []
+        found = {pattern for pattern, _ in positions}
+        matching = {}
+        for index, mistake in enumerate(self.__mistake_list):
+            if mistake.check_found(found):
+                matching.setdefault(mistake.get_pattern(), []).append(index)
+        matches = [(index, start, start + len(pattern)) for pattern, start in positions
+                   for index in matching.get(pattern, [])]
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+    def find_matches(self, texts: list[str]) -> list[list[Match]]:
+        return [_to_matches(self.__mistake_list, self.find_match_indices(text)) for text in texts]
+
+    def close(self):
+        pass
+
+
+# Matches from (list index, start, end) tuples, which may also have the offsets of the context
+def _to_matches(mistake_list, indices: list[tuple]) -> list[Match]:
+    return [Match(mistake_list[found[0]], *found[1:]) for found in indices]
+
+
+# Matches whole words instead of padded strings: each text is split into tokens once, and every mistake and exception
+# is a phrase of tokens looked up in them, so mistakes are found next to punctuation and at the ends of the text too
+class TokenBackend:
+    # The prefilter has to let through the same texts as the tokens
+    word_boundaries = True
+
+    def __init__(self, mistake_list):
+        self.__mistake_list = mistake_list
+        # Phrase and exception phrases of each mistake, in list order
+        self.__rules = [(tuple(tokenize(mistake.get_pattern())),
+                         [tuple(tokenize(exception)) for exception in mistake.get_exceptions()])
+                        for mistake in mistake_list]
+        self.__matcher = PhraseMatcher([phrase for phrase, exceptions in self.__rules] +
+                                       [exception for _, exceptions in self.__rules for exception in exceptions])
+
+    # Indices of the mistakes found in the tokens, with no exception found, in list order
+    def __matching(self, found: set) -> list[int]:
+        return [index for index, (phrase, exceptions) in enumerate(self.__rules)
+                if phrase in found and not any(exception in found for exception in exceptions)]
+
+    def find_index(self, comment_text: str) -> Optional[int]:
+        positions = self.__matcher.find_positions(tokenize(comment_text))
+        if not positions:
+            return None
+        matching = self.__matching({phrase for phrase, _ in positions})
+        return matching[0] if matching else None
+
+    def find_mistake(self, comment_text: str) -> Optional[Mistake]:
+        index = self.find_index(comment_text)
+        return None if index is None else self.__mistake_list[index]
+
+    def find_mistakes(self, texts: list[str]) -> list[Optional[Mistake]]:
+        return [self.find_mistake(text) for text in texts]
+
+    # Returns (list index, start, end, context start, context end) for every occurrence of every mistake, in order
+    # of position, where the context is the match with the word before and after it on the same line, and any
+    # punctuation in between
+    def find_match_indices(self, comment_text: str) -> list[tuple[int, int, int, int, int]]:
+        words = tokenize(comment_text)
+        positions = self.__matcher.find_positions(words)
+        if not positions:
+            return []
+        matching = {}
+        for index in self.__matching({phrase for phrase, _ in positions}):
+            matching.setdefault(self.__rules[index][0], []).append(index)
+        if not matching:
+            return []
+        # Offsets are only needed for the few texts with a mistake
+        _, starts, ends = tokenize_with_offsets(comment_text, words)
+        matches = []
+        for phrase, position in positions:
+            last = position + len(phrase) - 1
+            before = TokenBackend.next_word(words, position, -1)
+            after = TokenBackend.next_word(words, last, 1)
+            matches += [(index, starts[position], ends[last], starts[before], ends[after])
+                        for index in matching.get(phrase, [])]
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+    # Index of the first word token from position in the direction given, or of the last token before a line break
+    # or the end of the text
+    @staticmethod
+    def next_word(words: list[str], position: int, step: int) -> int:
+        index = position + step
+        while 0 <= index < len(words) and words[index] != "\n":
+            if words[index][0].isalnum():
+                return index
+            index += step
+        return index - step
+
+    def find_matches(self, texts: list[str]) -> list[list[Match]]:
+        return [_to_matches(self.__mistake_list, self.find_match_indices(text)) for text in texts]
+
+    def close(self):
+        pass
+
+
+# Each worker process builds its own compiled backend once
+_worker_backend: Optional[CompiledBackend] = None
+
+
+def _init_worker(mistake_list):
+    global _worker_backend
+    _worker_backend = CompiledBackend(mistake_list)
+
+
+# Returns list indices rather than Mistake objects, which would come back as copies
+def _find_mistake_indices(texts: list[str]) -> list[Optional[int]]:
+    return [_worker_backend.find_index(text) for text in texts]
+
+
+def _find_match_indices(texts: list[str]) -> list[list[tuple[int, int, int]]]:
+    return [_worker_backend.find_match_indices(text) for text in texts]
+
+
+# Splits large batches into chunks checked in parallel by a pool of worker processes
+class ProcessPoolBackend:
+    def __init__(self, mistake_list, workers=None, chunk_size=1000):
+        self.__mistake_list = mistake_list
+        self.__workers = workers
+        self.__chunk_size = chunk_size
+        # Batches smaller than one chunk aren't worth sending to another process
+        self.__local = CompiledBackend(mistake_list)
+        self.__pool = None
+
+    def find_mistake(self, comment_text: str) -> Optional[Mistake]:
+        return self.__local.find_mistake(comment_text)
+
+    def find_mistakes(self, texts: list[str]) -> list[Optional[Mistake]]:
+        if len(texts) <= self.__chunk_size:
+            return self.__local.find_mistakes(texts)
+        results = []
+        for indices in self.__map(_find_mistake_indices, texts):
+            results += [None if index is None else self.__mistake_list[index] for index in indices]
+        return results
+
+    def find_matches(self, texts: list[str]) -> list[list[Match]]:
+        if len(texts) <= self.__chunk_size:
+            return self.__local.find_matches(texts)
+        results = []
+        for chunk in self.__map(_find_match_indices, texts):
+            results += [_to_matches(self.__mistake_list, indices) for indices in chunk]
+        return results
+
+    # Runs the worker function on each chunk of the texts, in order
+    def __map(self, function, texts: list[str]):
+        # The pool is started on the first large batch and reused until close
+        if self.__pool is None:
+            self.__pool = ProcessPoolExecutor(max_workers=self.__workers, initializer=_init_worker,
+                                              initargs=(self.__mistake_list,))
+        chunks = [texts[i:i + self.__chunk_size] for i in range(0, len(texts), self.__chunk_size)]
+        return self.__pool.map(function, chunks)
+
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+
+
+backends = {
+    "serial": SerialBackend,
+    "compiled": CompiledBackend,
+    "process": ProcessPoolBackend,
+    "tokens": TokenBackend,
+}
+
+
+class MistakeChecker:
+    # The backend is either a name from backends or an already constructed backend object
+    # With a memo, texts already checked with the same rules aren't checked again
+    def __init__(self, mistake_list, backend="compiled", memo: DetectionMemo = None):
+        self.__mistake_list = mistake_list
+        self.__backend = backends[backend](mistake_list) if isinstance(backend, str) else backend
+        self.__preprocessor = CommentPreprocessor(mistake_list,
+                                                  word_boundaries=getattr(self.__backend, "word_boundaries", False))
+        # Position of each mistake in the list, which decides the first mistake in a text
+        self.__order = {mistake: index for index, mistake in reversed(list(enumerate(mistake_list)))}
+        self.memo = memo
+        if memo is not None:
+            # Lists of mistakes without a version (not loaded from a rule file) are only memoized for this run
+            # Backends can find different matches, so results are only reused with the same one and the same code
+            version = getattr(mistake_list, "version", None)
+            memo.use_version(f"{version}:{_compiler_version()}:{type(self.__backend).__name__}" if version else None)
+
+    # Returns the quote-free lowercase text to check, or None if the comment body can't contain a mistake
+    def prepare(self, body: str) -> Optional[str]:
+        return self.__preprocessor.prepare(body)
+
+    def find_mistake(self, comment_text: str) -> Optional[Mistake]:
+        if self.memo is not None:
+            return self.find_mistakes_batch([comment_text])[0]
+        return self.__backend.find_mistake(comment_text)
+
+    # Checks a whole batch of comments at once, returning the first mistake (or None) for each text
+    def find_mistakes_batch(self, texts: list[str]) -> list[Optional[Mistake]]:
+        if self.memo is None:
+            return self.__backend.find_mistakes(list(texts))
+        # The first mistake is the one earliest in the list among the matches
+        return [self.__mistake_list[min(found[0] for found in entry)] if entry else None
+                for entry in self.__memoized(list(texts))]
+
+    # Every mistake in the text with its position, in order of position
+    def find_matches(self, comment_text: str, first_only=False) -> list[Match]:
+        return self.find_matches_batch([comment_text], first_only)[0]
+
+    # Checks a whole batch of comments at once, returning every match for each text
+    # With first_only, only the matches of the mistake find_mistake would return are kept
+    def find_matches_batch(self, texts: list[str], first_only=False) -> list[list[Match]]:
+        if self.memo is None:
+            results = self.__backend.find_matches(list(texts))
+        else:
+            results = [_to_matches(self.__mistake_list, entry) for entry in self.__memoized(list(texts))]
+        if first_only:
+            results = [self.__first_mistake_only(matches) for matches in results]
+        return results
+
+    # Match indices of every text, from the memo or from the backend for the texts it doesn't have
+    # The texts missing are still checked as one batch, each different one once
+    def __memoized(self, texts: list[str]) -> list[tuple]:
+        keys = [DetectionMemo.key(text) for text in texts]
+        found = {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                entry = self.memo.get(key)
+                if entry is None:
+                    missing[key] = text
+                else:
+                    found[key] = entry
+        if missing:
+            for key, matches in zip(missing, self.__backend.find_matches(list(missing.values()))):
+                found[key] = tuple((self.__order[match.mistake], *match[1:]) for match in matches)
+                self.memo.put(key, found[key])
+        return [found[key] for key in keys]
+
+    def __first_mistake_only(self, matches: list[Match]) -> list[Match]:
+        if not matches:
+            return matches
+        first = min((match.mistake for match in matches), key=self.__order.get)
+        return [match for match in matches if match.mistake is first]
+
+    # Shuts down any worker processes used by the backend, and saves the memo for the next run
+    def close(self):
+        self.__backend.close()
+        if self.memo is not None:
+            self.memo.save()
+
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "mistakes.json")
+# Compiled rules are cached here between runs (set AMMONIUM_CACHE_DIR to change it)
+CACHE_DIR = os.environ.get("AMMONIUM_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+# List of mistake instances that the bot iterates through, from data/mistakes.json
+mistakes = RuleSet.load(RULES_PATH, CACHE_DIR)
@@ -0,0 +1,199 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+from praw.exceptions import RedditAPIException
+from prawcore.exceptions import Forbidden, NotFound, RequestException, ServerError, TooManyRequests
+
+from atomic import write_atomic
+
+# Kinds of reply jobs, by what they are sent to
+COMMENT = "comment"
+MESSAGE = "message"
+DIRECT_MESSAGE = "direct message"
+
+
+# Replies waiting to be sent, kept on disk between runs so a failed reply is retried instead of lost
+# The crawl only queues replies, and a drainer thread sends them while it carries on
+class ReplyOutbox:
+	def __init__(self, path=None, max_attempts=5, base_delay=2.0, max_delay=300.0, sent_days=7, seed=None):
+		self.path = path
+		self.max_attempts = max_attempts
+		# Retries wait a random time up to base_delay * 2 ** attempts, capped at max_delay
+		self.base_delay = base_delay
+		self.max_delay = max_delay
+		# Replies sent in the last sent_days are remembered so they aren't queued again
+		self.sent_days = sent_days
+		self.__random = random.Random(seed)
+		self.__jobs = {}
+		self.__sent = {}
+		if self.path is not None:
+			try:
+				with open(self.path, "r") as file:
+					state = json.load(file)
+				self.__jobs, self.__sent = dict(state["jobs"]), dict(state["sent"])
+			except FileNotFoundError:
+				pass
+			# The replies in a corrupt file can't be trusted, but it is kept aside to recover them by hand
+			except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+				print(f"Corrupt outbox {self.path} ({e!r}), moved to {self.path}.corrupt and starting empty")
+				os.replace(self.path, f"{self.path}.corrupt")
+		# praw objects for the jobs queued in this run, so they don't have to be fetched again
+		self.__targets = {}
+		self.__condition = threading.Condition()
+		self.__thread = None
+		# Called with the event of each reply sent, like FileManager.log_event
+		self.__log_event = None
+		self.__stopping = False
+		self.sent = defaultdict(int)
+		self.retries = 0
+		self.dropped = 0
+
+	# Queues a reply and returns True, or False if the same reply is already queued or was sent
+	# Inbox replies are given the fullname of what they answer, which can be a comment (t1_) or a private message
+	# event is the (kind, subreddit name, mistake names) to log once the reply is sent, if any
+	def enqueue(self, kind: str, target_id: str, body: str, subject=None, target=None, fullname=None,
+	            event=None) -> bool:
+		key = f"{kind}:{target_id}"
+		with self.__condition:
+			if key in self.__jobs or key in self.__sent:
+				return False
+			self.__jobs[key] = {"kind": kind, "target": target_id, "body": body, "subject": subject,
+			                    "fullname": fullname, "event": event, "attempts": 0, "next try": 0.0,
+			                    "replied": False}
+			if target is not None:
+				self.__targets[key] = target
+			self.__condition.notify_all()
+		return True
+
+	def pending(self) -> int:
+		with self.__condition:
+			return len(self.__jobs)
+
+	# Starts sending queued replies in the background
+	# log_event is called with the event of every reply once it is sent, so replies dropped or still waiting aren't
+	# logged
+	def start(self, reddit, log_event=None):
+		with self.__condition:
+			if self.__thread is not None:
+				return
+			self.__stopping = False
+			self.__log_event = log_event
+			self.__thread = threading.Thread(target=self.__drain, args=(reddit,), daemon=True)
+			self.__thread.start()
+
+	# Sends every reply that is due and stops the drainer; replies waiting to be retried are kept for later
+	def stop(self):
+		with self.__condition:
+			thread = self.__thread
+			self.__stopping = True
+			self.__condition.notify_all()
+		if thread is not None:
+			thread.join()
+		with self.__condition:
+			self.__thread = None
+
+	def __drain(self, reddit):
+		while True:
+			with self.__condition:
+				key = self.__next_due()
+				while key is None and not self.__stopping:
+					self.__condition.wait(self.__time_to_next())
+					key = self.__next_due()
+				if key is None:
+					return
+				job = self.__jobs[key]
+				target = self.__targets.get(key)
+			self.__send(reddit, key, job, target)
+
+	def __next_due(self):
+		now = time.time()
+		due = [(job["next try"], key) for key, job in self.__jobs.items() if job["next try"] <= now]
+		return min(due)[1] if due else None
+
+	def __time_to_next(self):
+		if not self.__jobs:
+			return None
+		return max(min(job["next try"] for job in self.__jobs.values()) - time.time(), 0.01)
+
+	def __send(self, reddit, key: str, job: dict, target):
+		try:
+			if job["kind"] == DIRECT_MESSAGE:
+				(target or reddit.redditor(job["target"])).message(subject=job["subject"], message=job["body"])
+			else:
+				if target is None:
+					target = ReplyOutbox.load_target(reddit, job)
+				# A retry after the reply went through only saves the comment
+				if not job["replied"]:
+					target.reply(body=job["body"])
+					job["replied"] = True
+				# Saved only once the reply is sent, so the bot doesn't reply to it again
+				if job["kind"] == COMMENT:
+					target.save()
+		# Deleted, locked or banned from the subreddit
+		except (Forbidden, NotFound):
+			self.__finish(key, sent=False)
+		except RedditAPIException as e:
+			# Reddit's own "doing that too much" limit is worth waiting for, other errors won't go away
+			if any(item.error_type == "RATELIMIT" for item in e.items):
+				self.__retry(key, job)
+			else:
+				self.__finish(key, sent=False)
+		except (TooManyRequests, ServerError, RequestException):
+			self.__retry(key, job)
+		# Anything else (a bad request, or a target that can't be loaded) counts as a failed attempt too, so one broken
+		# job is dropped after max_attempts instead of ending the drainer with every reply queued after it
+		except Exception as e:
+			print(f"Failed to send the {job['kind']} reply to {job['target']}: {e!r}")
+			self.__retry(key, job)
+		else:
+			self.__finish(key, sent=True)
+			if self.__log_event is not None and job.get("event"):
+				self.__log_event(*job["event"])
+
+	# The praw object to reply to for a job queued in an earlier run
+	# Most feedback arrives as a reply to a correction, so inbox replies go to a comment unless the fullname says
+	# otherwise; jobs saved without one were always sent to a private message
+	@staticmethod
+	def load_target(reddit, job: dict):
+		if job["kind"] == COMMENT or (job.get("fullname") or "").startswith("t1_"):
+			return reddit.comment(job["target"])
+		return reddit.inbox.message(job["target"])
+
+	def __retry(self, key: str, job: dict):
+		with self.__condition:
+			job["attempts"] += 1
+			if job["attempts"] >= self.max_attempts:
+				self.__finish_locked(key, sent=False)
+				return
+			self.retries += 1
+			delay = self.__random.uniform(0, min(self.max_delay, self.base_delay * 2 ** job["attempts"]))
+			job["next try"] = time.time() + delay
+
+	def __finish(self, key: str, sent: bool):
+		with self.__condition:
+			self.__finish_locked(key, sent)
+
+	def __finish_locked(self, key: str, sent: bool):
+		job = self.__jobs.pop(key)
+		self.__targets.pop(key, None)
+		if sent:
+			self.__sent[key] = time.time()
+			self.sent[job["kind"]] += 1
+		else:
+			print(f"Gave up on the {job['kind']} reply to {job['target']}")
+			self.dropped += 1
+
+	def save(self):
+		cutoff = time.time() - self.sent_days * 86400
+		with self.__condition:
+			self.__sent = {key: sent_time for key, sent_time in self.__sent.items() if sent_time >= cutoff}
+			if self.path is None:
+				return
+			write_atomic(self.path, json.dumps({"jobs": self.__jobs, "sent": self.__sent}))
+
+	def report(self) -> dict:
+		return {"sent": dict(self.sent), "retries": self.retries, "dropped": self.dropped, "pending": self.pending()}
@@ -0,0 +1,165 @@
+import queue
+import threading
+
+from prawcore.exceptions import Forbidden, NotFound, TooManyRequests
+
+# Marks the end of the work for one worker thread
+_DONE = object()
+
+
+# Crawls subreddits as a pipeline of worker threads connected by bounded queues:
+# listings -> comment tree expansion -> detection -> replies
+# While one stage waits on the network the others keep working, and the bot's rate limiter
+# is shared by every stage because all requests go through the same praw instance
+class CrawlPipeline:
+	def __init__(self, bot, listing_workers=2, expansion_workers=4, reply_workers=2, queue_size=20):
+		self.bot = bot
+		self.listing_workers = listing_workers
+		self.expansion_workers = expansion_workers
+		self.reply_workers = reply_workers
+		self.queue_size = queue_size
+		self.__lock = threading.Lock()
+		self.__errors = []
+		# Set once a request is still refused for the rate limit after every retry, like the serial loop stops
+		self.__rate_limited = threading.Event()
+		self.mistakes_found = 0
+
+	# Runs the pipeline over the subreddits and returns the number of mistakes corrected
+	def run(self, subreddit_names) -> int:
+		subreddits = queue.Queue()
+		submissions = queue.Queue(maxsize=self.queue_size)
+		expanded = queue.Queue(maxsize=self.queue_size)
+		replies = queue.Queue(maxsize=self.queue_size)
+
+		for subreddit_name in subreddit_names:
+			subreddits.put(subreddit_name)
+
+		stages = [
+			(self.listing_workers, self.fetch_listings, subreddits, submissions, self.expansion_workers),
+			(self.expansion_workers, self.expand, submissions, expanded, 1),
+			(1, self.detect, expanded, replies, self.reply_workers),
+			(self.reply_workers, self.reply, replies, None, 0),
+		]
+		# Each stage gets one end marker per worker, and passes them on once all of its workers finish
+		for _ in range(self.listing_workers):
+			subreddits.put(_DONE)
+
+		threads = []
+		for workers, handler, inbox, outbox, next_workers in stages:
+			remaining = [workers]
+			for _ in range(workers):
+				thread = threading.Thread(target=self.__work,
+				                          args=(handler, inbox, outbox, remaining, next_workers),
+				                          daemon=True)
+				thread.start()
+				threads.append(thread)
+		for thread in threads:
+			thread.join()
+
+		if self.__errors:
+			raise self.__errors[0]
+		return self.mistakes_found
+
+	def __work(self, handler, inbox: queue.Queue, outbox: queue.Queue, remaining: list[int], next_workers: int):
+		while True:
+			item = inbox.get()
+			if item is _DONE:
+				break
+			# Once rate limited, the rest is left for the next run, but the queues are still drained
+			if self.__rate_limited.is_set():
+				continue
+			try:
+				handler(item, outbox)
+			# If the subreddit or post is private or gone, skip it
+			except (Forbidden, NotFound):
+				continue
+			except TooManyRequests:
+				if not self.__rate_limited.is_set():
+					print("Rate limited, stopping early")
+				self.__rate_limited.set()
+			except Exception as e:
+				# Keep draining the queue so the other stages don't block, then raise at the end
+				with self.__lock:
+					self.__errors.append(e)
+
+		with self.__lock:
+			remaining[0] -= 1
+			last_worker = remaining[0] == 0
+		if last_worker:
+			for _ in range(next_workers):
+				outbox.put(_DONE)
+
+	# Stage 1: fetch the hot posts of a subreddit
+	def fetch_listings(self, subreddit_name: str, outbox: queue.Queue):
+		subreddit = self.bot.praw_instance.subreddit(subreddit_name)
+		with self.bot.metrics.subreddit_timer(subreddit_name):
+			submissions = self.bot.get_submissions(subreddit)
+		for submission in submissions:
+			outbox.put((submission, subreddit.display_name))
+
+	# Stage 2: load the comment tree of a post, passing on each batch of comments
+	def expand(self, item, outbox: queue.Queue):
+		submission, subreddit_name = item
+		print(f"{submission.id} in {subreddit_name}")
+		batches = self.bot.load_comments(submission)
+		while True:
+			# The post isn't finished, so it is checked again next run
+			if self.__rate_limited.is_set():
+				return
+			# Time spent waiting on the next stage isn't counted
+			with self.bot.metrics.subreddit_timer(subreddit_name):
+				comments = next(batches, None)
+			if comments is None:
+				break
+			outbox.put(("check", comments, subreddit_name))
+		# Saving the submission is a write, so it goes through the reply stage as well
+		outbox.put(("finish", submission, subreddit_name))
+
+	# Stage 3: check the comments for mistakes
+	def detect(self, item, outbox: queue.Queue):
+		if item[0] == "finish":
+			outbox.put(item)
+			return
+		_, comments, subreddit_name = item
+		with self.bot.metrics.subreddit_timer(subreddit_name):
+			detected = self.bot.detect_mistakes(comments, subreddit_name)
+		for comment, text, matches in detected:
+			outbox.put(("correct", comment, text, matches, subreddit_name))
+
+	# Stage 4: send corrections and save finished posts
+	def reply(self, item, outbox):
+		with self.bot.metrics.subreddit_timer(item[-1]):
+			if item[0] == "finish":
+				self.bot.finish_submission(*item[1:])
+				return
+			corrected = self.bot.correct_comment(*item[1:])
+		if corrected:
+			with self.__lock:
+				self.mistakes_found += 1
+
+
+# Compares the serial loop with the pipeline on a fake Reddit with simulated network latency
+if __name__ == "__main__":
+	import tempfile
+	import time
+
+	from data_manager import FileManager
+	from fake_reddit import FakeReddit, write_data_files
+	from main import AmmoniumBot
+	from mistakes import MistakeChecker, mistakes
+	from ratelimit import RateLimiter
+	from reply import ReplyManager
+
+	with tempfile.TemporaryDirectory() as directory:
+		paths = write_data_files(directory)
+		for crawl_mode in ["serial", "pipeline"]:
+			limiter = RateLimiter(requests_per_minute=30000)
+			reddit = FakeReddit.generate(num_subreddits=5, latency=0.02, limiter=limiter, seed=1)
+			bot = AmmoniumBot(ReplyManager(), FileManager(*paths), MistakeChecker(mistakes), praw_instance=reddit,
+			                  crawl_mode=crawl_mode, limiter=limiter)
+			bot.monitored_subreddits = list(reddit.subreddits)
+			start = time.perf_counter()
+			bot.main_loop() if crawl_mode == "serial" else CrawlPipeline(bot).run(bot.monitored_subreddits)
+			elapsed = time.perf_counter() - start
+			print(f"{crawl_mode}: {reddit.requests} requests in {elapsed:.2f}s "
+			      f"({reddit.requests / elapsed:.0f} requests/s), {len(reddit.replies)} replies")
@@ -0,0 +1,104 @@
+import re
+from typing import NamedTuple, Optional
+
+from matcher import PatternMatcher
+
+
+# Removes quoted lines (the ones starting with ">") and lowercases the rest
+def strip_quotes(body: str) -> str:
+	return remove_quoted_lines(body.lower())
+
+
+# Most comments don't quote anything, and are returned as they are instead of being split and joined
+def remove_quoted_lines(text: str) -> str:
+	if not text.startswith(">") and "\n>" not in text:
+		return text
+	return "\n".join(line for line in text.split("\n") if not line.startswith(">"))
+
+
+# Words (with any apostrophes inside them), single punctuation marks and line breaks; other whitespace only separates
+# tokens, so a phrase can't match across punctuation or lines
+# Line breaks are matched with the punctuation, which is faster than a branch of their own
+_token = re.compile(r"\w+(?:'\w+)*|[^\w \t\r\f\v]")
+
+
+# Marks in the phrases given to the prefilter trie, replaced with regex once it is built: a space between two words
+# that may be attached (at least one of them is punctuation), and the start and end of a phrase on a word
+_ATTACHED, _WORD_START, _WORD_END = "\x00", "\x01", "\x02"
+_word = re.compile(r"\w")
+
+
+# Tokens of a text with their offsets in it
+class Tokens(NamedTuple):
+	words: list[str]
+	starts: list[int]
+	ends: list[int]
+
+
+# Typographic apostrophes are read as plain ones; the text keeps the same length, so offsets stay the same
+def normalize(text: str) -> str:
+	return text.replace("\u2019", "'") if "\u2019" in text else text
+
+
+# Splits quote-free lowercase text into tokens, once for every rule checked
+def tokenize(text: str) -> list[str]:
+	return _token.findall(normalize(text))
+
+
+# The same tokens with their offsets, only needed for texts with a mistake
+# Tokens already split from the text can be passed as words: each one is then found after the one before it, which
+# costs less than splitting the text again
+def tokenize_with_offsets(text: str, words: list[str] = None) -> Tokens:
+	text = normalize(text)
+	tokens = Tokens(_token.findall(text) if words is None else words, [], [])
+	end = 0
+	for word in tokens.words:
+		start = text.find(word, end)
+		end = start + len(word)
+		tokens.starts.append(start)
+		tokens.ends.append(end)
+	return tokens
+
+
+# Prepares comment bodies for detection, stopping as early as possible for comments that can't contain a mistake
+# Lowercasing the whole body once costs far less than a case-insensitive regex search, so the prefilter
+# searches the lowercase body, and the same string is reused as the text to check
+# With word_boundaries, the patterns are searched for as whole words, with any spaces between them and typographic
+# apostrophes as well, like the tokens are matched
+class CommentPreprocessor:
+	def __init__(self, mistake_list, word_boundaries=False):
+		# Patterns don't contain line breaks, so any pattern in the quote-free text is also in the whole body.
+		# They all start with a space in practice, which lets the regex engine skip ahead to each space.
+		patterns = {mistake.get_pattern() for mistake in mistake_list} - {""}
+		if word_boundaries and patterns:
+			phrases = {CommentPreprocessor.__phrase(tokenize(pattern)) for pattern in patterns} - {""}
+			regex = PatternMatcher.build_trie_regex(phrases)
+			regex = (regex.replace("\\ ", "[^\\S\\n]+").replace(_ATTACHED, "[^\\S\\n]*")
+			         .replace(_WORD_START, "(?<!\\w)").replace(_WORD_END, "(?!\\w)").replace("'", "['\u2019]"))
+			self.__prefilter = re.compile(regex) if phrases else None
+		else:
+			self.__prefilter = re.compile(PatternMatcher.build_trie_regex(patterns)) if patterns else None
+
+	# The tokens as the prefilter finds them: words are separated by spaces, punctuation can be attached to the
+	# tokens next to it, like the tokenizer splits "of." too, and words at the ends can't be part of longer words
+	@staticmethod
+	def __phrase(tokens: list[str]) -> str:
+		if not tokens:
+			return ""
+		phrase = tokens[0]
+		for previous, token in zip(tokens, tokens[1:]):
+			both_words = _word.match(previous[-1]) and _word.match(token[0])
+			phrase += (" " if both_words else _ATTACHED) + token
+		start = _WORD_START if _word.match(tokens[0][0]) else ""
+		end = _WORD_END if _word.match(tokens[-1][-1]) else ""
+		return start + phrase + end
+
+	def might_contain_mistake(self, lowercase_body: str) -> bool:
+		return self.__prefilter is not None and self.__prefilter.search(lowercase_body) is not None
+
+	# Returns the same text as strip_quotes, or None if the comment can't contain a mistake
+	def prepare(self, body: str) -> Optional[str]:
+		text = body.lower()
+		if not self.might_contain_mistake(text):
+			return None
+		return remove_quoted_lines(text)
@@ -0,0 +1,104 @@
+import threading
+import time
+
+from prawcore import Requestor
+
+# Request priorities: replies and other writes go before crawling when both are waiting
+READ = "read"
+WRITE = "write"
+
+
+# Token bucket shared by every thread, so they all use one rate limit budget
+# Tokens come back at the configured rate until Reddit's rate limit headers say otherwise
+class RateLimiter:
+	# Reddit allows 100 requests per minute for OAuth clients
+	# burst is how many unused requests can be saved up and made without waiting
+	def __init__(self, requests_per_minute: float = 100, burst: float = 1):
+		self.__max_rate = requests_per_minute / 60
+		self.__rate = self.__max_rate
+		self.__capacity = burst
+		self.__tokens = float(burst)
+		self.__updated = time.monotonic()
+		self.__waiting_writes = 0
+		self.__condition = threading.Condition()
+		self.__local = threading.local()
+		self.requests = 0
+		self.wait_seconds = 0.0
+		# Requests Reddit refused with 429 and the time spent waiting to retry them
+		self.retries = 0
+		self.retry_seconds = 0.0
+
+	# Blocks until the next request is allowed
+	def acquire(self, priority=READ):
+		start = time.monotonic()
+		with self.__condition:
+			if priority == WRITE:
+				self.__waiting_writes += 1
+			try:
+				while True:
+					self.__refill()
+					# Reads also wait for any queued writes, so a long crawl can't hold up replies
+					if self.__tokens >= 1 and (priority == WRITE or not self.__waiting_writes):
+						break
+					self.__condition.wait(max(1 - self.__tokens, 0.01) / self.__rate)
+				self.__tokens -= 1
+				self.requests += 1
+				self.wait_seconds += time.monotonic() - start
+			finally:
+				if priority == WRITE:
+					self.__waiting_writes -= 1
+				self.__condition.notify_all()
+		self.__local.requests = self.thread_requests() + 1
+
+	def __refill(self):
+		now = time.monotonic()
+		self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated) * self.__rate)
+		self.__updated = now
+
+	# Spreads the requests Reddit says are left evenly over the rest of its rate limit window
+	def update(self, headers):
+		if "x-ratelimit-remaining" not in headers or "x-ratelimit-reset" not in headers:
+			return
+		remaining = float(headers["x-ratelimit-remaining"])
+		reset_seconds = max(float(headers["x-ratelimit-reset"]), 1)
+		with self.__condition:
+			self.__refill()
+			self.__tokens = min(self.__tokens, remaining)
+			# With nothing left, the next request waits for the window to reset
+			self.__rate = min(self.__max_rate, max(remaining, 1) / reset_seconds)
+			self.__condition.notify_all()
+
+	# Sleeps before retrying a request Reddit refused, for as long as it asked or with exponential backoff
+	def wait_to_retry(self, headers, attempt: int):
+		delay = headers.get("retry-after") or headers.get("x-ratelimit-reset")
+		delay = float(delay) if delay is not None else 2 ** attempt
+		with self.__condition:
+			self.retries += 1
+			self.retry_seconds += delay
+		time.sleep(delay)
+
+	# Number of requests made by the current thread
+	def thread_requests(self) -> int:
+		return getattr(self.__local, "requests", 0)
+
+
+# Requestor that makes every praw request wait for the shared rate limiter
+# Requests refused with 429 are retried on their own, so the bot carries on where it was
+class LimitedRequestor(Requestor):
+	def __init__(self, *args, limiter: RateLimiter, max_retries=5, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.limiter = limiter
+		self.max_retries = max_retries
+
+	def request(self, *args, **kwargs):
+		method = kwargs.get("method") or args[0]
+		priority = READ if method.upper() == "GET" else WRITE
+		attempt = 0
+		while True:
+			self.limiter.acquire(priority)
+			response = super().request(*args, **kwargs)
+			self.limiter.update(response.headers)
+			if response.status_code != 429 or attempt >= self.max_retries:
+				return response
+			self.limiter.wait_to_retry(response.headers, attempt)
+			attempt += 1
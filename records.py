@@ -0,0 +1,111 @@
+from praw import models
+
+# praw's defaults for submission.comment_limit and submission.comment_sort
+COMMENT_LIMIT, COMMENT_SORT = 2048, "confidence"
+
+
+# Author of a comment; one object per name, shared by every comment from the same user
+class RecordAuthor:
+	__slots__ = ("name",)
+
+	def __init__(self, name: str):
+		self.name = name
+
+
+# A comment with only the fields the bot uses, parsed from the listing JSON instead of a praw Comment
+# Replying or saving makes the praw Comment, without fetching it, only when needed
+class CommentRecord:
+	__slots__ = ("_reddit", "id", "body", "author", "saved", "created_utc", "depth", "replies")
+
+	def __init__(self, reddit, comment_id: str, body: str, author, saved: bool, created_utc: float, depth: int,
+	             replies: list):
+		self._reddit = reddit
+		self.id = comment_id
+		self.body = body
+		self.author = author
+		self.saved = saved
+		self.created_utc = created_utc
+		self.depth = depth
+		self.replies = replies
+
+	def reply(self, body: str):
+		return self._reddit.comment(self.id).reply(body=body)
+
+	def save(self):
+		self._reddit.comment(self.id).save()
+		self.saved = True
+
+
+# "Load more comments" link in a thread, loaded through the RawCommentLoader that parsed it
+class MoreRecord(models.MoreComments):
+	def __init__(self, loader: "RawCommentLoader", submission_id: str, data: dict):
+		super().__init__(loader.reddit, _data={key: data.get(key) for key in ["count", "children", "depth",
+		                                                                      "parent_id", "id"]})
+		self._loader = loader
+		self._submission_id = submission_id
+
+	def comments(self, update=True) -> list:
+		return self._loader.load_more(self)
+
+
+# The parts of a submission the CommentExpander uses, with the comment tree made of records
+class RecordThread:
+	__slots__ = ("id", "created_utc", "num_comments", "comments")
+
+	def __init__(self, submission, comments: list):
+		self.id = submission.id
+		self.created_utc = submission.created_utc
+		self.num_comments = submission.num_comments
+		self.comments = comments
+
+
+# Loads comment trees with raw API requests, parsing the JSON into records instead of praw objects, so large
+# threads take a fraction of the memory
+class RawCommentLoader:
+	def __init__(self, reddit):
+		self.reddit = reddit
+		self.__authors = {}
+
+	# One request, like the first access to submission.comments, with the same limit and sort so both load the same
+	# comments
+	def load(self, submission) -> RecordThread:
+		params = {"limit": getattr(submission, "comment_limit", COMMENT_LIMIT),
+		          "sort": getattr(submission, "comment_sort", COMMENT_SORT), "raw_json": 1}
+		listings = self.reddit.request(method="GET", path=f"comments/{submission.id}", params=params)
+		return RecordThread(submission, self.parse(listings[1]["data"]["children"], submission.id))
+
+	def load_more(self, more: MoreRecord) -> list:
+		# Links to deeper threads ("continue this thread") have no children; the thread is loaded from its parent
+		if not more.children:
+			parent_id = more.parent_id.split("_", 1)[1]
+			listings = self.reddit.request(method="GET", path=f"comments/{more._submission_id}/_/{parent_id}",
+			                               params={"raw_json": 1})
+			parents = self.parse(listings[1]["data"]["children"], more._submission_id)
+			return parents[0].replies if parents else []
+		data = self.reddit.request(method="GET", path="api/morechildren",
+		                           params={"api_type": "json", "link_id": f"t3_{more._submission_id}",
+		                                   "children": ",".join(more.children), "raw_json": 1})
+		return self.parse(data["json"]["data"]["things"], more._submission_id)
+
+	# Turns listing children ("t1" comments and "more" links) into records, with their replies
+	def parse(self, things: list[dict], submission_id: str) -> list:
+		items = []
+		for thing in things:
+			data = thing["data"]
+			if thing["kind"] == "more":
+				items.append(MoreRecord(self, submission_id, data))
+				continue
+			replies = data.get("replies")
+			items.append(CommentRecord(self.reddit, data["id"], data["body"], self.author(data.get("author")),
+			                           data.get("saved", False), data["created_utc"], data.get("depth", 0),
+			                           self.parse(replies["data"]["children"], submission_id) if replies else []))
+		return items
+
+	# Deleted comments have no author, like praw
+	def author(self, name):
+		if name is None or name == "[deleted]":
+			return None
+		author = self.__authors.get(name)
+		if author is None:
+			author = self.__authors[name] = RecordAuthor(name)
+		return author
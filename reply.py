@@ -3,7 +3,9 @@ import json
 import praw
 from praw import models
 
-from mistakes import Mistake
+from mistakes import Match
+from outbox import ReplyOutbox, COMMENT, MESSAGE, DIRECT_MESSAGE
+from templates import ReplyTemplates
 from enum import Enum
 
 class FeedBack(Enum):
@@ -11,51 +13,56 @@ class FeedBack(Enum):
 	BAD_BOT = "bad bot"
 
 class ReplyManager:
-	@staticmethod
-	def send_correction(comment: praw.models.Comment, text: str, mistake: Mistake):
-		context = mistake.find_context(text)
-		comment.reply(body=f"""
-> {context}  
-
-Hi, did you mean to say \"{mistake.get_correction()}\"?  
-{mistake.get_explanation()}  
-Sorry if I made a mistake! Please [let me know](https://www.reddit.com/message/compose/?to=chiefpat450119&subject=Bot%20Feedback&message=Your%20feedback%20here) if I did.
-Have a great day!  
-[Statistics](https://github.com/chiefpat450119/RedditBot/blob/master/stats.json)  
-^^I'm ^^a ^^bot ^^that ^^corrects ^^grammar/spelling ^^mistakes.
-^^PM ^^me ^^if ^^I'm ^^wrong ^^or ^^if ^^you ^^have ^^any ^^suggestions.   
-^^[Github](https://github.com/chiefpat450119)  
-^^Reply ^^STOP ^^to ^^this ^^comment ^^to ^^stop ^^receiving ^^corrections.
-""")
+	# With an outbox, replies are queued and sent by its drainer; without one they are sent straight away
+	def __init__(self, outbox: ReplyOutbox = None, templates: ReplyTemplates = None):
+		self.outbox = outbox
+		self.templates = templates or ReplyTemplates.load()
+
+	# Replies once to a comment, covering every different mistake found in it, and saves it once replied
+	# Returns False if a reply to the comment is already queued
+	# With an outbox, event is logged once the reply is actually sent
+	def send_correction(self, comment: praw.models.Comment, text: str, matches: list[Match],
+	                    subreddit_name=None, event=None) -> bool:
+		body = self.correction_body(text, matches, subreddit_name)
+		if self.outbox is not None:
+			return self.outbox.enqueue(COMMENT, comment.id, body, target=comment, event=event)
+		comment.reply(body=body)
+		# Save the comment so the bot doesn't reply to it again
+		comment.save()
+		return True
+
+	# The footer and language depend on the subreddit
+	def correction_body(self, text: str, matches: list[Match], subreddit_name=None) -> str:
+		return self.templates.render(text, matches, subreddit_name)
 
 	# Send reply to bots
-	@staticmethod
-	def bot_reply(message):
-		if "bot" in message.author.name.lower():
-			message.mark_read()
-			message.reply(body="This is the superior bot.")
-
-
-	@staticmethod
-	def check_feedback(message, file_manager):
-		if "good bot" in message.body.lower():  # Auto-reply to good and bad bot comments
-			message.mark_read()
-			num_good, num_bad = file_manager.update_good_bad(FeedBack.GOOD_BOT)
-			# Send a reply
-			message.reply(body=f"""Thank you!    
+	def bot_reply(self, message):
+		self.reply(message, "This is the superior bot.")
+
+	# Auto-reply to good and bad bot comments
+	def feedback_reply(self, message, feedback: FeedBack, file_manager):
+		num_good, num_bad = file_manager.update_good_bad(feedback)
+		if feedback == FeedBack.GOOD_BOT:
+			self.reply(message, f"""Thank you!    
 			                   Good bot count: {num_good}  
 			                   Bad bot count: {num_bad}""")
-
-		elif "bad bot" in message.body.lower():
-			message.mark_read()
-			num_good, num_bad = file_manager.update_good_bad(FeedBack.BAD_BOT)
-			# Send a reply
-			message.reply(body=f"""Hey, that hurt my feelings :(  
+		else:
+			self.reply(message, f"""Hey, that hurt my feelings :(  
 			                   Good bot count: {num_good}  
 			                   Bad bot count: {num_bad}""")
 
-	@staticmethod
-	def stop_message(user: praw.models.Redditor):
+	def stop_message(self, user: praw.models.Redditor):
 		# Send a DM
-		user.message(subject="Bot Stopped",
-		             message="You will no longer receive corrections from the bot.")
\ No newline at end of file
+		subject = "Bot Stopped"
+		body = "You will no longer receive corrections from the bot."
+		if self.outbox is not None:
+			self.outbox.enqueue(DIRECT_MESSAGE, user.name, body, subject=subject, target=user)
+		else:
+			user.message(subject=subject, message=body)
+
+	# Reply to an inbox message
+	def reply(self, message, body: str):
+		if self.outbox is not None:
+			self.outbox.enqueue(MESSAGE, message.id, body, target=message, fullname=message.fullname)
+		else:
+			message.reply(body=body)
\ No newline at end of file
@@ -0,0 +1,112 @@
+import json
+import time
+from typing import Optional
+
+from atomic import write_atomic
+
+# Assumed for subreddits that haven't been visited yet
+DEFAULT_REQUESTS_PER_VISIT = 25
+DEFAULT_SECONDS_PER_VISIT = 15
+# Weight of the latest visit in the running averages, so yields can change over time
+RECENT_WEIGHT = 0.3
+
+
+# Decides which subreddits to visit in a run, based on how many mistakes each one has produced per API request, or
+# per share of the run's API request and time budgets when there is a time budget
+class SubredditScheduler:
+	# Without any budget every subreddit is visited, in order of yield; time_budget is in seconds
+	# exploration is the fraction of the budgets spent on the subreddits visited least recently
+	def __init__(self, stats_path=None, request_budget: Optional[int] = None, exploration=0.1,
+	             time_budget: Optional[float] = None):
+		self.stats_path = stats_path
+		self.request_budget = request_budget
+		self.time_budget = time_budget
+		self.exploration = exploration
+		self.stats = {}
+		if self.stats_path is not None:
+			try:
+				with open(self.stats_path, "r") as file:
+					self.stats = json.load(file)
+			# Without a readable history every subreddit is scheduled like a new one, until it is visited again
+			except (FileNotFoundError, json.JSONDecodeError):
+				pass
+
+	def expected_requests(self, subreddit_name: str) -> float:
+		record = self.stats.get(subreddit_name)
+		return record["api requests"] if record else DEFAULT_REQUESTS_PER_VISIT
+
+	def expected_seconds(self, subreddit_name: str) -> float:
+		record = self.stats.get(subreddit_name)
+		return record.get("seconds", DEFAULT_SECONDS_PER_VISIT) if record else DEFAULT_SECONDS_PER_VISIT
+
+	# The largest share of a budget that the requests and seconds take up
+	def budget_share(self, requests: float, seconds: float) -> float:
+		shares = [0.0]
+		if self.request_budget is not None:
+			shares.append(requests / self.request_budget)
+		if self.time_budget is not None:
+			shares.append(seconds / self.time_budget)
+		return max(shares)
+
+	# Mistakes per API request, or per share of the tightest budget with a time budget, with a prior so a single lucky
+	# or unlucky visit doesn't decide
+	def expected_yield(self, subreddit_name: str) -> float:
+		record = self.stats.get(subreddit_name, {})
+		requests = record.get("api requests", 0) + DEFAULT_REQUESTS_PER_VISIT
+		if self.time_budget is not None:
+			cost = self.budget_share(requests, record.get("seconds", 0) + DEFAULT_SECONDS_PER_VISIT)
+		else:
+			cost = requests
+		return (record.get("mistakes found", 0) + 1) / cost
+
+	def last_visit(self, subreddit_name: str) -> float:
+		return self.stats.get(subreddit_name, {}).get("last visit", 0)
+
+	# Returns the subreddits to visit this run, best first
+	def plan(self, subreddit_names: list[str]) -> list[str]:
+		ranked = sorted(subreddit_names, key=self.expected_yield, reverse=True)
+		if self.request_budget is None and self.time_budget is None:
+			return ranked
+
+		planned = []
+		requests = seconds = 0.0
+		# Subreddits that haven't been visited for the longest go first, never visited ones before all others
+		for subreddit_name in sorted(subreddit_names, key=self.last_visit):
+			if self.budget_share(requests, seconds) >= self.exploration:
+				break
+			planned.append(subreddit_name)
+			requests += self.expected_requests(subreddit_name)
+			seconds += self.expected_seconds(subreddit_name)
+		chosen = set(planned)
+		for subreddit_name in ranked:
+			if subreddit_name in chosen:
+				continue
+			visit_requests = self.expected_requests(subreddit_name)
+			visit_seconds = self.expected_seconds(subreddit_name)
+			if self.budget_share(requests + visit_requests, seconds + visit_seconds) > 1:
+				continue
+			planned.append(subreddit_name)
+			requests += visit_requests
+			seconds += visit_seconds
+		# Best yield first, in case the run stops early
+		return sorted(planned, key=self.expected_yield, reverse=True)
+
+	# Updates the running averages with the per-subreddit records of a run report
+	def record(self, subreddit_records: dict[str, dict], visit_time=None):
+		if visit_time is None:
+			visit_time = time.time()
+		for subreddit_name, record in subreddit_records.items():
+			previous = self.stats.get(subreddit_name)
+			current = {key: record.get(key, 0) for key in ["comments scanned", "mistakes found", "api requests",
+			                                               "seconds"]}
+			if previous is not None:
+				current = {key: RECENT_WEIGHT * value + (1 - RECENT_WEIGHT) * previous[key]
+				           for key, value in current.items()}
+			current["visits"] = (previous or {}).get("visits", 0) + 1
+			current["last visit"] = visit_time
+			self.stats[subreddit_name] = current
+
+	def save(self):
+		if self.stats_path is None:
+			return
+		write_atomic(self.stats_path, json.dumps(self.stats))
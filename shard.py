@@ -0,0 +1,259 @@
+import heapq
+import json
+import os
+import time
+import traceback
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+from blocklist import Blocklist
+from data_manager import CrawlState
+from memo import DetectionMemo
+from expansion import CommentExpander, ExpansionPolicy
+from main import AmmoniumBot
+from mistakes import MistakeChecker, mistakes
+from outbox import ReplyOutbox
+from ratelimit import RateLimiter
+from reply import FeedBack, ReplyManager
+from scheduler import SubredditScheduler, DEFAULT_REQUESTS_PER_VISIT
+from templates import ReplyTemplates, REPLIES_PATH
+
+
+# The subreddits one worker process crawls, with the account it uses
+class Shard(NamedTuple):
+	index: int
+	subreddits: list[str]
+	credentials: Optional[dict]
+
+
+# Returns the credentials of every account in the environment: CLIENT_ID, CLIENT_SECRET and PASSWORD for the main
+# account, then CLIENT_ID_1, CLIENT_SECRET_1, USERNAME_1 and PASSWORD_1 and so on for the others
+def load_credentials(environ=os.environ) -> list[dict]:
+	accounts = [{"client_id": environ.get("CLIENT_ID"), "client_secret": environ.get("CLIENT_SECRET"),
+	             "username": "ammonium_bot", "password": environ.get("PASSWORD")}]
+	while f"CLIENT_ID_{len(accounts)}" in environ:
+		suffix = len(accounts)
+		accounts.append({"client_id": environ[f"CLIENT_ID_{suffix}"],
+		                 "client_secret": environ.get(f"CLIENT_SECRET_{suffix}"),
+		                 "username": environ.get(f"USERNAME_{suffix}"),
+		                 "password": environ.get(f"PASSWORD_{suffix}")})
+	return accounts
+
+
+# Same interface as FileManager for a worker process: reads come from a copy of the data taken by the coordinator,
+# and writes are only recorded, for the coordinator to merge into the real files once every shard has finished
+class ShardFileManager:
+	def __init__(self, stopped_users, sub_db: dict[str, bool], stats: dict[str, int], subreddits: list[str]):
+		self.__blocklist = Blocklist(stopped_users)
+		self.__sub_db = dict(sub_db)
+		self.__stats = dict(stats)
+		self.__subreddits = list(subreddits)
+		self.stopped_users = []
+		self.banned = []
+		self.stat_changes = defaultdict(int)
+		# Logged with the time they happened, for the coordinator's event log
+		self.events = []
+
+	def get_stats(self) -> dict[str, int]:
+		return {name: value + self.stat_changes[name] for name, value in self.__stats.items()}
+
+	def get_sub_db(self) -> dict[str, bool]:
+		return dict(self.__sub_db)
+
+	def get_stopped_users(self) -> Blocklist:
+		return self.__blocklist
+
+	# Only the subreddits of this shard, in the order planned
+	def get_subreddits(self) -> list[str]:
+		return list(self.__subreddits)
+
+	def flush(self):
+		pass
+
+	# Runs are counted once, by the coordinator
+	def update_runs(self):
+		pass
+
+	def update_sub_db(self, subreddit_name: str):
+		self.__sub_db[subreddit_name] = True
+		self.banned.append(subreddit_name)
+
+	def update_mistake_counter(self, num_mistakes: int):
+		self.stat_changes["mistake counter"] += num_mistakes
+
+	def add_to_blocklist(self, username: str):
+		if self.__blocklist.add(username):
+			self.stopped_users.append(username)
+
+	def log_event(self, kind: str, subreddit_name=None, mistake_names: list[str] = None, timestamp=None):
+		self.events.append([int(time.time() if timestamp is None else timestamp), kind, subreddit_name, mistake_names])
+
+	def update_good_bad(self, feedback: FeedBack) -> tuple[int, int]:
+		if feedback == FeedBack.GOOD_BOT:
+			self.stat_changes["good"] += 1
+		elif feedback == FeedBack.BAD_BOT:
+			self.stat_changes["bad"] += 1
+		stats = self.get_stats()
+		return stats["good"], stats["bad"]
+
+	def changes(self) -> dict:
+		return {"stopped users": self.stopped_users, "banned": self.banned, "stats": dict(self.stat_changes),
+		        "events": self.events}
+
+
+# Runs one shard in a worker process and returns what it changed, for the coordinator to merge
+# reddit_factory(limiter, credentials) makes the Reddit instance, so tests can use a fake one
+def run_shard(shard: Shard, snapshot: dict, options: dict, reddit_factory=None) -> dict:
+	limiter = RateLimiter(options.get("requests per minute", 100))
+	reddit = (reddit_factory or AmmoniumBot.get_reddit)(limiter, shard.credentials)
+	file_manager = ShardFileManager(snapshot["stopped users"], snapshot["sub db"], snapshot["stats"],
+	                                shard.subreddits)
+	crawl_state = CrawlState(entries=snapshot["crawl state"])
+	# Each account sends its own replies, so each has its own outbox, and its own detection memo
+	username = (shard.credentials or {}).get("username", shard.index)
+	outbox_path = options.get("outbox path")
+	# The main account (the first one) can keep the outbox of unsharded runs instead
+	if shard.index == 0:
+		outbox_path = options.get("main outbox path", outbox_path)
+	outbox = ReplyOutbox(outbox_path.format(username=username)) if outbox_path else None
+	memo_path = options.get("detection memo path")
+	memo = DetectionMemo(memo_path.format(username=username), options.get("detection memo size", 20000)) \
+		if memo_path else None
+	bot = AmmoniumBot(ReplyManager(outbox, ReplyTemplates.load(REPLIES_PATH, mistakes)), file_manager,
+	                  MistakeChecker(mistakes, backend=options.get("detection backend", "compiled"), memo=memo),
+	                  praw_instance=reddit, crawl_mode=options.get("crawl mode", "serial"), limiter=limiter,
+	                  expander=CommentExpander(options.get("expansion policy") or ExpansionPolicy()),
+	                  crawl_state=crawl_state, first_mistake_only=options.get("first mistake only", False),
+	                  raw_comments=options.get("raw comments", False))
+	bot.run()
+	return {"index": shard.index,
+	        "changes": file_manager.changes(),
+	        "crawl state": crawl_state.changes_since(snapshot["crawl state"]),
+	        "report": bot.metrics.report(**bot.report_extras()),
+	        "mistakes found": bot.mistakes_found}
+
+
+# Splits the subreddits between one worker process per account, and merges what they changed once they finish
+class ShardCoordinator:
+	# options are passed to every worker: "crawl mode", "detection backend", "expansion policy",
+	# "first mistake only", "raw comments", "outbox path" and "detection memo path" (with {username} for the
+	# account), "main outbox path" for the first account, "detection memo size" and "requests per minute" per account
+	def __init__(self, file_manager, credentials: list[dict], crawl_state: CrawlState = None,
+	             scheduler: SubredditScheduler = None, options: dict = None, reddit_factory=None, report_path=None):
+		self.file_manager = file_manager
+		self.credentials = credentials
+		self.crawl_state = crawl_state or CrawlState()
+		self.scheduler = scheduler
+		self.options = options or {}
+		self.reddit_factory = reddit_factory
+		self.report_path = report_path
+		# Results of the shards that finished in the last run, and their reports added up
+		self.results = []
+		self.report = {}
+
+	# Expected API requests to visit a subreddit, from its history if there is a scheduler
+	def cost(self, subreddit_name: str) -> float:
+		if self.scheduler is None:
+			return DEFAULT_REQUESTS_PER_VISIT
+		return self.scheduler.expected_requests(subreddit_name)
+
+	# Splits the subreddits into one list per account with about the same expected cost each, keeping their order
+	# The most expensive subreddits are placed first, each one in the list with the least cost so far
+	def partition(self, subreddit_names: list[str]) -> list[list[str]]:
+		loads = [(0.0, index) for index in range(len(self.credentials))]
+		assigned = {}
+		for subreddit_name in sorted(subreddit_names, key=self.cost, reverse=True):
+			load, index = heapq.heappop(loads)
+			assigned[subreddit_name] = index
+			heapq.heappush(loads, (load + self.cost(subreddit_name), index))
+		shards = [[] for _ in self.credentials]
+		for subreddit_name in subreddit_names:
+			shards[assigned[subreddit_name]].append(subreddit_name)
+		return shards
+
+	# Runs every shard in its own process and returns the number of mistakes found
+	def run(self) -> int:
+		subreddit_names = self.file_manager.get_subreddits()
+		if self.scheduler is not None:
+			subreddit_names = self.scheduler.plan(subreddit_names)
+		shards = [Shard(index, subreddits, credentials) for index, (subreddits, credentials)
+		          in enumerate(zip(self.partition(subreddit_names), self.credentials)) if subreddits]
+		snapshot = {"stopped users": list(self.file_manager.get_stopped_users()),
+		            "sub db": self.file_manager.get_sub_db(),
+		            "stats": self.file_manager.get_stats(),
+		            "crawl state": self.crawl_state.entries()}
+
+		self.results = []
+		with ProcessPoolExecutor(max_workers=max(len(shards), 1)) as pool:
+			futures = [pool.submit(run_shard, shard, snapshot, self.options, self.reddit_factory) for shard in shards]
+			for shard, future in zip(shards, futures):
+				# The other shards' work is still kept if one fails
+				try:
+					self.results.append(future.result())
+				except Exception:
+					print(f"Shard {shard.index} ({len(shard.subreddits)} subreddits) failed")
+					traceback.print_exc()
+		self.merge(self.results)
+		self.report = ShardCoordinator.combine([result["report"] for result in self.results])
+		for result in self.results:
+			print(f"Shard {result['index']}: {result['report']['counters'].get('api requests', 0)} requests, "
+			      f"{result['mistakes found']} mistakes found in {result['report']['seconds']}s")
+		print(f"Used {self.report.get('expansion', {}).get('run requests', 0)} requests to load more comments")
+		print(f"Skipped {self.report.get('skipped comments', 0)} comments checked in earlier runs")
+		if self.report_path:
+			with open(self.report_path, "w") as file:
+				json.dump(self.report, file, indent=4)
+		return sum(result["mistakes found"] for result in self.results)
+
+	# Adds up the reports of the shards into one like the report of an unsharded run, with the counters of each
+	# shard as well; the shards run at the same time, so the run takes as long as the slowest one
+	@staticmethod
+	def combine(reports: list[dict]) -> dict:
+		combined = {"seconds": max((report["seconds"] for report in reports), default=0),
+		            "shards": [report["counters"] for report in reports]}
+		for report in reports:
+			for key, value in report.items():
+				if key == "started":
+					combined[key] = min(combined.get(key, value), value)
+				elif key != "seconds":
+					combined[key] = ShardCoordinator.__add(combined.get(key), value)
+		memo = combined.get("detection_memo")
+		if memo and memo["hits"] + memo["misses"]:
+			memo["hit rate"] = round(memo["hits"] / (memo["hits"] + memo["misses"]), 4)
+		return combined
+
+	# Sum of two numbers, or of two dicts of numbers key by key
+	@staticmethod
+	def __add(total, value):
+		if isinstance(value, dict):
+			total = dict(total or {})
+			for key, item in value.items():
+				total[key] = ShardCoordinator.__add(total.get(key), item)
+			return total
+		return value if total is None else total + value
+
+	# Applies the changes of every shard to the real files, from this process only
+	def merge(self, results: list[dict]):
+		banned = self.file_manager.get_sub_db()
+		subreddit_records = {}
+		for result in results:
+			changes = result["changes"]
+			for username in changes["stopped users"]:
+				self.file_manager.add_to_blocklist(username)
+			# A ban found by several accounts is only recorded once
+			for subreddit_name in changes["banned"]:
+				if not banned.get(subreddit_name):
+					banned[subreddit_name] = True
+					self.file_manager.update_sub_db(subreddit_name)
+			self.file_manager.add_stats(changes["stats"])
+			for timestamp, kind, subreddit_name, mistake_names in changes["events"]:
+				self.file_manager.log_event(kind, subreddit_name, mistake_names, timestamp)
+			self.crawl_state.apply(result["crawl state"])
+			subreddit_records.update(result["report"]["subreddits"])
+		self.file_manager.update_runs()
+		self.crawl_state.save()
+		if self.scheduler is not None:
+			self.scheduler.record(subreddit_records)
+			self.scheduler.save()
+		self.file_manager.flush()
@@ -0,0 +1,132 @@
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from prawcore.exceptions import RequestException, ServerError
+
+from data_manager import StreamCheckpoint, CrawlState
+
+# Marks the end of the stream for the checking thread
+_DONE = object()
+
+
+# Runs the bot continuously on the comment stream of all the monitored subreddits at once
+# One thread reads the stream into a bounded queue, and the calling thread checks and corrects the comments
+# in batches. State is flushed every flush_interval seconds rather than after every comment.
+class StreamDaemon:
+	def __init__(self, bot, checkpoint: StreamCheckpoint = None, queue_size=100, batch_size=50,
+	             flush_interval=300, retry_delay=30):
+		self.bot = bot
+		self.checkpoint = checkpoint or StreamCheckpoint()
+		self.queue_size = queue_size
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		# Seconds to wait before reconnecting after a network or server error
+		self.retry_delay = retry_delay
+		self.mistakes_found = 0
+		self.__stopping = threading.Event()
+		self.__error = None
+		# Newest comment put on the queue, so a reconnected stream doesn't queue comments twice
+		self.__last_queued = self.checkpoint.last_comment
+
+	# Checks comments until stopped, or until there are no new comments if stop_when_idle is set
+	# Returns the number of mistakes corrected
+	def run(self, stop_when_idle=False) -> int:
+		comments = queue.Queue(maxsize=self.queue_size)
+		reader = threading.Thread(target=self.__read, args=(comments, stop_when_idle), daemon=True)
+		reader.start()
+		last_flush = time.monotonic()
+		try:
+			while True:
+				batch = self.__next_batch(comments)
+				finished = batch[-1] is _DONE
+				if finished:
+					batch.pop()
+				self.check_batch(batch)
+				if finished:
+					break
+				if time.monotonic() - last_flush >= self.flush_interval:
+					self.flush()
+					last_flush = time.monotonic()
+		finally:
+			self.stop()
+			# The bot only drains the outbox after this returns, which can take a while under the rate limit
+			self.save()
+		if self.__error is not None:
+			raise self.__error
+		return self.mistakes_found
+
+	# Can be called from another thread or a signal handler
+	def stop(self):
+		self.__stopping.set()
+
+	# Waits for one comment, then takes whatever else is already queued up to the batch size
+	def __next_batch(self, comments: queue.Queue) -> list:
+		batch = [comments.get()]
+		while batch[-1] is not _DONE and len(batch) < self.batch_size:
+			try:
+				batch.append(comments.get_nowait())
+			except queue.Empty:
+				break
+		return batch
+
+	def __read(self, comments: queue.Queue, stop_when_idle: bool):
+		try:
+			while not self.__stopping.is_set():
+				try:
+					if self.__read_stream(comments, stop_when_idle):
+						break
+				# The stream is restarted after a pause, skipping the comments it already queued
+				except (RequestException, ServerError) as e:
+					print(f"Comment stream failed ({e}), reconnecting in {self.retry_delay}s")
+					self.__stopping.wait(self.retry_delay)
+		except Exception as e:
+			self.__error = e
+		finally:
+			comments.put(_DONE)
+
+	# Returns True once the stream is idle and stop_when_idle is set
+	def __read_stream(self, comments: queue.Queue, stop_when_idle: bool) -> bool:
+		multireddit = self.bot.praw_instance.subreddit("+".join(self.bot.monitored_subreddits))
+		# pause_after=0 yields None whenever a request finds nothing new, so stop() is noticed
+		for comment in multireddit.stream.comments(pause_after=0):
+			if self.__stopping.is_set():
+				return True
+			if comment is None:
+				if stop_when_idle:
+					return True
+				continue
+			# Skip comments checked before a restart, or queued before a reconnect
+			if int(comment.id, 36) <= self.__last_queued:
+				continue
+			self.__last_queued = int(comment.id, 36)
+			comments.put(comment)
+		return True
+
+	# Checks a batch of comments from any of the subreddits and corrects the mistakes found
+	def check_batch(self, comments: list):
+		by_subreddit = defaultdict(list)
+		for comment in comments:
+			by_subreddit[comment.subreddit.display_name].append(comment)
+		for subreddit_name, subreddit_comments in by_subreddit.items():
+			with self.bot.metrics.subreddit_timer(subreddit_name):
+				detected = self.bot.detect_mistakes(subreddit_comments, subreddit_name)
+				for comment, text, matches in detected:
+					if self.bot.correct_comment(comment, text, matches, subreddit_name):
+						self.mistakes_found += 1
+		self.checkpoint.advance(comments)
+
+	# Handles new messages, so STOP requests take effect while the daemon runs, and saves the state
+	def flush(self):
+		self.bot.check_inbox()
+		self.bot.file_manager.flush()
+		self.save()
+		print(f"Checked comments up to {CrawlState.to_base36(self.checkpoint.last_comment)}, "
+		      f"{self.mistakes_found} mistakes corrected")
+
+	# Queued replies are saved before the checkpoint moves past the comments they answer
+	def save(self):
+		if self.bot.reply_manager.outbox is not None:
+			self.bot.reply_manager.outbox.save()
+		self.checkpoint.save()
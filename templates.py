@@ -0,0 +1,84 @@
+import json
+import os
+
+from mistakes import Match, Mistake
+
+REPLIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "replies.json")
+
+
+# The text of correction replies in every language, from data/replies.json
+# The part of a reply that only depends on the mistake is rendered once per mistake and language, so a reply only
+# joins the quotes from the comment with strings already built
+class ReplyTemplates:
+	def __init__(self, locales: dict[str, dict], subreddits: dict[str, dict] = None, default_locale="en"):
+		self.default_locale = default_locale
+		# Strings missing from a language are taken from the default one
+		self.__locales = {name: {**locales[default_locale], **strings} for name, strings in locales.items()}
+		# Language and footer of the subreddits that don't use the defaults, by lowercase name
+		self.__subreddits = {name.lower(): settings for name, settings in (subreddits or {}).items()}
+		# Rendered sections of each language, by mistake: the rest of its section after the quote, as the first
+		# mistake and as a later one
+		self.__sections: dict[str, dict[Mistake, tuple[str, str]]] = {name: {} for name in self.__locales}
+		# Language, sections and footer for each subreddit name seen, so a reply doesn't look its settings up again
+		self.__by_subreddit: dict[str, tuple[str, dict, str]] = {}
+
+	# Loads the templates, rendering the sections for mistake_list straight away if given
+	@staticmethod
+	def load(path=REPLIES_PATH, mistake_list=None) -> "ReplyTemplates":
+		with open(path, "r") as file:
+			data = json.load(file)
+		templates = ReplyTemplates(data["locales"], data.get("subreddits"), data.get("default locale", "en"))
+		if mistake_list is not None:
+			templates.prepare(mistake_list)
+		return templates
+
+	# Renders the section of every mistake in every language
+	def prepare(self, mistake_list):
+		for locale in self.__locales:
+			for mistake in mistake_list:
+				self.__section(locale, mistake)
+
+	def locale_for(self, subreddit_name=None) -> str:
+		settings = self.__subreddits.get(subreddit_name.lower(), {}) if subreddit_name else {}
+		return settings.get("locale", self.default_locale)
+
+	def footer(self, subreddit_name=None) -> str:
+		settings = self.__subreddits.get(subreddit_name.lower(), {}) if subreddit_name else {}
+		return settings.get("footer", self.__locales[self.locale_for(subreddit_name)]["footer"])
+
+	# Builds the reply to a comment, with one section for each different mistake found in it
+	def render(self, text: str, matches: list[Match], subreddit_name=None) -> str:
+		settings = self.__by_subreddit.get(subreddit_name)
+		if settings is None:
+			locale = self.locale_for(subreddit_name)
+			settings = self.__by_subreddit[subreddit_name] = (locale, self.__sections[locale],
+			                                                   self.footer(subreddit_name))
+		locale, sections, footer = settings
+		# Most comments have one mistake
+		if len(matches) == 1:
+			match = matches[0]
+			first, _ = sections.get(match.mistake) or self.__section(locale, match.mistake)
+			return "\n> " + match.get_context(text) + first + footer
+		parts = []
+		corrected = set()
+		for match in matches:
+			# Only the first occurrence of each mistake is quoted
+			if match.mistake in corrected:
+				continue
+			first, later = sections.get(match.mistake) or self.__section(locale, match.mistake)
+			parts.append("> " + match.get_context(text) + (later if corrected else first))
+			corrected.add(match.mistake)
+		return "\n" + "\n".join(parts) + footer
+
+	def __section(self, locale: str, mistake: Mistake) -> tuple[str, str]:
+		section = self.__sections[locale].get(mistake)
+		if section is None:
+			strings = self.__locales[locale]
+			# Languages can translate explanations, by the text the mistake matches
+			explanation = strings.get("explanations", {}).get(mistake.get_pattern().strip(),
+			                                                  mistake.get_explanation_text())
+			explanation_line = strings["explanation"].format(explanation=explanation) if explanation else ""
+			section = tuple(f"  \n\n{strings[question]} \"{mistake.get_correction()}\"?  \n{explanation_line}  \n"
+			                for question in ["first question", "next question"])
+			self.__sections[locale][mistake] = section
+		return section
@@ -0,0 +1,20 @@
+from unittest import TestCase
+from blocklist import Blocklist
+
+
+class TestBlocklist(TestCase):
+	def test_add(self):
+		blocklist = Blocklist(["user1", "User2"])
+		self.assertTrue(blocklist.add("user3"))
+		self.assertFalse(blocklist.add("USER3"))
+		self.assertFalse(blocklist.add("user2"))
+		self.assertEqual(len(blocklist), 3)
+		self.assertEqual(list(blocklist), ["user1", "user2", "user3"])
+
+	def test_contains(self):
+		blocklist = Blocklist(["falnN", "user"])
+		self.assertIn("falnn", blocklist)
+		self.assertIn("FALNN", blocklist)
+		self.assertIn("user", blocklist)
+		self.assertNotIn("user2", blocklist)
+		self.assertNotIn("", blocklist)
@@ -0,0 +1,23 @@
+from unittest import TestCase
+from corpus import CorpusGenerator
+from mistakes import MistakeChecker, mistakes
+
+
+class TestCorpusGenerator(TestCase):
+	def test_corpus(self):
+		corpus = CorpusGenerator(seed=1).corpus(500)
+		# The same seed always gives the same corpus
+		self.assertEqual(corpus, CorpusGenerator(seed=1).corpus(500))
+		self.assertNotEqual(corpus, CorpusGenerator(seed=2).corpus(500))
+		self.assertTrue(any(comment.startswith(">") for comment in corpus))
+
+	def test_mistake_rate(self):
+		checker = MistakeChecker(mistakes)
+
+		def count_mistakes(mistake_rate):
+			texts = CorpusGenerator(mistake_rate=mistake_rate, quote_rate=0).corpus(200)
+			return sum(mistake is not None for mistake in checker.find_mistakes_batch([text.lower() for text in texts]))
+
+		# Random words can still make a mistake now and then
+		self.assertLess(count_mistakes(0), 20)
+		self.assertGreater(count_mistakes(1), 150)
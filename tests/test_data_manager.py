@@ -1,6 +1,10 @@
-from unittest import TestCase
-from data_manager import FileManager
+from unittest import TestCase, mock
+from data_manager import FileManager, SQLiteManager, CrawlState
+from fake_reddit import FakeReddit
+from reply import FeedBack
 import json
+import os
+import sqlite3
 
 
 class TestFileManager(TestCase):
@@ -17,14 +21,22 @@ class TestFileManager(TestCase):
 
 	def test_get_stopped_users(self):
 		with open(self.txt_path, "w") as f:
-			f.write("user1\nuser2\nuser3")
-		self.assertEqual(self.file_manager.get_stopped_users(),
-		                 {"user1": True, "user2": True, "user3": True})
+			f.write("user1\nUser2\nuser3\nuser1")
+		stopped_users = self.file_manager.get_stopped_users()
+		self.assertEqual(list(stopped_users), ["user1", "user2", "user3"])
+		# Usernames are case-insensitive
+		self.assertIn("USER1", stopped_users)
+		self.assertIn("user2", stopped_users)
+		self.assertNotIn("user4", stopped_users)
 
 	def test_update_runs(self):
 		with open(self.json_path, "w") as f:
 			f.write('{"total runs": 0}')
 		self.file_manager.update_runs()
+		# Stats are only written when flushed
+		with open(self.json_path, "r") as f:
+			self.assertEqual(json.load(f), {"total runs": 0})
+		self.file_manager.flush()
 		with open(self.json_path, "r") as f:
 			self.assertEqual(json.load(f), {"total runs": 1})
 
@@ -52,12 +64,38 @@ class TestFileManager(TestCase):
 		with open(self.json_path, "w") as f:
 			json.dump({"good": 960, "bad": 372, "mistake counter": 25791, "total runs": 3163}, f)
 		self.file_manager.update_mistake_counter(3)
+		self.file_manager.flush()
 		with open(self.json_path, "r") as f:
 			self.assertEqual(json.load(f), {"good": 960, "bad": 372, "mistake counter": 25794, "total runs": 3163})
 		self.file_manager.update_mistake_counter(2)
+		self.file_manager.flush()
 		with open(self.json_path, "r") as f:
 			self.assertEqual(json.load(f), {"good": 960, "bad": 372, "mistake counter": 25796, "total runs": 3163})
 
+	def test_update_good_bad(self):
+		with open(self.json_path, "w") as f:
+			json.dump({"good": 960, "bad": 372, "mistake counter": 25791, "total runs": 3163}, f)
+		self.assertEqual(self.file_manager.update_good_bad(FeedBack.GOOD_BOT), (961, 372))
+		self.assertEqual(self.file_manager.update_good_bad(FeedBack.BAD_BOT), (961, 373))
+		self.file_manager.update_runs()
+		self.assertEqual(self.file_manager.get_stats(),
+		                 {"good": 961, "bad": 373, "mistake counter": 25791, "total runs": 3164})
+		self.file_manager.flush()
+		with open(self.json_path, "r") as f:
+			self.assertEqual(json.load(f), {"good": 961, "bad": 373, "mistake counter": 25791, "total runs": 3164})
+		self.assertFalse([name for name in os.listdir("test_files") if name.endswith(".tmp")])
+
+	def test_flush_without_changes(self):
+		with open(self.json_path, "w") as f:
+			f.write('{"total runs": 0}')
+		self.file_manager.get_stats()
+		with open(self.json_path, "w") as f:
+			f.write('{"total runs": 5}')
+		# Nothing changed in memory, so the file isn't rewritten
+		self.file_manager.flush()
+		with open(self.json_path, "r") as f:
+			self.assertEqual(json.load(f), {"total runs": 5})
+
 	def test_get_subreddits(self):
 		# We need to make the return value a set because the order is randomised
 		with open(self.json_path, "w") as f:
@@ -86,3 +124,182 @@ class TestFileManager(TestCase):
 		self.file_manager.add_to_blocklist("user3")
 		with open(self.txt_path, "r") as f:
 			self.assertEqual(f.read(), "user1\nuser2\nuser3\n")
+		self.file_manager.add_to_blocklist("User3")
+		with open(self.txt_path, "r") as f:
+			self.assertEqual(f.read(), "user1\nuser2\nuser3\n")
+		self.assertIn("user3", self.file_manager.get_stopped_users())
+
+	def test_compact_blocklist(self):
+		with open(self.txt_path, "w") as f:
+			f.write("user2\nUser1\nuser2\n\nuser1\n")
+		self.file_manager.add_to_blocklist("user3")
+		self.file_manager.flush()
+		with open(self.txt_path, "r") as f:
+			self.assertEqual(f.read(), "user1\nuser2\nuser3\n")
+
+
+class TestCrawlState(TestCase):
+	def setUp(self):
+		self.path = "test_files/test.json"
+		reddit = FakeReddit.generate(num_subreddits=1, submissions_per_subreddit=1, comments_per_submission=10, seed=2)
+		self.submission = reddit.subreddits["subreddit0"][0]
+		self.comments = self.submission.comments.list()
+
+	def tearDown(self):
+		with open(self.path, "w") as f:
+			f.write("{}")
+
+	def test_new_comments(self):
+		state = CrawlState(self.path)
+		self.assertFalse(state.is_unchanged(self.submission))
+		self.assertEqual(state.new_comments(self.submission, self.comments[:6]), self.comments[:6])
+		state.finish_visit(self.submission)
+		state.save()
+
+		# A new run only checks comments newer than the ones seen before
+		state = CrawlState(self.path)
+		self.assertTrue(state.is_unchanged(self.submission))
+		self.submission.num_comments += 1
+		self.assertFalse(state.is_unchanged(self.submission))
+		self.assertEqual(state.new_comments(self.submission, self.comments), self.comments[6:])
+		self.assertEqual(state.skipped_comments, 6)
+
+	def test_finish_visit_incomplete(self):
+		state = CrawlState(self.path)
+		state.new_comments(self.submission, self.comments[:6])
+		state.finish_visit(self.submission, complete=False)
+		state.save()
+
+		# The next visit carries on with the comments that weren't loaded, even without new ones
+		state = CrawlState(self.path)
+		self.assertFalse(state.is_unchanged(self.submission))
+		self.assertEqual(state.seen(self.submission), {comment.id for comment in self.comments[:6]})
+		self.assertEqual(state.new_comments(self.submission, self.comments[::-1]), self.comments[6:][::-1])
+		state.finish_visit(self.submission)
+		self.assertEqual(state.seen(self.submission), set())
+		self.assertTrue(state.is_unchanged(self.submission))
+
+	def test_finish_visit_done(self):
+		state = CrawlState(self.path)
+		state.finish_visit(self.submission, complete=False, done=True)
+		self.submission.num_comments += 1
+		self.assertTrue(state.is_unchanged(self.submission))
+
+	def test_corrupt_file(self):
+		# Like a file cut short by a killed run
+		with open(self.path, "w") as f:
+			f.write('{"abc": {"last created": 0, "last')
+		state = CrawlState(self.path)
+		self.assertFalse(state.is_unchanged(self.submission))
+		state.finish_visit(self.submission)
+		state.save()
+		self.assertTrue(CrawlState(self.path).is_unchanged(self.submission))
+
+	def test_expire(self):
+		with open(self.path, "w") as f:
+			json.dump({self.submission.id: {"last created": 0, "last comment": "0", "comment count": 10,
+			                                "last visit": 0}}, f)
+		state = CrawlState(self.path)
+		state.expire()
+		self.assertFalse(state.is_unchanged(self.submission))
+
+	def test_skipped_posts_dont_expire(self):
+		day = 86400
+		with mock.patch("data_manager.time.time", return_value=0):
+			state = CrawlState(self.path)
+			state.finish_visit(self.submission, done=True)
+			state.save()
+		# Still listed, and skipped, six days later
+		with mock.patch("data_manager.time.time", return_value=6 * day):
+			state = CrawlState(self.path)
+			self.assertTrue(state.is_unchanged(self.submission))
+			state.save()
+		# Eight days after it was last checked, it is still skipped
+		with mock.patch("data_manager.time.time", return_value=8 * day):
+			state = CrawlState(self.path)
+			state.expire()
+			self.assertTrue(state.is_unchanged(self.submission))
+
+
+class TestSQLiteManager(TestCase):
+	def setUp(self):
+		self.txt_path = "test_files/test.txt"
+		self.json_path = "test_files/test.json"
+		self.manager = SQLiteManager(":memory:", self.txt_path, self.txt_path)
+
+	def tearDown(self):
+		self.manager.connection.close()
+		with open(self.txt_path, "w") as f:
+			f.write("")
+		with open(self.json_path, "w") as f:
+			f.write("{}")
+
+	def test_import_files(self):
+		with open(self.txt_path, "w") as f:
+			f.write("user1\nuser2")
+		with open(self.json_path, "w") as f:
+			json.dump({"good": 960, "bad": 372, "mistake counter": 25791, "total runs": 3163}, f)
+		file_manager = FileManager(self.txt_path, self.json_path, self.txt_path, self.json_path, self.txt_path)
+		# Stats and the subreddit database share the test JSON file, so import them one at a time
+		file_manager.get_sub_db = lambda: {"subreddit": False, "subreddit2": True}
+		self.manager.import_files(file_manager)
+		self.assertEqual(list(self.manager.get_stopped_users()), ["user1", "user2"])
+		self.assertEqual(self.manager.get_stats(), {"good": 960, "bad": 372, "mistake counter": 25791,
+		                                            "total runs": 3163})
+		self.assertEqual(self.manager.get_subreddits(), ["subreddit"])
+
+	def test_update_stats(self):
+		self.manager.update_runs()
+		self.manager.update_mistake_counter(3)
+		self.manager.update_mistake_counter(2)
+		self.assertEqual(self.manager.update_good_bad(FeedBack.GOOD_BOT), (1, 0))
+		self.assertEqual(self.manager.update_good_bad(FeedBack.BAD_BOT), (1, 1))
+		self.assertEqual(self.manager.get_stats(), {"good": 1, "bad": 1, "mistake counter": 5, "total runs": 1})
+
+	def test_update_sub_db(self):
+		self.manager.update_sub_db("subreddit")
+		self.manager.update_sub_db("subreddit")
+		self.assertEqual(self.manager.get_sub_db(), {"subreddit": True})
+		self.assertEqual(self.manager.get_subreddits(), [])
+
+	def test_update_sub_db_from_txt(self):
+		with open(self.txt_path, "w") as f:
+			f.write("subreddit\nsubreddit2")
+		self.manager.update_sub_db_from_txt()
+		self.assertEqual(self.manager.get_sub_db(), {"subreddit": True, "subreddit2": True})
+
+	def test_add_to_blocklist(self):
+		self.manager.add_to_blocklist("user1")
+		self.manager.add_to_blocklist("User1")
+		self.manager.add_to_blocklist("user2")
+		self.assertEqual(list(self.manager.get_stopped_users()), ["user1", "user2"])
+		self.assertEqual(self.manager.connection.execute("SELECT COUNT(*) FROM stopped_users").fetchone(), (2,))
+
+	def test_flush_exports_stats(self):
+		manager = SQLiteManager(":memory:", stats_path=self.json_path)
+		try:
+			manager.update_runs()
+			manager.update_mistake_counter(4)
+			manager.flush()
+			with open(self.json_path, "r") as f:
+				self.assertEqual(json.load(f), {"good": 0, "bad": 0, "mistake counter": 4, "total runs": 1})
+		finally:
+			manager.connection.close()
+
+	def test_flush(self):
+		path = "test_files/test.db"
+		manager = SQLiteManager(path)
+		manager.flush()
+		reader = sqlite3.connect(path)
+		try:
+			manager.add_to_blocklist("user1")
+			manager.update_runs()
+			# Nothing is visible to other connections until the run's transaction is committed
+			self.assertEqual(reader.execute("SELECT name FROM stopped_users").fetchall(), [])
+			manager.flush()
+			self.assertEqual(reader.execute("SELECT name FROM stopped_users").fetchall(), [("user1",)])
+			self.assertEqual(reader.execute("SELECT value FROM stats WHERE name = 'total runs'").fetchone(), (1,))
+		finally:
+			reader.close()
+			manager.close()
+			os.remove(path)
@@ -0,0 +1,135 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from data_manager import FileManager
+from events import EventLog, CORRECTION
+from prawcore.exceptions import Forbidden
+
+from fake_reddit import FakeReddit, FakeMessage, FakeRedditor, FakeSubreddit, FakeResponse, write_data_files
+from main import AmmoniumBot
+from mistakes import MistakeChecker, mistakes
+from outbox import ReplyOutbox, COMMENT
+from ratelimit import RateLimiter
+from reply import ReplyManager
+
+# 2026-10-18 11:00 UTC
+NOW = 1792321200
+
+
+class TestEventLog(TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.events_path = os.path.join(self.directory.name, "events")
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def test_rollups_follow_events(self):
+		log = EventLog(self.events_path)
+		log.record(CORRECTION, "AskReddit", ["should of", "loose"], timestamp=NOW)
+		log.record(CORRECTION, "askreddit", ["should of"], timestamp=NOW + 60)
+		log.record("good bot", "askreddit", timestamp=NOW + 3600)
+		log.record("stop", timestamp=NOW + 86400)
+		log.flush(now=NOW + 86400)
+
+		self.assertEqual(log.read("2026-10-18"), [[NOW, CORRECTION, "askreddit", ["should of", "loose"]],
+		                                          [NOW + 60, CORRECTION, "askreddit", ["should of"]],
+		                                          [NOW + 3600, "good bot", "askreddit", None]])
+		# The counts are read back from the rollups file
+		summary = EventLog(self.events_path).summary()
+		self.assertEqual(summary["total"][CORRECTION], {"count": 2, "subreddits": {"askreddit": 2},
+		                                                "mistakes": {"should of": 2, "loose": 1}})
+		self.assertEqual(summary["total"]["stop"], {"count": 1})
+		self.assertEqual(list(summary["daily"]), ["2026-10-18", "2026-10-19"])
+		self.assertEqual(summary["daily"]["2026-10-18"]["good bot"]["count"], 1)
+		self.assertEqual(list(summary["hourly"]), ["2026-10-18T11", "2026-10-18T12", "2026-10-19T11"])
+		self.assertEqual(summary["hourly"]["2026-10-18T11"][CORRECTION]["count"], 2)
+
+		# Later runs add to the same day's file
+		log = EventLog(self.events_path)
+		log.record("ban", "foo", timestamp=NOW + 7200)
+		log.flush(now=NOW + 86400)
+		self.assertEqual(len(log.read("2026-10-18")), 4)
+		self.assertEqual(log.summary()["total"][CORRECTION]["count"], 2)
+
+	def test_old_events_are_compacted(self):
+		log = EventLog(self.events_path, raw_days=2, hourly_days=1)
+		log.record(CORRECTION, "foo", ["should of"], timestamp=NOW - 5 * 86400)
+		log.record(CORRECTION, "foo", ["should of"], timestamp=NOW)
+		log.flush(now=NOW)
+		log.record(CORRECTION, "bar", ["loose"], timestamp=NOW - 4 * 86400)
+		log.flush(now=NOW)
+		self.assertEqual(sorted(os.listdir(self.events_path)), ["2026-10-18.jsonl", "2026-10.jsonl.gz", "rollups.json"])
+		# Old events can still be read, from the month's archive
+		self.assertEqual(log.read("2026-10-13"), [[NOW - 5 * 86400, CORRECTION, "foo", ["should of"]]])
+		self.assertEqual(log.read("2026-10-14"), [[NOW - 4 * 86400, CORRECTION, "bar", ["loose"]]])
+		self.assertEqual(log.read("2026-10-18"), [[NOW, CORRECTION, "foo", ["should of"]]])
+		self.assertEqual(log.read("2026-09-13"), [])
+		summary = log.summary()
+		self.assertEqual(list(summary["hourly"]), ["2026-10-18T11"])
+		# Old events are still counted by day
+		self.assertEqual(list(summary["daily"]), ["2026-10-13", "2026-10-14", "2026-10-18"])
+		self.assertEqual(summary["total"][CORRECTION]["count"], 3)
+
+	def test_corrupt_rollups_are_counted_again(self):
+		log = EventLog(self.events_path, raw_days=2)
+		log.record(CORRECTION, "foo", ["should of"], timestamp=NOW - 5 * 86400)
+		log.record(CORRECTION, "bar", ["loose"], timestamp=NOW)
+		log.record("stop", timestamp=NOW + 60)
+		log.flush(now=NOW)
+		expected = log.summary()
+		# Like a file cut short by an interrupted commit
+		with open(log.rollups_path, "w") as f:
+			f.write('{"total": {"correction"')
+
+		summary = EventLog(self.events_path, raw_days=2).summary()
+		self.assertEqual(summary["total"], expected["total"])
+		self.assertEqual(summary["daily"], expected["daily"])
+
+	def test_bot_logs_events(self):
+		limiter = RateLimiter(requests_per_minute=10 ** 9)
+		reddit = FakeReddit.generate(num_subreddits=2, submissions_per_subreddit=2, comments_per_submission=20,
+		                             mistake_rate=0.2, limiter=limiter, seed=7)
+		reddit.inbox.messages = [
+			FakeMessage(reddit, "1", "stop", FakeRedditor(reddit, "reader")),
+			FakeMessage(reddit, "2", "good bot", FakeRedditor(reddit, "fan"), "",
+			            FakeSubreddit(reddit, "subreddit0", [])),
+			FakeMessage(reddit, "3", "", None, "You've been banned from participating in r/dead",
+			            FakeSubreddit(reddit, "dead", [])),
+		]
+		paths = write_data_files(self.directory.name, {**dict.fromkeys(reddit.subreddits, False), "dead": False})
+		file_manager = FileManager(*paths, events=EventLog(self.events_path))
+		bot = AmmoniumBot(ReplyManager(), file_manager, MistakeChecker(mistakes), praw_instance=reddit,
+		                  limiter=limiter)
+		bot.run()
+
+		total = EventLog(self.events_path).summary()["total"]
+		self.assertEqual(total[CORRECTION]["count"], bot.mistakes_found)
+		self.assertEqual(sum(total[CORRECTION]["subreddits"].values()), bot.mistakes_found)
+		self.assertTrue(set(total[CORRECTION]["mistakes"]) <= {mistake.get_pattern().strip() for mistake in mistakes})
+		self.assertEqual(total["stop"], {"count": 1})
+		self.assertEqual(total["good bot"], {"count": 1, "subreddits": {"subreddit0": 1}})
+		self.assertEqual(total["ban"], {"count": 1, "subreddits": {"dead": 1}})
+
+	def test_corrections_are_logged_once_sent(self):
+		limiter = RateLimiter(requests_per_minute=10 ** 9)
+		reddit = FakeReddit.generate(num_subreddits=2, submissions_per_subreddit=2, comments_per_submission=20,
+		                             mistake_rate=0.2, limiter=limiter, seed=7)
+
+		def refuse(body):
+			raise Forbidden(FakeResponse(403))
+
+		# Replies to some of the comments are refused, so they are queued but never sent
+		for comment in reddit.comments[::3]:
+			comment.reply = refuse
+		paths = write_data_files(self.directory.name, dict.fromkeys(reddit.subreddits, False))
+		file_manager = FileManager(*paths, events=EventLog(self.events_path))
+		outbox = ReplyOutbox()
+		bot = AmmoniumBot(ReplyManager(outbox), file_manager, MistakeChecker(mistakes), praw_instance=reddit,
+		                  limiter=limiter)
+		bot.run()
+
+		self.assertGreater(outbox.dropped, 0)
+		self.assertEqual(EventLog(self.events_path).summary()["total"][CORRECTION]["count"], outbox.sent[COMMENT])
+		self.assertEqual(file_manager.get_stats()["mistake counter"], outbox.sent[COMMENT])
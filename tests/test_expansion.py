@@ -0,0 +1,72 @@
+import time
+from unittest import TestCase
+
+from data_manager import CrawlState
+from expansion import CommentExpander, ExpansionPolicy
+from fake_reddit import FakeReddit
+
+
+class TestCommentExpander(TestCase):
+	def setUp(self):
+		# Every post has 100 comments, 20 loaded with the post and 4 MoreComments of 20
+		self.reddit = FakeReddit.generate(num_subreddits=1, submissions_per_subreddit=3, comments_per_submission=100,
+		                                  more_comments_size=20, seed=1)
+		self.submissions = self.reddit.subreddits["subreddit0"]
+
+	def test_iter_batches(self):
+		expander = CommentExpander(ExpansionPolicy(submission_budget=None, run_budget=None))
+		batches = list(expander.iter_batches(self.submissions[0]))
+		self.assertEqual(len(batches), 1)
+		self.assertEqual(len(batches[0]), 100)
+		self.assertEqual(len({comment.id for comment in batches[0]}), 100)
+		self.assertEqual(expander.requests_per_submission, {self.submissions[0].id: 4})
+		self.assertEqual(self.reddit.requests, 4)
+
+	def test_submission_budget(self):
+		expander = CommentExpander(ExpansionPolicy(submission_budget=2, run_budget=None))
+		for submission in self.submissions:
+			self.assertEqual(len(next(expander.iter_batches(submission))), 60)
+		self.assertEqual(expander.run_requests, 6)
+		self.assertEqual(set(expander.requests_per_submission.values()), {2})
+
+	def test_run_budget(self):
+		expander = CommentExpander(ExpansionPolicy(submission_budget=None, run_budget=5))
+		sizes = [len(next(expander.iter_batches(submission))) for submission in self.submissions]
+		self.assertEqual(sizes, [100, 40, 20])
+		self.assertEqual(expander.report()["run requests"], 5)
+
+	def test_resumes_where_the_budget_ran_out(self):
+		state = CrawlState()
+		submission = self.submissions[0]
+		checked = []
+		for _ in range(2):
+			expander = CommentExpander(ExpansionPolicy(submission_budget=2, run_budget=None))
+			for batch in expander.iter_batches(submission, state.seen(submission)):
+				checked += state.new_comments(submission, batch)
+			state.finish_visit(submission, complete=not expander.is_incomplete(submission))
+		# The second visit loads the two MoreComments the first one couldn't, and checks no comment twice
+		self.assertEqual(len(checked), 100)
+		self.assertEqual(len({comment.id for comment in checked}), 100)
+		self.assertEqual(self.reddit.requests, 4)
+		self.assertTrue(state.is_unchanged(submission))
+
+	def test_max_depth(self):
+		expander = CommentExpander(ExpansionPolicy(max_depth=-1))
+		self.assertEqual(len(next(expander.iter_batches(self.submissions[0]))), 20)
+		self.assertEqual(self.reddit.requests, 0)
+
+	def test_max_age(self):
+		expander = CommentExpander(ExpansionPolicy(max_age_hours=1))
+		self.submissions[0].created_utc = time.time() - 2 * 3600
+		self.assertEqual(len(next(expander.iter_batches(self.submissions[0]))), 20)
+		self.submissions[1].created_utc = time.time()
+		self.assertEqual(len(next(expander.iter_batches(self.submissions[1]))), 100)
+
+	def test_streaming(self):
+		expander = CommentExpander(ExpansionPolicy(streaming=True))
+		batches = expander.iter_batches(self.submissions[0])
+		self.assertEqual(len(next(batches)), 20)
+		# Nothing else is loaded until the next batch is asked for
+		self.assertEqual(self.reddit.requests, 0)
+		self.assertEqual([len(batch) for batch in batches], [20, 20, 20, 20])
+		self.assertEqual(self.reddit.requests, 4)
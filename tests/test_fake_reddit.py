@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from prawcore.exceptions import TooManyRequests
+
+from expansion import CommentExpander, ExpansionPolicy
+from fake_reddit import FakeReddit, FakeComment, CONTINUE_DEPTH
+from ratelimit import RateLimiter
+
+
+class TestFakeReddit(TestCase):
+	def test_rate_limited_requests_are_retried(self):
+		limiter = RateLimiter(requests_per_minute=10 ** 9)
+		reddit = FakeReddit(limiter=limiter, rate_limit_rate=0.2, seed=1)
+		for _ in range(20):
+			reddit.request()
+		self.assertGreater(reddit.rate_limited, 0)
+		self.assertEqual(reddit.requests, 20 + reddit.rate_limited)
+		self.assertEqual(limiter.retries, reddit.rate_limited)
+
+		reddit = FakeReddit(limiter=limiter, rate_limit_rate=1, max_retries=2)
+		with self.assertRaises(TooManyRequests):
+			reddit.request()
+		self.assertEqual(reddit.requests, 3)
+
+	def test_deep_threads_are_fully_expanded(self):
+		reddit = FakeReddit.generate(num_subreddits=1, submissions_per_subreddit=2, comments_per_submission=30,
+		                             reply_depth=CONTINUE_DEPTH + 2, replies_per_comment=1, more_comments_size=5,
+		                             seed=2)
+		self.assertGreater(max(comment.depth for comment in reddit.comments), CONTINUE_DEPTH)
+		expander = CommentExpander(ExpansionPolicy(submission_budget=None, run_budget=None))
+		for submission in reddit.subreddits["subreddit0"]:
+			comments = [comment for batch in expander.iter_batches(submission) for comment in batch]
+			self.assertTrue(all(isinstance(comment, FakeComment) for comment in comments))
+			self.assertEqual(len(comments), submission.num_comments)
+			self.assertEqual(len({comment.id for comment in comments}), len(comments))
+
+	def test_generated_inbox(self):
+		reddit = FakeReddit.generate(num_subreddits=1, submissions_per_subreddit=1, num_messages=30, seed=3)
+		self.assertEqual(len(list(reddit.inbox.all(limit=100))), 30)
+		self.assertIn("stop", {message.body for message in reddit.inbox.messages})
@@ -0,0 +1,83 @@
+import json
+import tempfile
+from unittest import TestCase
+
+from data_manager import FileManager
+from fake_reddit import FakeReddit, FakeMessage, FakeRedditor, FakeSubreddit, write_data_files
+from inbox import InboxEngine, MessageKind, classify
+from reply import ReplyManager
+
+
+class TestInboxEngine(TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.paths = write_data_files(self.directory.name, {"foo": False, "bar": False})
+		self.reddit = FakeReddit()
+		self.file_manager = FileManager(*self.paths)
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def message(self, body, author="someone", subject="", subreddit=None, new=True):
+		message = FakeMessage(self.reddit, str(len(self.reddit.inbox.messages)), body,
+		                      FakeRedditor(self.reddit, author) if author else None, subject,
+		                      FakeSubreddit(self.reddit, subreddit, []) if subreddit else None)
+		message.new = new
+		self.reddit.inbox.messages.append(message)
+		return message
+
+	def test_classify(self):
+		self.assertIs(classify(self.message("STOP")), MessageKind.STOP)
+		self.assertIs(classify(self.message("Good bot")), MessageKind.GOOD_BOT)
+		self.assertIs(classify(self.message("bad bot!")), MessageKind.BAD_BOT)
+		self.assertIs(classify(self.message("good bot", author="other_bot")), MessageKind.BOT)
+		self.assertIs(classify(self.message("", subject="You've been banned", subreddit="Foo")), MessageKind.BAN)
+		self.assertIs(classify(self.message("stop", subject="Why was I banned?")), MessageKind.OTHER)
+		self.assertIs(classify(self.message("hello", author=None)), MessageKind.OTHER)
+
+	def test_process(self):
+		self.message("stop", author="user1")
+		self.message("stop please", author="User1")
+		self.message("good bot", author="user2")
+		self.message("hi", author="otherbot")
+		self.message("", subject="You've been banned from participating in r/foo", subreddit="Foo")
+		self.message("hello", author="user3")
+		self.message("good bot", author="user4", new=False)
+		engine = InboxEngine(self.reddit, ReplyManager(), self.file_manager)
+		engine.process()
+		self.file_manager.flush()
+
+		# One stop message, one feedback reply and one bot reply
+		self.assertEqual(len(self.reddit.replies), 3)
+		self.assertEqual(self.reddit.replies[0][0].name, "user1")
+		self.assertIn("user1", self.file_manager.get_stopped_users())
+		self.assertEqual(self.file_manager.get_stats()["good"], 1)
+		with open(self.paths[3], "r") as f:
+			self.assertEqual(json.load(f), {"foo": True, "bar": False})
+		self.assertEqual([message.new for message in self.reddit.inbox.messages],
+		                 [False, False, False, False, False, True, False])
+		self.assertEqual(engine.handled[MessageKind.STOP], 2)
+		# The listing, the stop message, two replies and one request to mark everything read
+		self.assertEqual(self.reddit.requests, 5)
+
+		# Nothing left to do in the next run apart from listing the inbox
+		InboxEngine(self.reddit, ReplyManager(), self.file_manager).process()
+		self.assertEqual(self.reddit.requests, 6)
+		self.assertEqual(len(self.reddit.replies), 3)
+
+	def test_private_message_about_a_ban(self):
+		# Read ban notices are handled again every run, so a private message mistaken for one would fail every run
+		self.message("why?", author="user1", subject="I got banned", new=False)
+		self.message("", subject="You've been banned from participating in r/bar", subreddit="Bar")
+		engine = InboxEngine(self.reddit, ReplyManager(), self.file_manager)
+		engine.process()
+		self.assertEqual(engine.handled[MessageKind.BAN], 1)
+		self.assertTrue(self.file_manager.get_sub_db()["bar"])
+
+	def test_mark_read_batches(self):
+		for i in range(30):
+			self.message("good bot", author=f"user{i}")
+		InboxEngine(self.reddit, ReplyManager(), self.file_manager).process()
+		# The listing, 30 replies and two requests to mark them read
+		self.assertEqual(self.reddit.requests, 33)
+		self.assertFalse(any(message.new for message in self.reddit.inbox.messages))
@@ -0,0 +1,39 @@
+from unittest import TestCase
+from matcher import PatternMatcher, PhraseMatcher
+
+
+class TestPatternMatcher(TestCase):
+	def setUp(self):
+		self.matcher = PatternMatcher([" should of ", " should ", "of course", "course", " to many ", " way to many "])
+
+	def test_find_all(self):
+		self.assertEqual(self.matcher.find_all("i should of done that"), {" should of ", " should "})
+		self.assertEqual(self.matcher.find_all("i should of course"), {" should of ", " should ", "of course", "course"})
+		self.assertEqual(self.matcher.find_all("way to many way"), {" to many "})
+		self.assertEqual(self.matcher.find_all(" way to many "), {" way to many ", " to many "})
+		self.assertEqual(self.matcher.find_all("nothing here"), set())
+		self.assertEqual(self.matcher.find_all(""), set())
+
+	def test_overlapping(self):
+		matcher = PatternMatcher(["abab", "bab", "ba"])
+		self.assertEqual(matcher.find_all("ababab"), {"abab", "bab", "ba"})
+		self.assertEqual(matcher.find_all("bab"), {"bab", "ba"})
+
+	def test_no_patterns(self):
+		self.assertEqual(PatternMatcher([]).find_all("anything"), set())
+		self.assertEqual(PatternMatcher([""]).find_all("anything"), set())
+
+	def test_special_characters(self):
+		matcher = PatternMatcher(["couldn't*", "a.b", "(x)"])
+		self.assertEqual(matcher.find_all("couldn't* axb (x)"), {"couldn't*", "(x)"})
+
+
+class TestPhraseMatcher(TestCase):
+	def test_find_positions(self):
+		matcher = PhraseMatcher([("should", "of"), ("of", "course"), ("course",), ("way", "to", "many"), ()])
+		self.assertEqual(matcher.find_positions(["i", "should", "of", "course"]),
+		                 [(("should", "of"), 1), (("of", "course"), 2), (("course",), 3)])
+		# Whole tokens only
+		self.assertEqual(matcher.find_positions(["shoulda", "of", "courses"]), [])
+		self.assertEqual(matcher.find_positions(["way", "to"]), [])
+		self.assertEqual(matcher.find_positions([]), [])
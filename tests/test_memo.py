@@ -0,0 +1,79 @@
+import os
+import random
+import tempfile
+from unittest import TestCase, mock
+
+from memo import DetectionMemo
+from mistakes import MistakeChecker, RuleSet, mistakes
+
+
+class TestDetectionMemo(TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.directory.name, "memo", "detection-memo.json")
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def test_same_results_as_backend(self):
+		phrases = [mistake.get_pattern().strip() for mistake in mistakes]
+		phrases += [exception for mistake in mistakes for exception in mistake.get_exceptions()]
+		phrases += ["i", "think", "way", "far", "the", "of", "more", "any", "be", "\n", "."]
+		rng = random.Random(23)
+		texts = [" ".join(rng.choice(phrases) for _ in range(rng.randint(0, 12))) for _ in range(500)] * 2
+		checker = MistakeChecker(mistakes)
+		memo = DetectionMemo()
+		memoized = MistakeChecker(mistakes, memo=memo)
+		self.assertEqual(memoized.find_matches_batch(texts), checker.find_matches_batch(texts))
+		self.assertEqual(memoized.find_matches_batch(texts, first_only=True),
+		                 checker.find_matches_batch(texts, first_only=True))
+		self.assertEqual(memoized.find_mistakes_batch(texts), checker.find_mistakes_batch(texts))
+		self.assertEqual([memoized.find_mistake(text) for text in texts[:50]],
+		                 [checker.find_mistake(text) for text in texts[:50]])
+		# Each different text is only checked once
+		self.assertEqual(memo.misses, len(set(texts)))
+		self.assertGreater(memo.hit_rate(), 0.6)
+
+	def test_least_recently_used_are_evicted(self):
+		memo = DetectionMemo(max_size=2)
+		checker = MistakeChecker(mistakes, memo=memo)
+		checker.find_matches_batch(["i should of", "nothing", "i loose it"])
+		self.assertEqual((len(memo), memo.evictions), (2, 1))
+		self.assertIsNone(memo.get(DetectionMemo.key("i should of")))
+		self.assertEqual(memo.get(DetectionMemo.key("nothing")), ())
+		checker.find_matches("i should of")
+		# "nothing" was used more recently than "i loose it"
+		self.assertIsNotNone(memo.get(DetectionMemo.key("nothing")))
+		self.assertIsNone(memo.get(DetectionMemo.key("i loose it")))
+
+	def test_saved_between_runs(self):
+		checker = MistakeChecker(mistakes, memo=DetectionMemo(self.path))
+		expected = checker.find_matches_batch(["i should of known", "fine"])
+		checker.close()
+
+		memo = DetectionMemo(self.path)
+		checker = MistakeChecker(mistakes, memo=memo)
+		self.assertEqual(checker.find_matches_batch(["i should of known", "fine"]), expected)
+		self.assertEqual((memo.hits, memo.misses), (2, 0))
+
+		# Results found with other rules are dropped
+		rules = RuleSet(list(mistakes), "other version", mistakes.matcher)
+		memo = DetectionMemo(self.path)
+		MistakeChecker(rules, memo=memo)
+		self.assertEqual(len(memo), 0)
+
+	def test_dropped_when_the_code_changes(self):
+		checker = MistakeChecker(mistakes, memo=DetectionMemo(self.path))
+		checker.find_matches("i should of known")
+		checker.close()
+
+		memo = DetectionMemo(self.path)
+		with mock.patch("mistakes._compiler_version", return_value="0" * 64):
+			MistakeChecker(mistakes, memo=memo)
+		self.assertEqual(len(memo), 0)
+
+	def test_not_saved_without_version(self):
+		checker = MistakeChecker(list(mistakes), memo=DetectionMemo(self.path))
+		checker.find_matches("i should of")
+		checker.close()
+		self.assertFalse(os.path.exists(self.path))
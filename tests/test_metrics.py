@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from metrics import Metrics, timed
+from ratelimit import RateLimiter
+
+
+class Counter:
+	def __init__(self):
+		self.metrics = Metrics()
+		self.value = 0
+
+	@timed("increment")
+	def increment(self, amount=1):
+		self.value += amount
+		return self.value
+
+
+class TestMetrics(TestCase):
+	def setUp(self):
+		self.limiter = RateLimiter(requests_per_minute=10 ** 9)
+		self.metrics = Metrics(self.limiter)
+
+	def test_timer_and_count(self):
+		with self.metrics.timer("work"):
+			pass
+		with self.metrics.timer("work"):
+			pass
+		self.metrics.count("comments scanned", 5)
+		self.metrics.count("comments scanned", 2)
+		report = self.metrics.report()
+		self.assertEqual(report["timings"]["work"]["calls"], 2)
+		self.assertEqual(report["counters"]["comments scanned"], 7)
+
+	def test_subreddit_timer(self):
+		with self.metrics.subreddit_timer("subreddit"):
+			self.limiter.acquire()
+			self.limiter.acquire()
+		self.metrics.count_for_subreddit("subreddit", "mistakes found")
+		report = self.metrics.report()
+		self.assertEqual(report["subreddits"]["subreddit"]["api requests"], 2)
+		self.assertEqual(report["subreddits"]["subreddit"]["mistakes found"], 1)
+		self.assertEqual(report["counters"]["api requests"], 2)
+
+	def test_instrument(self):
+		counter = Counter()
+		instrumented = self.metrics.instrument(counter, "counter")
+		self.assertEqual(instrumented.increment(2), 2)
+		self.assertEqual(instrumented.value, 2)
+		self.assertEqual(self.metrics.report()["timings"]["counter.increment"]["calls"], 1)
+		# The decorator uses the object's own metrics
+		self.assertEqual(counter.metrics.report()["timings"]["increment"]["calls"], 1)
+
+	def test_write_report(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, "report.json")
+			self.metrics.write_report(path, expansion={"run requests": 3})
+			with open(path, "r") as f:
+				report = json.load(f)
+		self.assertEqual(report["expansion"], {"run requests": 3})
+		self.assertIn("started", report)
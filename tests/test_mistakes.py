@@ -1,5 +1,9 @@
+import random
+import time
 from unittest import TestCase
-from mistakes import MistakeChecker, mistakes, OfMistake, Mistake
+
+from corpus import CorpusGenerator
+from mistakes import MistakeChecker, mistakes, Mistake, ProcessPoolBackend
 
 
 class TestMistakeChecker(TestCase):
@@ -23,10 +27,138 @@ class TestMistakeChecker(TestCase):
 		                 "Explanation: If you could care less, you do care, which is the opposite of what you meant to say.")
 		self.assertIsNone(self.mistake_checker.find_mistake(""))
 
+	def test_find_mistake_matches_serial_check(self):
+		# The compiled matcher has to return the same first match as checking each mistake in order
+		def find_serial(text):
+			return next((mistake for mistake in mistakes if mistake.check(text)), None)
+
+		phrases = [mistake.get_pattern().strip() for mistake in mistakes]
+		phrases += [exception for mistake in mistakes for exception in mistake.get_exceptions()]
+		phrases += ["i", "think", "way", "far", "the", "of", "more", "any", "be", "\n", "."]
+		rng = random.Random(450119)
+		for _ in range(3000):
+			text = " ".join(rng.choice(phrases) for _ in range(rng.randint(0, 12)))
+			self.assertIs(self.mistake_checker.find_mistake(text), find_serial(text), text)
+
+	def test_find_mistakes_batch(self):
+		texts = ["I should of done that", "I should of course do that", "I loose my mind", "", "nothing wrong",
+		         "way to many cooks"] * 5
+		expected = [self.mistake_checker.find_mistake(text) for text in texts]
+		self.assertEqual(self.mistake_checker.find_mistakes_batch(texts), expected)
+		self.assertEqual(self.mistake_checker.find_mistakes_batch([]), [])
+		for backend in ["serial", "compiled", ProcessPoolBackend(mistakes, workers=2, chunk_size=4)]:
+			checker = MistakeChecker(mistakes, backend=backend)
+			try:
+				self.assertEqual(checker.find_mistakes_batch(texts), expected)
+				self.assertEqual(checker.find_mistakes_batch(iter(texts)), expected)
+			finally:
+				checker.close()
+
+	def test_find_matches(self):
+		text = "i should of known you would of too, should of told me"
+		matches = self.mistake_checker.find_matches(text)
+		self.assertEqual([(match.mistake.get_correction(), match.start, match.end) for match in matches],
+		                 [("should have", 1, 12), ("would have", 21, 31), ("should have", 35, 46)])
+		self.assertEqual(matches[1].get_context(text), " you would of too,")
+		# Only the occurrences of the first mistake in the list
+		self.assertEqual([match.start for match in self.mistake_checker.find_matches(text, first_only=True)], [1, 35])
+		self.assertEqual(self.mistake_checker.find_matches("i should of course"), [])
+		self.assertEqual(self.mistake_checker.find_matches(""), [])
+
+	def test_find_matches_backends_agree(self):
+		phrases = [mistake.get_pattern().strip() for mistake in mistakes]
+		phrases += [exception for mistake in mistakes for exception in mistake.get_exceptions()]
+		phrases += ["i", "think", "way", "far", "the", "of", "more", "any", "be", "\n", "."]
+		rng = random.Random(16)
+		texts = [" ".join(rng.choice(phrases) for _ in range(rng.randint(0, 12))) for _ in range(2000)]
+		serial = MistakeChecker(mistakes, backend="serial")
+		expected = serial.find_matches_batch(texts)
+		process = MistakeChecker(mistakes, backend=ProcessPoolBackend(mistakes, workers=2, chunk_size=500))
+		try:
+			self.assertEqual(self.mistake_checker.find_matches_batch(texts), expected)
+			self.assertEqual(process.find_matches_batch(texts), expected)
+		finally:
+			process.close()
+		for text, matches in zip(texts, self.mistake_checker.find_matches_batch(texts, first_only=True)):
+			first = self.mistake_checker.find_mistake(text)
+			self.assertEqual({match.mistake for match in matches}, {first} if first else set())
+			if first:
+				# The offsets give the same context as searching the text again
+				self.assertEqual(matches[0].get_context(text), first.find_context(text))
+
+
+class TestTokenBackend(TestCase):
+	def setUp(self):
+		self.tokens = MistakeChecker(mistakes, backend="tokens")
+		self.compiled = MistakeChecker(mistakes)
+
+	def test_agrees_on_padded_texts(self):
+		# Where the words are padded with spaces, the padded strings and the tokens find the same matches, except for
+		# exceptions the padded strings also find inside longer words ("any more" in "many more")
+		phrases = [mistake.get_pattern().strip() for mistake in mistakes]
+		phrases += [exception for mistake in mistakes for exception in mistake.get_exceptions()]
+		phrases += ["i", "think", "way", "far", "the", "of", "more", "any", "be", "\n", "."]
+		rng = random.Random(16)
+		texts = [f" {' '.join(rng.choice(phrases) for _ in range(rng.randint(0, 12)))} " for _ in range(2000)]
+		serial = MistakeChecker(mistakes, backend="serial")
+		for text, expected, matches in zip(texts, serial.find_matches_batch(texts), self.tokens.find_matches_batch(texts)):
+			if "many more" in text or "many less" in text:
+				continue
+			# Without the spaces around the pattern
+			self.assertEqual([(match.mistake, match.start, match.end) for match in matches],
+			                 [(match.mistake, match.start + 1, match.end - 1) for match in expected], text)
+			self.assertIs(self.tokens.find_mistake(text), serial.find_mistake(text), text)
+
+	def test_word_boundaries(self):
+		cases = [
+			("should of.", "should have"),
+			("should of done it", "should have"),
+			("i wasn't told, should of known", "should have"),
+			("i shouldn\u2019t of known", "shouldn't have"),
+			("i should  of known", "should have"),
+			("i should\tof known", "should have"),
+			("(way to many)", "too many"),
+			("you should of coursework to do", "should have"),
+			("so many more then before", "more than"),
+			("i should of course", None),
+			("i should\nof known", None),
+			("shoulda of", None),
+			("prepayed", None),
+			("", None),
+		]
+		def correction_found(checker, text):
+			mistake = checker.find_mistake(text)
+			return mistake.get_correction() if mistake else None
+
+		for text, correction in cases:
+			self.assertEqual(correction_found(self.tokens, text), correction, text)
+		# The padded strings miss mistakes next to punctuation and at the ends of the text
+		missed = [text for text, correction in cases if correction_found(self.compiled, text) != correction]
+		self.assertEqual(len(missed), 8, missed)
+
+	def test_context(self):
+		text = "i should of, known\nthat you would of"
+		matches = self.tokens.find_matches(text)
+		self.assertEqual([(match.start, match.end) for match in matches], [(2, 11), (28, 36)])
+		self.assertEqual([match.get_context(text) for match in matches], ["i should of, known", "you would of"])
+		self.assertEqual(self.tokens.find_matches("should of")[0].get_context("should of"), "should of")
+
+	def test_cost_per_comment(self):
+		# Tokenizing costs more than searching padded strings, but has to stay in the same range per comment
+		bodies = CorpusGenerator(seed=0).corpus(3000)
+		costs = {}
+		for name, checker in [("compiled", self.compiled), ("tokens", self.tokens)]:
+			start = time.process_time()
+			texts = [text for text in map(checker.prepare, bodies) if text is not None]
+			found = checker.find_matches_batch(texts)
+			costs[name] = (time.process_time() - start) / len(bodies)
+			self.assertTrue(found)
+		self.assertLess(costs["tokens"], costs["compiled"] * 10)
+
 
 class TestMistake(TestCase):
 	def setUp(self):
-		self.mistake1 = OfMistake("shouldn't")
+		self.mistake1 = next(mistake for mistake in mistakes if mistake.get_correction() == "shouldn't have")
 		self.mistake2 = Mistake("more then", "more than", exceptions=["any more", "some more"],
             explanation="If you didn't mean 'more than' you might have forgotten a comma.")
 
@@ -0,0 +1,167 @@
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import TestCase
+
+from prawcore.exceptions import BadRequest, Forbidden, TooManyRequests
+
+from fake_reddit import FakeReddit, FakeComment, FakeMessage, FakeRedditor
+from outbox import ReplyOutbox, COMMENT, DIRECT_MESSAGE, MESSAGE
+from reply import ReplyManager
+
+
+# Comment whose requests fail with the given errors, in order, before they go through
+class FlakyComment(FakeComment):
+	def __init__(self, reddit, comment_id, reply_errors=(), save_errors=()):
+		super().__init__(reddit, comment_id, "", FakeRedditor(reddit, "someone"), 0)
+		self.reply_errors = list(reply_errors)
+		self.save_errors = list(save_errors)
+
+	def reply(self, body: str):
+		if self.reply_errors:
+			raise self.reply_errors.pop(0)
+		super().reply(body)
+
+	def save(self):
+		if self.save_errors:
+			raise self.save_errors.pop(0)
+		super().save()
+
+
+def response(status_code: int):
+	return SimpleNamespace(status_code=status_code, headers={}, text="")
+
+
+class TestReplyOutbox(TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.directory.name, "outbox.json")
+		self.reddit = FakeReddit()
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def outbox(self, **kwargs) -> ReplyOutbox:
+		return ReplyOutbox(self.path, base_delay=0.001, max_delay=0.01, seed=0, **kwargs)
+
+	def test_sends_and_saves_once(self):
+		outbox = self.outbox()
+		comment = FlakyComment(self.reddit, "a")
+		self.assertTrue(outbox.enqueue(COMMENT, comment.id, "reply", target=comment))
+		# Not saved until the reply is sent
+		self.assertFalse(comment.saved)
+		self.assertFalse(outbox.enqueue(COMMENT, comment.id, "reply", target=comment))
+		outbox.start(self.reddit)
+		outbox.stop()
+
+		self.assertTrue(comment.saved)
+		self.assertEqual(self.reddit.replies, [(comment, "reply")])
+		self.assertEqual(outbox.report(), {"sent": {COMMENT: 1}, "retries": 0, "dropped": 0, "pending": 0})
+		# Replies already sent aren't queued again
+		self.assertFalse(outbox.enqueue(COMMENT, comment.id, "reply", target=comment))
+
+	def test_retries_without_replying_twice(self):
+		outbox = self.outbox()
+		comment = FlakyComment(self.reddit, "a", reply_errors=[TooManyRequests(response(429))],
+		                       save_errors=[TooManyRequests(response(429))])
+		outbox.enqueue(COMMENT, comment.id, "reply", target=comment)
+		outbox.start(self.reddit)
+		while outbox.pending():
+			time.sleep(0.001)
+		outbox.stop()
+
+		self.assertTrue(comment.saved)
+		self.assertEqual(len(self.reddit.replies), 1)
+		self.assertEqual(outbox.retries, 2)
+
+	def test_drops_failed_replies(self):
+		outbox = self.outbox(max_attempts=2)
+		forbidden = FlakyComment(self.reddit, "a", reply_errors=[Forbidden(response(403))])
+		limited = FlakyComment(self.reddit, "b", reply_errors=[TooManyRequests(response(429))] * 2)
+		outbox.enqueue(COMMENT, forbidden.id, "reply", target=forbidden)
+		outbox.enqueue(COMMENT, limited.id, "reply", target=limited)
+		outbox.start(self.reddit)
+		while outbox.pending():
+			time.sleep(0.001)
+		outbox.stop()
+
+		self.assertEqual(outbox.dropped, 2)
+		self.assertEqual(outbox.retries, 1)
+		self.assertFalse(forbidden.saved or limited.saved)
+		self.assertEqual(self.reddit.replies, [])
+
+	def test_unexpected_errors_dont_stop_the_drainer(self):
+		outbox = self.outbox(max_attempts=2)
+		broken = FlakyComment(self.reddit, "a", reply_errors=[BadRequest(response(400))] * 2)
+		good = FlakyComment(self.reddit, "b")
+		# The broken reply is tried first
+		outbox.enqueue(COMMENT, broken.id, "reply", target=broken)
+		outbox.enqueue(COMMENT, good.id, "reply", target=good)
+		outbox.start(self.reddit)
+		deadline = time.time() + 5
+		while outbox.pending() and time.time() < deadline:
+			time.sleep(0.001)
+		outbox.stop()
+
+		self.assertEqual(outbox.dropped, 1)
+		self.assertEqual(self.reddit.replies, [(good, "reply")])
+		self.assertEqual(outbox.pending(), 0)
+
+	def test_pending_replies_are_sent_next_run(self):
+		comment = FakeComment(self.reddit, "a", "", FakeRedditor(self.reddit, "someone"), 0)
+		self.reddit.comments.append(comment)
+		outbox = self.outbox()
+		outbox.enqueue(COMMENT, comment.id, "reply", target=comment)
+		outbox.enqueue(DIRECT_MESSAGE, "someone", "stopped", subject="Bot Stopped")
+		outbox.save()
+
+		outbox = self.outbox()
+		self.assertEqual(outbox.pending(), 2)
+		self.assertFalse(outbox.enqueue(COMMENT, comment.id, "reply"))
+		outbox.start(self.reddit)
+		outbox.stop()
+		outbox.save()
+
+		self.assertTrue(comment.saved)
+		self.assertEqual(sorted(body for _, body in self.reddit.replies), ["reply", "stopped"])
+		self.assertFalse(self.outbox().enqueue(COMMENT, comment.id, "reply"))
+
+	def test_corrupt_file(self):
+		# Like a file cut short by an interrupted commit
+		with open(self.path, "w") as f:
+			f.write('{"jobs": {"comment:a": {"kind"')
+		outbox = self.outbox()
+		self.assertEqual(outbox.pending(), 0)
+		self.assertTrue(os.path.exists(f"{self.path}.corrupt"))
+		outbox.enqueue(DIRECT_MESSAGE, "someone", "stopped", subject="Bot Stopped")
+		outbox.save()
+		self.assertEqual(self.outbox().pending(), 1)
+
+	def test_inbox_replies_are_sent_to_their_kind_next_run(self):
+		# Feedback on a correction is a comment reply, other inbox items are private messages
+		comment = FakeComment(self.reddit, "c", "good bot", FakeRedditor(self.reddit, "fan"), 0)
+		self.reddit.comments.append(comment)
+		message = FakeMessage(self.reddit, "m", "bad bot", FakeRedditor(self.reddit, "critic"))
+		self.reddit.inbox.messages.append(message)
+		reply_manager = ReplyManager(self.outbox())
+		reply_manager.reply(comment, "thanks")
+		reply_manager.reply(message, "sorry")
+		reply_manager.outbox.save()
+
+		outbox = self.outbox()
+		outbox.start(self.reddit)
+		outbox.stop()
+		self.assertEqual(sorted(self.reddit.replies, key=lambda reply: reply[1]),
+		                 [(message, "sorry"), (comment, "thanks")])
+
+	def test_reply_manager_queues(self):
+		outbox = self.outbox()
+		reply_manager = ReplyManager(outbox)
+		comment = FlakyComment(self.reddit, "a")
+		self.assertTrue(reply_manager.send_correction(comment, "", []))
+		self.assertFalse(reply_manager.send_correction(comment, "", []))
+		reply_manager.stop_message(FakeRedditor(self.reddit, "someone"))
+		# Nothing is sent until the outbox is drained
+		self.assertEqual(self.reddit.requests, 0)
+		self.assertEqual(outbox.pending(), 2)
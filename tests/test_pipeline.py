@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from data_manager import FileManager, CrawlState
+from fake_reddit import FakeReddit, write_data_files
+from main import AmmoniumBot
+from mistakes import MistakeChecker, mistakes
+from pipeline import CrawlPipeline
+from ratelimit import RateLimiter
+from outbox import ReplyOutbox
+from reply import ReplyManager
+
+
+class TestCrawlPipeline(TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.paths = write_data_files(self.directory.name)
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def make_bot(self, crawl_mode, reddit=None, crawl_state=None, outbox=None):
+		limiter = RateLimiter(requests_per_minute=10 ** 9)
+		reddit = reddit or FakeReddit.generate(num_subreddits=3, submissions_per_subreddit=5,
+		                                       comments_per_submission=30, mistake_rate=0.2, limiter=limiter, seed=3)
+		bot = AmmoniumBot(ReplyManager(outbox), FileManager(*self.paths), MistakeChecker(mistakes), praw_instance=reddit,
+		                  crawl_mode=crawl_mode, limiter=limiter, crawl_state=crawl_state)
+		bot.monitored_subreddits = list(reddit.subreddits)
+		return bot, reddit, limiter
+
+	def test_run_matches_serial_loop(self):
+		serial_bot, serial_reddit, _ = self.make_bot("serial")
+		serial_bot.main_loop()
+		bot, reddit, limiter = self.make_bot("pipeline")
+		mistakes_found = CrawlPipeline(bot, queue_size=2).run(bot.monitored_subreddits)
+
+		self.assertEqual(mistakes_found, serial_bot.mistakes_found)
+		self.assertGreater(mistakes_found, 0)
+		self.assertEqual(sorted((target.id, body) for target, body in reddit.replies),
+		                 sorted((target.id, body) for target, body in serial_reddit.replies))
+		self.assertEqual(reddit.requests, serial_reddit.requests)
+		self.assertEqual(limiter.requests, reddit.requests)
+
+	def test_outbox_sends_the_same_replies(self):
+		serial_bot, serial_reddit, _ = self.make_bot("serial")
+		serial_bot.main_loop()
+		bot, reddit, _ = self.make_bot("pipeline", outbox=ReplyOutbox())
+		bot.run()
+
+		self.assertEqual(sorted((target.id, body) for target, body in reddit.replies),
+		                 sorted((target.id, body) for target, body in serial_reddit.replies))
+		self.assertTrue(all(target.saved for target, _ in reddit.replies))
+		self.assertEqual(bot.reply_manager.outbox.pending(), 0)
+		self.assertEqual(bot.file_manager.get_stats()["mistake counter"], len(reddit.replies))
+
+	def test_second_run_skips_checked_posts(self):
+		state_path = os.path.join(self.directory.name, "state.json")
+		bot, reddit, _ = self.make_bot("pipeline", crawl_state=CrawlState(state_path))
+		CrawlPipeline(bot).run(bot.monitored_subreddits)
+		bot.crawl_state.save()
+		first_run_requests = reddit.requests
+
+		bot, _, _ = self.make_bot("pipeline", reddit=reddit, crawl_state=CrawlState(state_path))
+		self.assertEqual(CrawlPipeline(bot).run(bot.monitored_subreddits), 0)
+		# Only the listings are fetched again
+		self.assertEqual(reddit.requests - first_run_requests, 3)
+
+	def test_run_report(self):
+		report_path = os.path.join(self.directory.name, "report.json")
+		bot, reddit, _ = self.make_bot("pipeline")
+		bot.report_path = report_path
+		bot.run()
+		with open(report_path, "r") as f:
+			report = json.load(f)
+		self.assertEqual(report["counters"]["api requests"], reddit.requests)
+		self.assertEqual(report["counters"]["mistakes found"], bot.mistakes_found)
+		self.assertEqual(set(report["subreddits"]), set(reddit.subreddits))
+		# Every request except the inbox listing is spent on a subreddit
+		self.assertEqual(sum(record["api requests"] for record in report["subreddits"].values()),
+		                 reddit.requests - 1)
+		self.assertEqual(report["inbox"]["stop"], 0)
+		self.assertIn("file_manager.update_runs", report["timings"])
+
+	def test_rate_limit_stops_the_run_cleanly(self):
+		state_path = os.path.join(self.directory.name, "state.json")
+		bot, reddit, _ = self.make_bot("pipeline", crawl_state=CrawlState(state_path))
+		# Refused requests aren't retried, so the first refusal stops the crawl
+		reddit.rate_limit_rate = 0.05
+		reddit.max_retries = 0
+		bot.run()
+
+		self.assertGreater(reddit.rate_limited, 0)
+		# The state and stats of the partial run are still saved, like after a rate limited serial run
+		self.assertTrue(os.path.exists(state_path))
+		self.assertEqual(FileManager(*self.paths).get_stats()["total runs"], 1)
+
+	def test_run_raises_errors(self):
+		bot, reddit, _ = self.make_bot("pipeline")
+		bot.mistake_checker = None
+		with self.assertRaises(AttributeError):
+			CrawlPipeline(bot).run(bot.monitored_subreddits)
+
+	def test_run_without_subreddits(self):
+		bot, reddit, _ = self.make_bot("pipeline")
+		self.assertEqual(CrawlPipeline(bot).run([]), 0)
+		self.assertEqual(reddit.requests, 0)
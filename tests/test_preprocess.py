@@ -0,0 +1,73 @@
+from unittest import TestCase
+
+from corpus import CorpusGenerator
+from mistakes import Mistake, MistakeChecker, mistakes
+from preprocess import CommentPreprocessor, strip_quotes, tokenize, tokenize_with_offsets
+
+
+# The way quotes were stripped before the preprocessor
+def split_and_join(body: str) -> str:
+	return "\n".join(line for line in body.split("\n") if not line.startswith(">")).lower()
+
+
+class TestPreprocess(TestCase):
+	def setUp(self):
+		self.bodies = CorpusGenerator(seed=7, mistake_rate=0.1, quote_rate=0.3).corpus(2000)
+		# Mixed case versions as well, since the prefilter runs before anything else
+		self.bodies += [body.upper() for body in self.bodies[:300]] + [body.title() for body in self.bodies[300:600]]
+
+	def test_strip_quotes(self):
+		for body in self.bodies + ["> quote", "text\n> quote\nmore", ">", "", "a >b\n>c"]:
+			self.assertEqual(strip_quotes(body), split_and_join(body))
+
+	def test_prepare(self):
+		preprocessor = CommentPreprocessor(mistakes)
+		checker = MistakeChecker(mistakes)
+		skipped = 0
+		for body in self.bodies:
+			text = preprocessor.prepare(body)
+			if text is None:
+				skipped += 1
+				# Only comments without a mistake are skipped
+				self.assertIsNone(checker.find_mistake(split_and_join(body)), body)
+			else:
+				self.assertEqual(text, split_and_join(body))
+		self.assertGreater(skipped, len(self.bodies) / 2)
+
+	def test_prefilter_ignores_case(self):
+		preprocessor = CommentPreprocessor(mistakes)
+		self.assertEqual(preprocessor.prepare("You SHOULD OF known"), "you should of known")
+		self.assertIsNone(preprocessor.prepare("Nothing wrong here"))
+		self.assertIsNone(CommentPreprocessor([]).prepare("should of"))
+
+	def test_prefilter_with_punctuation_in_rules(self):
+		# Punctuation in a rule can be attached to the tokens next to it, as the tokenizer splits it off either way
+		rules = [Mistake("could of.", "could have.", before="", after=""), Mistake("(ok", "ok", before="", after="")]
+		preprocessor = CommentPreprocessor(rules, word_boundaries=True)
+		checker = MistakeChecker(rules, backend="tokens")
+		for text in ["i could of.", "i could of .", "could of.then", "(ok)", "( ok", "x(ok"]:
+			self.assertIsNotNone(preprocessor.prepare(text), text)
+			self.assertIsNotNone(checker.find_mistake(text), text)
+		for text in ["i could of", "could ofs.", "couldn't of.", "(okay", "ok"]:
+			self.assertIsNone(preprocessor.prepare(text), text)
+
+	def test_tokenize(self):
+		self.assertEqual(tokenize("i shouldn\u2019t of, (way to  many)\nok."),
+		                 ["i", "shouldn't", "of", ",", "(", "way", "to", "many", ")", "\n", "ok", "."])
+		self.assertEqual(tokenize("'quoted' it's"), ["'", "quoted", "'", "it's"])
+		self.assertEqual(tokenize(""), [])
+		words, starts, ends = tokenize_with_offsets("a  b,c")
+		self.assertEqual(words, ["a", "b", ",", "c"])
+		self.assertEqual(list(zip(starts, ends)), [(0, 1), (3, 4), (4, 5), (5, 6)])
+
+	def test_prefilter_with_word_boundaries(self):
+		preprocessor = CommentPreprocessor(mistakes, word_boundaries=True)
+		checker = MistakeChecker(mistakes, backend="tokens")
+		for text in ["should of.", "Should of done it", "i shouldn\u2019t  of", "(way to many)"]:
+			self.assertIsNotNone(preprocessor.prepare(text), text)
+		for text in ["shoulda of", "should\nof", "prepayed", "nothing wrong"]:
+			self.assertIsNone(preprocessor.prepare(text), text)
+		# Only comments without a mistake are skipped
+		for body in self.bodies:
+			if preprocessor.prepare(body) is None:
+				self.assertIsNone(checker.find_mistake(split_and_join(body)), body)
@@ -0,0 +1,84 @@
+import threading
+import time
+from unittest import TestCase, mock
+
+import requests
+from prawcore import Requestor
+
+from ratelimit import RateLimiter, LimitedRequestor, READ, WRITE
+
+
+class TestRateLimiter(TestCase):
+	def test_acquire(self):
+		limiter = RateLimiter(requests_per_minute=1200)
+		start = time.monotonic()
+		for _ in range(4):
+			limiter.acquire()
+		# The first request is immediate and the rest are spaced 0.05s apart
+		self.assertGreaterEqual(time.monotonic() - start, 0.15)
+		self.assertEqual(limiter.requests, 4)
+
+	def test_burst(self):
+		limiter = RateLimiter(requests_per_minute=600, burst=3)
+		start = time.monotonic()
+		for _ in range(3):
+			limiter.acquire()
+		self.assertLess(time.monotonic() - start, 0.05)
+
+	def test_update(self):
+		limiter = RateLimiter(requests_per_minute=6000)
+		limiter.acquire()
+		# 2 requests left for 1 second means one every 0.5s
+		limiter.update({"x-ratelimit-remaining": "2", "x-ratelimit-reset": "1", "x-ratelimit-used": "598"})
+		start = time.monotonic()
+		limiter.acquire()
+		self.assertGreaterEqual(time.monotonic() - start, 0.4)
+		# Headers without rate limit fields change nothing
+		limiter.update({"content-length": "10"})
+
+	def test_writes_go_first(self):
+		limiter = RateLimiter(requests_per_minute=600)
+		limiter.acquire()
+		order = []
+
+		def make_request(priority):
+			limiter.acquire(priority)
+			order.append(priority)
+
+		threads = [threading.Thread(target=make_request, args=(READ,)) for _ in range(3)]
+		for thread in threads:
+			thread.start()
+		time.sleep(0.02)
+		writer = threading.Thread(target=make_request, args=(WRITE,))
+		writer.start()
+		for thread in threads + [writer]:
+			thread.join()
+		# The write started waiting after the reads but only the first read can get in before it
+		self.assertLessEqual(order.index(WRITE), 1)
+
+
+class TestLimitedRequestor(TestCase):
+	def test_retry(self):
+		limiter = RateLimiter(requests_per_minute=60000)
+		requestor = LimitedRequestor(user_agent="AmmoniumBot tests", limiter=limiter)
+		responses = [make_response(429, {"retry-after": "0.01"}), make_response(200, {})]
+		with mock.patch.object(Requestor, "request", side_effect=responses) as request:
+			response = requestor.request("get", "https://oauth.reddit.com/r/test/hot")
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(request.call_count, 2)
+		self.assertEqual(limiter.requests, 2)
+		self.assertEqual(limiter.retries, 1)
+
+	def test_give_up(self):
+		requestor = LimitedRequestor(user_agent="AmmoniumBot tests", limiter=RateLimiter(requests_per_minute=60000), max_retries=2)
+		with mock.patch.object(Requestor, "request", return_value=make_response(429, {"retry-after": "0"})) as request:
+			response = requestor.request(method="post", url="https://oauth.reddit.com/api/comment")
+		self.assertEqual(response.status_code, 429)
+		self.assertEqual(request.call_count, 3)
+
+
+def make_response(status_code, headers):
+	response = requests.Response()
+	response.status_code = status_code
+	response.headers.update(headers)
+	return response
@@ -0,0 +1,95 @@
+import tempfile
+from unittest import TestCase
+
+from expansion import CommentExpander, ExpansionPolicy
+from data_manager import FileManager
+from fake_reddit import FakeReddit, FakeComment, CONTINUE_DEPTH, write_data_files
+from main import AmmoniumBot
+from mistakes import MistakeChecker, mistakes
+from ratelimit import RateLimiter
+from records import CommentRecord, RawCommentLoader
+from reply import ReplyManager
+
+
+def expand(submission) -> list:
+	expander = CommentExpander(ExpansionPolicy(submission_budget=None, run_budget=None))
+	return [comment for batch in expander.iter_batches(submission) for comment in batch]
+
+
+class TestRawCommentLoader(TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def test_same_comments_as_praw_objects(self):
+		reddit = FakeReddit.generate(num_subreddits=1, submissions_per_subreddit=2, comments_per_submission=30,
+		                             reply_depth=CONTINUE_DEPTH + 2, more_comments_size=5, seed=2)
+		loader = RawCommentLoader(reddit)
+		for submission in reddit.subreddits["subreddit0"]:
+			records = expand(loader.load(submission))
+			self.assertEqual([record.id for record in records], [comment.id for comment in expand(submission)])
+			self.assertTrue(all(isinstance(record, CommentRecord) for record in records))
+
+	def test_load_requests_like_praw(self):
+		reddit = FakeReddit.generate(num_subreddits=1, submissions_per_subreddit=1, comments_per_submission=3, seed=1)
+		submission = reddit.subreddits["subreddit0"][0]
+		requests = []
+		raw_json = reddit.raw_json
+		reddit.raw_json = lambda path, params: requests.append(params) or raw_json(path, params)
+		RawCommentLoader(reddit).load(submission)
+		self.assertEqual(requests, [{"limit": 2048, "sort": "confidence", "raw_json": 1}])
+
+	def test_parse(self):
+		loader = RawCommentLoader(FakeReddit())
+		things = [
+			{"kind": "t1", "data": {"id": "a", "body": "first", "author": "someone", "created_utc": 1.0,
+			                        "replies": {"kind": "Listing", "data": {"children": [
+				                        {"kind": "t1", "data": {"id": "b", "body": "second", "author": "someone",
+				                                                "saved": True, "created_utc": 2.0, "depth": 1,
+				                                                "replies": ""}}]}}}},
+			{"kind": "t1", "data": {"id": "c", "body": "[deleted]", "author": "[deleted]", "created_utc": 3.0,
+			                        "replies": ""}},
+			{"kind": "more", "data": {"id": "_", "count": 0, "children": [], "depth": 0, "parent_id": "t1_c"}},
+		]
+		first, deleted, more = loader.parse(things, "s")
+		reply = first.replies[0]
+		self.assertEqual((reply.id, reply.body, reply.saved, reply.depth), ("b", "second", True, 1))
+		# Authors are shared between the comments of the same user
+		self.assertIs(first.author, reply.author)
+		self.assertIsNone(deleted.author)
+		self.assertEqual((more.children, more.parent_id), ([], "t1_c"))
+
+	def test_reply_and_save_use_praw_comment(self):
+		reddit = FakeReddit.generate(num_subreddits=1, submissions_per_subreddit=1, comments_per_submission=3, seed=1)
+		record = RawCommentLoader(reddit).load(reddit.subreddits["subreddit0"][0]).comments[0]
+		requests = reddit.requests
+		record.reply("reply")
+		record.save()
+		target, body = reddit.replies[-1]
+		self.assertIsInstance(target, FakeComment)
+		self.assertEqual((target.id, body), (record.id, "reply"))
+		self.assertTrue(record.saved and target.saved)
+		# Only the reply and the save are requested, not the comment itself
+		self.assertEqual(reddit.requests, requests + 2)
+
+	def run_bot(self, raw_comments: bool) -> FakeReddit:
+		limiter = RateLimiter(requests_per_minute=10 ** 9)
+		reddit = FakeReddit.generate(num_subreddits=2, submissions_per_subreddit=3, comments_per_submission=20,
+		                             mistake_rate=0.2, reply_depth=3, limiter=limiter, seed=4)
+		paths = write_data_files(self.directory.name, dict.fromkeys(reddit.subreddits, False))
+		bot = AmmoniumBot(ReplyManager(), FileManager(*paths), MistakeChecker(mistakes), praw_instance=reddit,
+		                  limiter=limiter, raw_comments=raw_comments)
+		bot.monitored_subreddits = list(reddit.subreddits)
+		bot.main_loop()
+		return reddit
+
+	def test_bot_sends_same_corrections(self):
+		expected = self.run_bot(raw_comments=False)
+		reddit = self.run_bot(raw_comments=True)
+		self.assertTrue(reddit.replies)
+		self.assertEqual([(target.id, body) for target, body in reddit.replies],
+		                 [(target.id, body) for target, body in expected.replies])
+		self.assertEqual({comment.id for comment in reddit.comments if comment.saved},
+		                 {comment.id for comment in expected.comments if comment.saved})
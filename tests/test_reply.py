@@ -0,0 +1,26 @@
+from unittest import TestCase
+
+from mistakes import MistakeChecker, mistakes
+from reply import ReplyManager
+
+
+class TestReplyManager(TestCase):
+	def setUp(self):
+		self.mistake_checker = MistakeChecker(mistakes)
+		self.reply_manager = ReplyManager()
+
+	def test_correction_body(self):
+		text = "i should of known"
+		body = self.reply_manager.correction_body(text, self.mistake_checker.find_matches(text))
+		self.assertTrue(body.startswith('\n> i should of known  \n\nHi, did you mean to say "should have"?  \n'
+		                                "Explanation: You probably meant"))
+		self.assertEqual(body.count("did you mean to say"), 1)
+
+	def test_several_mistakes(self):
+		text = "i should of known there were way to many cooks, should of counted"
+		body = self.reply_manager.correction_body(text, self.mistake_checker.find_matches(text))
+		# One section per different mistake, in the order they appear
+		self.assertIn('Hi, did you mean to say "should have"?', body)
+		self.assertIn('>  were way to many cooks,  \n\nAlso, did you mean to say "too many"?', body)
+		self.assertEqual(body.count("did you mean to say"), 2)
+		self.assertEqual(body.count("Sorry if I made a mistake!"), 1)
@@ -0,0 +1,181 @@
+import json
+import os
+import random
+import tempfile
+from unittest import TestCase, mock
+
+from mistakes import MistakeChecker, Mistake, RuleSet, mistakes, RULES_PATH
+
+
+# The two families of mistakes that had their own subclass before the rules moved to data/mistakes.json
+def of_mistake(mistake, exceptions=None) -> Mistake:
+	return Mistake(mistake, mistake + " have", exceptions=exceptions or ["of course"], after=" of ",
+	               explanation="You probably meant to say could've/should've/would've which sounds like 'of' but is "
+	                           "actually short for 'have'.")
+
+
+def loose_mistake(after) -> Mistake:
+	return Mistake("loose", "lose", after=after,
+	               explanation="Loose is an adjective meaning the opposite of tight, while lose is a verb.")
+
+
+# The mistakes as they were written in mistakes.py before they moved to data/mistakes.json
+LEGACY_MISTAKES = [
+	of_mistake("shouldn't"),
+	of_mistake("couldn't"),
+	of_mistake("wouldn't"),
+	of_mistake("should"),
+	of_mistake("would"),
+	of_mistake("could"),
+	of_mistake("must"),
+	of_mistake("might", exceptions=["the might of", "might of course", "might of the"]),
+	Mistake("to many", "too many", before=" way "),
+	Mistake("to many", "too many", before=" far "),
+	Mistake("to few", "too few", exceptions=["available to few"]),
+	Mistake("to much", "too much", before=" way "),
+	Mistake("more then", "more than", exceptions=["any more", "some more"],
+	        explanation="If you didn't mean 'more than' you might have forgotten a comma."),
+	Mistake("less then", "less than", exceptions=["any less"],
+	        explanation="If you didn't mean 'less than' you might have forgotten a comma."),
+	Mistake("payed", "paid",
+	        explanation="Payed means to seal something with wax, "
+	                    "while paid means to give money."),
+	loose_mistake(" my "),
+	loose_mistake(" your "),
+	loose_mistake(" his "),
+	loose_mistake(" her "),
+	loose_mistake(" their "),
+	loose_mistake(" our "),
+	loose_mistake(" its "),
+	Mistake("could care less", "couldn't care less",
+	        exceptions=["couldn't care less*", "couldn't*", "did you mean"],
+	        explanation="If you could care less, you do care, "
+	                    "which is the opposite of what you meant to say."),
+	Mistake("loosing", "losing",
+	        explanation="Loose is an adjective meaning the opposite of tight, "
+	                    "while lose is a verb."),
+	Mistake("looses", "loses",
+	        explanation="Loose is an adjective meaning the opposite of tight, "
+	                    "while lose is a verb."),
+	Mistake("irregardless", "regardless",
+	        explanation="irregardless is not a word."),
+	Mistake("weary of", "wary of", before=" be ",
+	        explanation="Weary means tired, while wary means cautious."),
+	Mistake("can't breath", "can't breathe",
+	        explanation="Breath is a noun, while breathe is a verb."),
+	Mistake("intensive purposes", "intents and purposes",
+	        explanation="This is likely due to mishearing of 'intents and purposes'."),
+	Mistake("sneak peak", "sneak peek",
+	        explanation="peak is the top of a mountain, while peek is a quick look."),
+	Mistake("sneak peaks", "sneak peek",
+	        explanation="peak is the top of a mountain, while peek is a quick look."),
+	Mistake("unphased", "unfazed",
+	        explanation="Phased means to change, while fazed means to be surprised."),
+	Mistake("epitamy", "epitome",
+	        explanation="Epitamy is not a word."),
+	Mistake("no affect", "no effect",
+	        explanation="affect is a verb meaning to influence, "
+	                    "while effect is a noun meaning a result."),
+	Mistake("little affect", "little effect",
+	        explanation="affect is a verb meaning to influence, "
+	                    "while effect is a noun meaning a result."),
+	Mistake("peaked my interest", "piqued my interest",
+	        explanation="Some people might have peaked in high school, "
+	                    "but pique is a verb meaning to arouse interest."),
+	Mistake("peaked my curiosity", "piqued my curiosity",
+	        explanation="Some people might have peaked in high school, "
+	                    "but pique is a verb meaning to arouse interest."),
+	Mistake("apart of", "a part of",
+	        explanation="\"apart\" is an adverb meaning separately, "
+	                    "while \"a part\" is a noun meaning a portion."),
+	Mistake("queue", "cue", after=" the ",
+	        explanation="queue is a line, while cue is a signal."),
+	Mistake("humanely possible", "humanly possible",
+	        explanation="humane means kind, while human means relating to humans."),
+	Mistake("intimated by", "intimidated by",
+	        explanation="intimate means \"closely acquianted\", while intimidate means to frighten."),
+	Mistake("per say", "per se",
+	        explanation="per se is latin for \"by itself\"."),
+	Mistake("chocking", "choking",
+	        explanation="chocking means to block a wheel, while choking means to suffocate."),
+]
+
+
+
+class TestRuleSet(TestCase):
+	def test_migrated_rules(self):
+		self.assertEqual(len(mistakes), len(LEGACY_MISTAKES))
+		for mistake, legacy in zip(mistakes, LEGACY_MISTAKES):
+			self.assertEqual(mistake.get_pattern(), legacy.get_pattern())
+			self.assertEqual(mistake.get_correction(), legacy.get_correction())
+			self.assertEqual(mistake.get_exceptions(), legacy.get_exceptions())
+			self.assertEqual(mistake.get_explanation(), legacy.get_explanation())
+
+	def test_identical_detections(self):
+		checker = MistakeChecker(mistakes)
+		legacy_checker = MistakeChecker(LEGACY_MISTAKES)
+		phrases = [mistake.get_pattern().strip() for mistake in LEGACY_MISTAKES]
+		phrases += [exception for mistake in LEGACY_MISTAKES for exception in mistake.get_exceptions()]
+		phrases += ["i", "think", "way", "far", "the", "of", "more", "any", "be", "\n", "."]
+		rng = random.Random(15)
+		for _ in range(3000):
+			text = " ".join(rng.choice(phrases) for _ in range(rng.randint(0, 12)))
+			detected = checker.find_mistake(text)
+			legacy = legacy_checker.find_mistake(text)
+			self.assertEqual(mistakes.index(detected) if detected else None,
+			                 LEGACY_MISTAKES.index(legacy) if legacy else None, text)
+
+	def test_expand(self):
+		expanded = RuleSet.expand({"mistake": "(a|b) c", "after": " (d|e) ", "correction": "{0} {1}",
+		                           "exceptions": ["x (y|z)"]})
+		self.assertEqual([(rule["before"], rule["mistake"], rule["after"], rule["correction"]) for rule in expanded],
+		                 [(" ", "a c", " d ", "a d"), (" ", "a c", " e ", "a e"),
+		                  (" ", "b c", " d ", "b d"), (" ", "b c", " e ", "b e")])
+		self.assertEqual(expanded[0]["exceptions"], ["x y", "x z"])
+		self.assertIsNone(RuleSet.expand({"mistake": "a", "correction": "b"})[0]["exceptions"])
+
+	def test_cache(self):
+		with tempfile.TemporaryDirectory() as directory:
+			rules_path = os.path.join(directory, "rules.json")
+			cache_dir = os.path.join(directory, "cache")
+			with open(rules_path, "w") as f:
+				json.dump({"rules": [{"mistake": "(payed|payd)", "correction": "paid"}]}, f)
+			rule_set = RuleSet.load(rules_path, cache_dir)
+			self.assertEqual(len(os.listdir(cache_dir)), 1)
+			self.assertEqual(MistakeChecker(rule_set).find_mistake("i payd it ").get_correction(), "paid")
+
+			# Loaded from the cache the second time, with the same result
+			cached = RuleSet.load(rules_path, cache_dir)
+			self.assertEqual(cached.version, rule_set.version)
+			self.assertEqual(cached.matcher.trie_regex, rule_set.matcher.trie_regex)
+			self.assertEqual([mistake.get_pattern() for mistake in cached], [" payed ", " payd "])
+
+			# A changed rule file gets a new version and cache entry
+			with open(rules_path, "w") as f:
+				json.dump({"rules": [{"mistake": "payed", "correction": "paid"}]}, f)
+			changed = RuleSet.load(rules_path, cache_dir)
+			self.assertNotEqual(changed.version, rule_set.version)
+			self.assertEqual(len(changed), 1)
+			self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+			# A cache entry with the wrong shape is rebuilt instead of failing
+			for name in os.listdir(cache_dir):
+				with open(os.path.join(cache_dir, name), "w") as f:
+					json.dump({"patterns": []}, f)
+			self.assertEqual(len(RuleSet.load(rules_path, cache_dir)), 1)
+			self.assertEqual(len(RuleSet.load(rules_path, cache_dir)), 1)
+			self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+	def test_cache_depends_on_compiler_code(self):
+		with tempfile.TemporaryDirectory() as directory:
+			rules_path = os.path.join(directory, "rules.json")
+			cache_dir = os.path.join(directory, "cache")
+			with open(rules_path, "w") as f:
+				json.dump({"rules": [{"mistake": "payed", "correction": "paid"}]}, f)
+			RuleSet.load(rules_path, cache_dir)
+			with mock.patch("mistakes._compiler_version", return_value="0" * 64):
+				RuleSet.load(rules_path, cache_dir)
+			self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+	def test_rule_file(self):
+		self.assertEqual(RuleSet.load(RULES_PATH).version, mistakes.version)
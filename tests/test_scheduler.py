@@ -0,0 +1,75 @@
+import os
+import tempfile
+from unittest import TestCase
+from scheduler import SubredditScheduler
+from benchmarks.simulate_scheduler import SchedulerSimulator
+
+
+class TestSubredditScheduler(TestCase):
+	def setUp(self):
+		self.scheduler = SubredditScheduler(request_budget=100, exploration=0.2)
+		self.scheduler.record({
+			"good": {"api requests": 30, "mistakes found": 9},
+			"okay": {"api requests": 30, "mistakes found": 3},
+			"dead": {"api requests": 30, "mistakes found": 0},
+		}, visit_time=100)
+
+	def test_plan_without_budget(self):
+		self.assertEqual(SubredditScheduler().plan(["a", "b"]), ["a", "b"])
+		self.scheduler.request_budget = None
+		self.assertEqual(self.scheduler.plan(["dead", "okay", "good"]), ["good", "okay", "dead"])
+
+	def test_plan_with_budget(self):
+		# The never visited subreddit is explored first, then the best ones until the budget is spent
+		self.assertEqual(self.scheduler.plan(["dead", "okay", "good", "new"]), ["good", "okay", "new"])
+		# Without exploration only the best yields fit
+		self.scheduler.exploration = 0
+		self.scheduler.request_budget = 60
+		self.assertEqual(self.scheduler.plan(["dead", "okay", "good", "new"]), ["good", "okay"])
+
+	def test_plan_with_time_budget(self):
+		scheduler = SubredditScheduler(request_budget=100, exploration=0)
+		scheduler.record({
+			"slow": {"api requests": 20, "mistakes found": 6, "seconds": 55},
+			"fast": {"api requests": 20, "mistakes found": 4, "seconds": 5},
+			"faster": {"api requests": 20, "mistakes found": 3, "seconds": 5},
+		}, visit_time=100)
+		self.assertEqual(scheduler.plan(["fast", "faster", "slow"]), ["slow", "fast", "faster"])
+		# With little time, the slow subreddit is worth less than the fast ones and no longer fits
+		scheduler.time_budget = 60
+		self.assertEqual(scheduler.plan(["fast", "faster", "slow"]), ["fast", "faster"])
+		scheduler.request_budget = None
+		self.assertEqual(scheduler.plan(["fast", "faster", "slow"]), ["fast", "faster"])
+
+	def test_record(self):
+		self.scheduler.record({"good": {"api requests": 30, "mistakes found": 0}}, visit_time=200)
+		record = self.scheduler.stats["good"]
+		self.assertEqual(record["visits"], 2)
+		self.assertEqual(record["last visit"], 200)
+		# Recent visits count for more, but one bad visit doesn't erase the history
+		self.assertAlmostEqual(record["mistakes found"], 6.3)
+		self.assertGreater(self.scheduler.expected_yield("good"), self.scheduler.expected_yield("okay"))
+
+	def test_save_and_load(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, "subreddit_stats.json")
+			self.scheduler.stats_path = path
+			self.scheduler.save()
+			self.assertEqual(SubredditScheduler(path).stats, self.scheduler.stats)
+			# A file cut short by a killed run is read as no history
+			with open(path, "w") as file:
+				file.write('{"good": {"api requests"')
+			self.assertEqual(SubredditScheduler(path).stats, {})
+
+
+class TestSchedulerSimulator(TestCase):
+	def test_simulate(self):
+		shuffled = SchedulerSimulator(seed=1).simulate(None, 500, runs=20)
+		scheduled = SchedulerSimulator(seed=1).simulate(SubredditScheduler(request_budget=500), 500, runs=20)
+		self.assertGreater(scheduled, shuffled)
+		# With a time budget as well, planning for it keeps the slow subreddits from taking up the time
+		requests_only = SchedulerSimulator(seed=1).simulate(SubredditScheduler(request_budget=500), 500, runs=20,
+		                                                    time_budget=200)
+		scheduled = SchedulerSimulator(seed=1).simulate(SubredditScheduler(request_budget=500, time_budget=200), 500,
+		                                                runs=20, time_budget=200)
+		self.assertGreater(scheduled, requests_only)
@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from data_manager import FileManager, CrawlState
+from fake_reddit import FakeReddit, FakeMessage, FakeRedditor, FakeSubreddit, write_data_files
+from main import AmmoniumBot
+from mistakes import MistakeChecker, mistakes
+from outbox import ReplyOutbox, DIRECT_MESSAGE
+from ratelimit import RateLimiter
+from reply import ReplyManager
+from scheduler import SubredditScheduler
+from shard import ShardCoordinator, ShardFileManager, load_credentials
+
+
+# Every account sees the same subreddits, and an inbox with a stop request and a ban notice of its own
+def fake_reddit(limiter, credentials) -> FakeReddit:
+	reddit = FakeReddit.generate(num_subreddits=4, submissions_per_subreddit=3, comments_per_submission=20,
+	                             mistake_rate=0.2, limiter=limiter, seed=5)
+	username = credentials["username"]
+	reddit.inbox.messages = [
+		FakeMessage(reddit, "1", "stop", FakeRedditor(reddit, f"reader_of_{username}")),
+		FakeMessage(reddit, "2", "", None, "You've been banned from participating in r/dead",
+		            FakeSubreddit(reddit, "dead", [])),
+	]
+	return reddit
+
+
+class TestSharding(TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.paths = write_data_files(self.directory.name,
+		                              {**{f"subreddit{index}": False for index in range(4)}, "dead": False})
+		self.credentials = [{"username": "first"}, {"username": "second"}]
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def test_load_credentials(self):
+		accounts = load_credentials({"CLIENT_ID": "a", "PASSWORD": "b", "CLIENT_ID_1": "c", "USERNAME_1": "other",
+		                             "PASSWORD_1": "d", "CLIENT_ID_3": "skipped"})
+		self.assertEqual([account["username"] for account in accounts], ["ammonium_bot", "other"])
+		self.assertEqual(accounts[1]["client_id"], "c")
+
+	def test_partition_balances_cost(self):
+		scheduler = SubredditScheduler()
+		scheduler.stats = {name: {"api requests": cost} for name, cost in [("a", 10), ("b", 9), ("c", 6), ("d", 5)]}
+		coordinator = ShardCoordinator(FileManager(*self.paths), self.credentials, scheduler=scheduler)
+		shards = coordinator.partition(["d", "c", "b", "a"])
+		# Each shard keeps the planned order
+		self.assertEqual(shards, [["d", "a"], ["c", "b"]])
+		self.assertEqual(coordinator.partition([]), [[], []])
+
+	def test_shard_file_manager_records_changes(self):
+		file_manager = ShardFileManager(["someone"], {"foo": False}, {"good": 1, "bad": 0}, ["foo"])
+		file_manager.add_to_blocklist("Someone")
+		file_manager.add_to_blocklist("other")
+		file_manager.update_sub_db("foo")
+		file_manager.update_mistake_counter(3)
+		file_manager.log_event("correction", "foo", ["should of"], timestamp=100)
+		self.assertEqual(file_manager.get_sub_db(), {"foo": True})
+		self.assertEqual(file_manager.changes(), {"stopped users": ["other"], "banned": ["foo"],
+		                                          "stats": {"mistake counter": 3},
+		                                          "events": [[100, "correction", "foo", ["should of"]]]})
+
+	def test_run_merges_shards(self):
+		limiter = RateLimiter(requests_per_minute=10 ** 9)
+		reddit = fake_reddit(limiter, {"username": "first"})
+		reddit.inbox.messages = []
+		serial_bot = AmmoniumBot(ReplyManager(), FileManager(*self.paths), MistakeChecker(mistakes),
+		                         praw_instance=reddit, limiter=limiter)
+		serial_bot.monitored_subreddits = list(reddit.subreddits)
+		serial_bot.main_loop()
+
+		crawl_state = CrawlState(os.path.join(self.directory.name, "state.json"))
+		file_manager = FileManager(*self.paths)
+		report_path = os.path.join(self.directory.name, "report.json")
+		coordinator = ShardCoordinator(file_manager, self.credentials, crawl_state=crawl_state,
+		                               options={"requests per minute": 10 ** 9}, reddit_factory=fake_reddit,
+		                               report_path=report_path)
+		mistakes_found = coordinator.run()
+
+		self.assertEqual(mistakes_found, serial_bot.mistakes_found)
+		self.assertEqual(sorted(result["index"] for result in coordinator.results), [0, 1])
+		# Each shard crawled its own subreddits, including the one banned during the run
+		crawled = [set(result["report"]["subreddits"]) for result in coordinator.results]
+		self.assertFalse(crawled[0] & crawled[1])
+		self.assertEqual(crawled[0] | crawled[1], set(reddit.subreddits) | {"dead"})
+		# The reports of the shards are added up into one like an unsharded run's
+		with open(report_path, "r") as f:
+			report = json.load(f)
+		self.assertEqual(report["counters"]["mistakes found"], mistakes_found)
+		self.assertEqual(report["counters"]["api requests"],
+		                 sum(counters["api requests"] for counters in report["shards"]))
+		self.assertEqual(set(report["subreddits"]), crawled[0] | crawled[1])
+		self.assertEqual(report["inbox"]["stop"], 2)
+		self.assertEqual(report["seconds"], max(result["report"]["seconds"] for result in coordinator.results))
+
+		file_manager = FileManager(*self.paths)
+		self.assertEqual(set(file_manager.get_stopped_users()), {"reader_of_first", "reader_of_second"})
+		self.assertTrue(file_manager.get_sub_db()["dead"])
+		with open(self.paths[2], "r") as f:
+			self.assertEqual(f.read(), "dead\n")
+		self.assertEqual(file_manager.get_stats()["mistake counter"], mistakes_found)
+		self.assertEqual(file_manager.get_stats()["total runs"], 1)
+		# The crawl state of every shard is saved, so a second run skips every post
+		self.assertEqual(len(CrawlState(crawl_state.path).entries()), 12)
+
+	def test_outboxes(self):
+		main_path = os.path.join(self.directory.name, "outbox.json")
+		# Left by an unsharded run of the main account
+		outbox = ReplyOutbox(main_path)
+		outbox.enqueue(DIRECT_MESSAGE, "someone", "stopped", subject="Bot Stopped")
+		outbox.save()
+		options = {"requests per minute": 10 ** 9, "main outbox path": main_path,
+		           "outbox path": os.path.join(self.directory.name, "outbox-{username}.json")}
+		coordinator = ShardCoordinator(FileManager(*self.paths), self.credentials, options=options,
+		                               reddit_factory=fake_reddit)
+		coordinator.run()
+
+		# The first account sends the replies left in the main outbox, and the others keep their own
+		self.assertEqual(ReplyOutbox(main_path).pending(), 0)
+		self.assertFalse(ReplyOutbox(main_path).enqueue(DIRECT_MESSAGE, "someone", "stopped"))
+		self.assertIn("outbox-second.json", os.listdir(self.directory.name))
+		self.assertNotIn("outbox-first.json", os.listdir(self.directory.name))
@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+from data_manager import FileManager, StreamCheckpoint
+from fake_reddit import FakeReddit, FakeComment, FakeRedditor, write_data_files
+from main import AmmoniumBot
+from mistakes import MistakeChecker, mistakes
+from outbox import ReplyOutbox
+from ratelimit import RateLimiter
+from reply import ReplyManager
+from stream import StreamDaemon
+
+
+class TestStreamDaemon(TestCase):
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.paths = write_data_files(self.directory.name)
+		self.checkpoint_path = os.path.join(self.directory.name, "checkpoint.json")
+		limiter = RateLimiter(requests_per_minute=10 ** 9)
+		self.reddit = FakeReddit.generate(num_subreddits=3, submissions_per_subreddit=2, comments_per_submission=15,
+		                                  mistake_rate=0.2, limiter=limiter, seed=5)
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def make_daemon(self, outbox=None, **kwargs):
+		bot = AmmoniumBot(ReplyManager(outbox), FileManager(*self.paths), MistakeChecker(mistakes),
+		                  praw_instance=self.reddit, limiter=self.reddit.limiter)
+		bot.monitored_subreddits = list(self.reddit.subreddits)
+		return StreamDaemon(bot, StreamCheckpoint(self.checkpoint_path), batch_size=8, **kwargs)
+
+	def test_run(self):
+		mistakes_found = self.make_daemon().run(stop_when_idle=True)
+		checker = MistakeChecker(mistakes)
+		expected = [comment.id for comment in self.reddit.comments
+		            if checker.find_mistake(AmmoniumBot.strip_quotes(comment.body)) is not None]
+		self.assertGreater(mistakes_found, 0)
+		self.assertEqual(mistakes_found, len(expected))
+		self.assertEqual(sorted(target.id for target, _ in self.reddit.replies), sorted(expected))
+		with open(self.checkpoint_path, "r") as f:
+			self.assertEqual(json.load(f)["last comment"], self.reddit.comments[-1].id)
+
+	def test_restart_continues_from_checkpoint(self):
+		self.make_daemon().run(stop_when_idle=True)
+		replies = len(self.reddit.replies)
+		self.assertEqual(self.make_daemon().run(stop_when_idle=True), 0)
+
+		# Only comments posted since the last checkpoint are checked
+		subreddit = self.reddit.comments[0].subreddit
+		author = FakeRedditor(self.reddit, "someone")
+		self.reddit.comments.append(FakeComment(self.reddit, "zzz", "i should of known", author, 0,
+		                                        subreddit=subreddit))
+		self.assertEqual(self.make_daemon().run(stop_when_idle=True), 1)
+		self.assertEqual(len(self.reddit.replies), replies + 1)
+		self.assertEqual(self.reddit.replies[-1][0].id, "zzz")
+
+	def test_corrupt_checkpoint(self):
+		# Like a file cut short by an interrupted commit
+		with open(self.checkpoint_path, "w") as f:
+			f.write('{"last comm')
+		self.assertGreater(self.make_daemon().run(stop_when_idle=True), 0)
+		with open(self.checkpoint_path, "r") as f:
+			self.assertEqual(json.load(f)["last comment"], self.reddit.comments[-1].id)
+
+	def test_periodic_flush(self):
+		daemon = self.make_daemon(flush_interval=0)
+		daemon.run(stop_when_idle=True)
+		# The inbox is checked at every flush, between batches
+		self.assertGreater(daemon.bot.metrics.report()["timings"]["check_inbox"]["calls"], 1)
+
+	def test_queued_replies_are_saved_with_the_checkpoint(self):
+		outbox_path = os.path.join(self.directory.name, "outbox.json")
+		# The outbox isn't drained, like when the process is killed while it sends the last replies
+		mistakes_found = self.make_daemon(ReplyOutbox(outbox_path)).run(stop_when_idle=True)
+		self.assertGreater(mistakes_found, 0)
+		self.assertTrue(os.path.exists(self.checkpoint_path))
+		self.assertEqual(ReplyOutbox(outbox_path).pending(), mistakes_found)
+
+	def test_stop(self):
+		daemon = self.make_daemon()
+		thread = threading.Thread(target=daemon.run)
+		thread.start()
+		daemon.stop()
+		thread.join(timeout=5)
+		self.assertFalse(thread.is_alive())
@@ -0,0 +1,34 @@
+from unittest import TestCase
+
+from mistakes import MistakeChecker, mistakes
+from templates import ReplyTemplates
+
+
+class TestReplyTemplates(TestCase):
+	def setUp(self):
+		self.mistake_checker = MistakeChecker(mistakes)
+		self.templates = ReplyTemplates.load(mistake_list=mistakes)
+
+	def test_render(self):
+		text = "i should of known"
+		body = self.templates.render(text, self.mistake_checker.find_matches(text))
+		mistake = self.mistake_checker.find_matches(text)[0].mistake
+		self.assertEqual(body, f'\n> i should of known  \n\nHi, did you mean to say "should have"?  \n'
+		                       f"{mistake.get_explanation()}  \n{self.templates.footer()}")
+
+	def test_subreddit_footer_and_locale(self):
+		templates = ReplyTemplates({"en": {"first question": "Did you mean", "next question": "And", "footer": "Bye",
+		                                   "explanation": "Why: {explanation}"},
+		                            "fr": {"first question": "Vouliez-vous dire", "footer": "Au revoir",
+		                                   "explanations": {"should of": "Traduit."}}},
+		                           {"FrenchSub": {"locale": "fr"}, "quiet": {"footer": ""}})
+		text = "i should of known there were way to many cooks"
+		matches = self.mistake_checker.find_matches(text)
+
+		body = templates.render(text, matches, "frenchsub")
+		self.assertIn('Vouliez-vous dire "should have"?  \nWhy: Traduit.', body)
+		# Missing strings come from the default locale
+		self.assertIn('And "too many"?', body)
+		self.assertTrue(body.endswith("Au revoir"))
+		self.assertTrue(templates.render(text, matches, "quiet").endswith("  \n"))
+		self.assertTrue(templates.render(text, matches).endswith("Bye"))